@@ -10,36 +10,77 @@
 
 import numpy as np
 
-# get published blueprint data from the ascent 
+# get published blueprint data from the ascent
 
 # python extract always consumes the multi-domain
-# flavor of the mesh blueprint, since we have a 
-# single domain mesh, the data we want is the first child
+# flavor of the mesh blueprint. We histogram every
+# local domain, and when running with MPI, every rank
 
-mesh = ascent_data().child(0)
+domains = ascent_data()
 
-# fetch the numpy array for the braid field values
-e_vals = mesh["fields/braid/values"]
+comm = None
+try:
+    from mpi4py import MPI
+    comm = MPI.Comm.f2py(ascent_mpi_comm_id())
+except (ImportError, NameError):
+    # serial Ascent: ascent_mpi_comm_id() is not defined
+    pass
 
-# find the data extents of the braid field
-e_min, e_max = e_vals.min(), e_vals.max()
+# fetch the numpy arrays for the braid field values of all local domains
+e_vals = [domains.child(i)["fields/braid/values"]
+          for i in range(domains.number_of_children())]
+e_vals = [vals for vals in e_vals if vals.size > 0]
 
-# compute bins on extents
-bins = np.linspace(e_min, e_max)
+# find the data extents of the braid field, agreed on by all ranks
+# with one Allreduce (the minimum is reduced as the maximum of -min)
+extents = np.array([-np.inf, -np.inf])
+for vals in e_vals:
+    extents = np.maximum(extents, [-vals.min(), vals.max()])
+if comm is not None:
+    comm.Allreduce(MPI.IN_PLACE, extents, op=MPI.MAX)
+e_min, e_max = -extents[0], extents[1]
 
-# get histogram counts
-hist, bin_edges = np.histogram(e_vals, bins = bins)
+# compute bins on extents. The python extract interpreter keeps its
+# globals between cycles, so the bins are only recomputed when the
+# extents have changed
+cache = globals().setdefault("_braid_histogram_cache", {})
+if cache.get("extents") != (e_min, e_max):
+    cache["extents"] = (e_min, e_max)
+    cache["bins"] = np.linspace(e_min, e_max)
+bins = cache["bins"]
+num_bins = bins.size - 1
+scale = num_bins / (e_max - e_min) if e_max > e_min else 0.0
 
-print("\nEnergy extents: {} {}\n".format(e_min, e_max))
-print("Histogram of Energy:\n")
-print("Counts:")
-print(hist)
-print("\nBin Edges:")
-print(bin_edges)
-print("")
+# get histogram counts. The bin of every value is computed directly from
+# the extents, then counted with np.bincount, which is much faster than
+# the bin search of np.histogram. The corrections at the bin edges give
+# the same counts as np.histogram
+hist = np.zeros(num_bins, dtype=np.int64)
+for vals in e_vals:
+    index = ((vals - e_min) * scale).astype(np.intp)
+    np.clip(index, 0, num_bins - 1, out=index)
+    index -= vals < bins[index]
+    index += (vals >= bins[index + 1]) & (index < num_bins - 1)
+    hist += np.bincount(index, minlength=num_bins)
 
-# save our results to a yaml file
-hist_results = conduit.Node()
-hist_results["hist"] = hist
-hist_results["bin_edges"] = bin_edges
-hist_results.save("out_py_extract_hist_results.yaml","yaml")
+if comm is not None:
+    total = np.zeros_like(hist)
+    comm.Reduce(hist, total, op=MPI.SUM, root=0)
+    hist = total
+bin_edges = bins
+
+# rank 0 writes the global result
+if comm is None or comm.Get_rank() == 0:
+    print("\nEnergy extents: {} {}\n".format(e_min, e_max))
+    print("Histogram of Energy:\n")
+    print("Counts:")
+    print(hist)
+    print("\nBin Edges:")
+    print(bin_edges)
+    print("")
+
+    # save our results to a yaml file
+    hist_results = conduit.Node()
+    hist_results["hist"] = hist
+    hist_results["bin_edges"] = bin_edges
+    hist_results.save("out_py_extract_hist_results.yaml","yaml")
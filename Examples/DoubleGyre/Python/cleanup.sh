@@ -1,2 +1,4 @@
 rm -rf *png
 rm -rf datasets
+rm -f double_gyre_statistics.csv
+rm -f double_gyre.delta*
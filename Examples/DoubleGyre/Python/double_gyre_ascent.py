@@ -12,9 +12,15 @@
 #
 # run: python3 double_gyre_ascent.py
 #
+# The optional in-situ helpers (statistics, compressed, delta and raw
+# extracts, derived fields) are the modules of ../../HeatDiffusion/Python,
+# which is added to sys.path: keep the two example directories side by side.
+#
 # Tested with Python 3.10.6, Fri Feb 17 03:03:14 PM CET 2023
 #
 ##############################################################################
+import os
+import sys
 import math
 import numpy as np
 import conduit
@@ -22,6 +28,15 @@ import conduit.blueprint
 import ascent
 import matplotlib.pyplot as plt
 
+# the in-situ helper modules are shared with the heat diffusion examples
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "..", "HeatDiffusion", "Python"))
+from insitu_statistics import FieldStatistics, TemporalStatistics
+from compressed_extract import write_compressed, print_report
+from derived_fields import DerivedFields
+from delta_extract import DeltaWriter
+from raw_extract import write_raw
+
 class Simulation:
     """
     An animated vector field generated by a math expression
@@ -86,11 +101,47 @@ class SimulationWithAscent(Simulation):
     ----------
     frequency : int
         the frequency at which in-situ operations take place
+    statistics : string
+        CSV file receiving the min/max/mean/std of vel_x and vel_y at every
+        iteration (default None, disabled)
+    temporal : boolean
+        publish the running mean and standard deviation over time of the
+        velocity at every point, as the vector fields Velocity_mean and
+        Velocity_std (default False)
+    compress : float
+        if set, the final mesh is also saved with compressed_extract.py, the
+        velocity being reconstructed within this absolute error, 0 for lossless
+        (default None, disabled)
+    delta : int
+        if set, the velocity is appended to the delta-encoded time series
+        double_gyre.delta every `frequency` iterations, with a keyframe every
+        `delta` outputs (see delta_extract.py)
+    raw : boolean
+        if True, the final mesh is also saved with raw_extract.py, to be
+        mapped in memory by a post-processing script on the same node, such
+        as pvVerifyVorticityAscent.py (default False)
     """
-    def __init__(self, resolution=(256,128), iterations=100, frequency=10):
+    def __init__(self, resolution=(256,128), iterations=100, frequency=10,
+                 statistics=None, temporal=False, compress=None,
+                 delta=None, raw=False):
         Simulation.__init__(self, resolution, iterations)
         self.delta_x = 2.0 / (self.xres - 1)
         self.frequency = frequency
+        self.statistics = None
+        if statistics:
+            self.statistics = FieldStatistics(["vel_x", "vel_y"], filename=statistics)
+        self.compress = compress
+        self.raw = raw
+        self.delta = None
+        if delta:
+            self.delta = DeltaWriter("double_gyre.delta", delta)
+        self.temporal = {}
+        if temporal:
+            self.temporal = {"u": TemporalStatistics(self.x_coord.shape),
+                             "v": TemporalStatistics(self.x_coord.shape)}
+        # the derived fields are computed here once per published cycle,
+        # instead of by an Ascent pipeline for every scene
+        self.derived = DerivedFields(self.x_coord.shape, self.delta_x)
         self.insitu = ascent.Ascent()
         self.actions = conduit.Node()
         self.mesh = conduit.Node()
@@ -102,17 +153,37 @@ class SimulationWithAscent(Simulation):
             Bt = 1.0 - 2.0 * At
             Ft = (At * self.x_coord*self.x_coord + Bt * self.x_coord) * np.pi
             fft = 2.0 * At * self.x_coord + Bt
-            self.vel_x = -self.A * np.sin(Ft) * np.cos(np.pi*self.y_coord)
-            self.vel_y =  self.A * np.cos(Ft) * np.sin(np.pi*self.y_coord)*fft
+            # update in place, the published mesh points to these arrays
+            self.vel_x[:] = -self.A * np.sin(Ft) * np.cos(np.pi*self.y_coord)
+            self.vel_y[:] =  self.A * np.cos(Ft) * np.sin(np.pi*self.y_coord)*fft
             self.iteration += 1
+            if self.temporal:
+                self.temporal["u"].update(self.vel_x)
+                self.temporal["v"].update(self.vel_y)
+            if self.statistics is not None:
+                self.statistics.update(self.iteration, {"vel_x": self.vel_x, "vel_y": self.vel_y},
+                                       self.iteration * self.timestep)
 
             if not self.iteration % self.frequency:
                 self.mesh["state/cycle"] = self.iteration
                 self.scenes["s1/renders/r1/image_name"] = f'vel_mag.{self.iteration:03d}'
                 self.scenes["s2/renders/r1/image_name"] = f'vort_mag.{self.iteration:03d}'
+                for stats in self.temporal.values():
+                    stats.update_std()
+                self.update_derived()
+                if self.delta is not None:
+                    self.delta.write(self.iteration, {"vel_x": self.vel_x, "vel_y": self.vel_y},
+                                     self.iteration * self.timestep)
                 self.insitu.publish(self.mesh)
                 self.insitu.execute(self.actions)
 
+    def update_derived(self):
+        """Compute the derived fields of the current cycle, in place"""
+        self.derived.set_cycle(self.iteration)
+        self.derived.velocity_magnitude(self.vel_x, self.vel_y)
+        self.derived.vorticity_magnitude(self.vel_x, self.vel_y)
+        self.derived.q_criterion(self.vel_x, self.vel_y)
+
     def initialize_ascent(self):
         """Creates a Conduit node describing the mesh and add default action"""
         ascent_opts = conduit.Node()
@@ -146,6 +217,26 @@ class SimulationWithAscent(Simulation):
         self.mesh["fields/Velocity/values/v"].set_external(self.vel_y.ravel())
         self.mesh["fields/Velocity/values/w"].set_external(self.vel_z.ravel())
 
+        if self.temporal:
+            # running statistics over time, updated in place at every iteration
+            for name in ("Velocity_mean", "Velocity_std"):
+                self.mesh["fields/" + name + "/association"] = "vertex"
+                self.mesh["fields/" + name + "/topology"] = "mesh"
+            for c in ("u", "v"):
+                stats = self.temporal[c]
+                self.mesh["fields/Velocity_mean/values/" + c].set_external(stats.mean.ravel())
+                self.mesh["fields/Velocity_std/values/" + c].set_external(stats.std.ravel())
+
+        # derived fields, published as ordinary fields
+        for name, buffer in (("velocity_mag2d", "velocity_magnitude"),
+                             ("vorticity", "vorticity"),
+                             ("vorticity_mag", "vorticity_magnitude"),
+                             ("q_criterion", "q_criterion")):
+            self.mesh["fields/" + name + "/association"] = "vertex"
+            self.mesh["fields/" + name + "/topology"] = "mesh"
+            self.mesh["fields/" + name + "/values"].set_external(
+                self.derived.buffer(buffer).ravel())
+
         # verify the mesh we created conforms to the blueprint
         verify_info = conduit.Node()
         if not conduit.blueprint.mesh.verify(self.mesh, verify_info):
@@ -154,57 +245,48 @@ class SimulationWithAscent(Simulation):
             print("DoubleGyre Mesh verify success!")
             #print(self.mesh.to_yaml())
 
-        self.add_act = self.actions.append()
-        self.add_act["action"] = "add_pipelines"
-        self.pipelines = self.add_act["pipelines"]
-        self.pipelines["pl1/f1/type"] = "vector_magnitude"
-        self.pipelines["pl1/f1/params/field"] = "Velocity"
-        self.pipelines["pl1/f1/params/output_name"] = "velocity_mag2d"
-
-        self.pipelines["pl2/f1/type"] = "vorticity"
-        self.pipelines["pl2/f1/params/field"] = "Velocity"
-        self.pipelines["pl2/f1/params/output_name"] = "Mvorticity"
-        
-        self.pipelines["pl2/f2/type"] = "vector_magnitude"
-        self.pipelines["pl2/f2/params/field"] = "Mvorticity"
-        self.pipelines["pl2/f2/params/output_name"] = "vorticity_mag"
-
         self.add_act = self.actions.append()
         self.add_act["action"] = "add_scenes"
 
         self.scenes = self.add_act["scenes"]
         self.scenes["s1/plots/p1/type"] = "pseudocolor"
-        self.scenes["s1/plots/p1/pipeline"] = "pl1"
         self.scenes["s1/plots/p1/field"] = "velocity_mag2d"
 
         self.scenes = self.add_act["scenes"]
         self.scenes["s2/plots/p1/type"] = "pseudocolor"
-        self.scenes["s2/plots/p1/pipeline"] = "pl2"
         self.scenes["s2/plots/p1/field"] = "vorticity_mag"
 
     def finalize_ascent(self):
         """Save the mesh to a blueprint HDF5 file and close"""
         self.mesh["state/cycle"] = self.iteration
+        for stats in self.temporal.values():
+            stats.update_std()
+        # the derived fields are part of the mesh, no pipeline is needed
+        self.update_derived()
         self.insitu.publish(self.mesh)
         hdf5_action = conduit.Node()
-        add_extr = hdf5_action.append()
-        # to save the derived vector magnitude, add the pipeline first
-        add_extr["action"] = "add_pipelines"
-        pipeline = add_extr["pipelines"]
-        pipeline["pl1/f1/type"] = "vector_magnitude"
-        pipeline["pl1/f1/params/field"] = "Velocity"
-        pipeline["pl1/f1/params/output_name"] = "velocity_mag2d"
-
         add_extr = hdf5_action.append()
         add_extr["action"] = "add_extracts"
         extracts = add_extr["extracts"]
         extracts["e1/type"]="relay"
         extracts["e1/params/path"] = "/dev/shm/mesh"
-        extracts["e1/pipeline"] = "pl1"
         extracts["e1/params/protocol"] = "blueprint/mesh/hdf5"
 
         self.insitu.execute(hdf5_action)
         self.insitu.close()
+        if self.compress is not None:
+            tolerances = dict.fromkeys(("Velocity", "Velocity_mean", "Velocity_std"), self.compress)
+            print_report(write_compressed(self.mesh, "/dev/shm/mesh.cycle_%06d.cz" % self.iteration,
+                                          tolerances))
+        if self.raw:
+            fname = "/dev/shm/mesh.cycle_%06d.raw" % self.iteration
+            nbytes, seconds = write_raw(self.mesh, fname)
+            print("{}: {} bytes, {:.1f} MB/s".format(fname, nbytes, nbytes / max(seconds, 1e-9) / 1e6))
+        if self.statistics is not None:
+            self.statistics.flush()
+        if self.delta is not None:
+            self.delta.close()
+            self.delta.report()
 
 #sim = Simulation()
 sim = SimulationWithAscent(iterations=100, frequency=10)
@@ -19,18 +19,43 @@ renderView1.CameraFocalDisk = 1.0
 renderView1.CameraParallelScale = 0.9652828870844443
 renderView1.BackEnd = 'OSPRay raycaster'
 
-# create a new 'XML Rectilinear Grid Reader'
-visit_ex_dbvtr = XMLRectilinearGridReader(registrationName='visit_ex_db.vtr', FileName=['/dev/shm/visit_ex_db.vtr'])
-visit_ex_dbvtr.PointArrayStatus = ['mesh_mesh/velocity_mag2d', 'mesh_mesh/vel_x', 'mesh_mesh/vel_y']
-visit_ex_dbvtr.TimeArray = 'None'
-
-# create a new 'RenameArrays'
-renameArrays1 = RenameArrays(registrationName='RenameArrays1', Input=visit_ex_dbvtr)
-renameArrays1.PointArrays = ['mesh_mesh/vel_x', 'vel_x', 'mesh_mesh/vel_y', 'vel_y', 'mesh_mesh/velocity_mag2d', 'velocity_mag2d']
-renameArrays1.FieldArrays = ['CYCLE', 'CYCLE', 'MeshName', 'MeshName', 'TIME', 'TIME', 'avtOriginalBounds', 'avtOriginalBounds']
+# the final mesh of double_gyre_ascent.py, if it was saved as a raw extract
+# (SimulationWithAscent(raw=True)), is mapped in memory by raw_extract.py of
+# ../../HeatDiffusion/Python, with no decoding. Otherwise the VTK XML file is read
+import os
+import glob
+raw_files = sorted(glob.glob('/dev/shm/mesh.cycle_*.raw'))
+if raw_files:
+    helpers = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'HeatDiffusion', 'Python')
+    prelude = """import sys
+sys.path.append(%r)
+from raw_extract import read_raw, read_vtk
+fname = %r
+""" % (helpers, raw_files[-1])
+    # create a new 'Programmable Source'
+    velocity = ProgrammableSource(registrationName=os.path.basename(raw_files[-1]))
+    velocity.OutputDataSetType = 'vtkImageData'
+    velocity.ScriptRequestInformation = prelude + """values = read_raw(fname)
+dims = [values.get("coordsets/coords/dims/" + d, 1) for d in ("i", "j", "k")]
+executive = self.GetExecutive()
+outInfo = executive.GetOutputInformation(0)
+outInfo.Set(executive.WHOLE_EXTENT(), 0, dims[0] - 1, 0, dims[1] - 1, 0, dims[2] - 1)
+"""
+    velocity.Script = prelude + """self.GetOutput().ShallowCopy(read_vtk(fname))
+"""
+else:
+    # create a new 'XML Rectilinear Grid Reader'
+    visit_ex_dbvtr = XMLRectilinearGridReader(registrationName='visit_ex_db.vtr', FileName=['/dev/shm/visit_ex_db.vtr'])
+    visit_ex_dbvtr.PointArrayStatus = ['mesh_mesh/velocity_mag2d', 'mesh_mesh/vel_x', 'mesh_mesh/vel_y']
+    visit_ex_dbvtr.TimeArray = 'None'
+
+    # create a new 'RenameArrays'
+    velocity = RenameArrays(registrationName='RenameArrays1', Input=visit_ex_dbvtr)
+    velocity.PointArrays = ['mesh_mesh/vel_x', 'vel_x', 'mesh_mesh/vel_y', 'vel_y', 'mesh_mesh/velocity_mag2d', 'velocity_mag2d']
+    velocity.FieldArrays = ['CYCLE', 'CYCLE', 'MeshName', 'MeshName', 'TIME', 'TIME', 'avtOriginalBounds', 'avtOriginalBounds']
 
 # create a new 'Python Calculator'
-pythonCalculator1 = PythonCalculator(registrationName='PythonCalculator1', Input=renameArrays1)
+pythonCalculator1 = PythonCalculator(registrationName='PythonCalculator1', Input=velocity)
 pythonCalculator1.Expression = 'make_vector(vel_x, vel_y)'
 
 # create a new 'Glyph'
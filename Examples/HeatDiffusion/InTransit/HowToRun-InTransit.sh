@@ -28,3 +28,10 @@ python3 heat_diffusion_insitu_serial.py &
 # view images
 eog diffusion*png
 
+# Third run. In transit transfer to a Python consumer, analyzing the steps
+# with a pool of processes. The per-step timings are written to consumer.csv
+
+rm -rf diffusion.bp
+mpiexec -n 4 python3 ../Python/heat_diffusion_insitu_parallel.py --engine SST &
+
+python3 adios_consumer.py --workers 4 --analysis statistics contours image
@@ -0,0 +1,241 @@
+##############################################################################
+# A Python consumer of the in-transit stream, with a pool of analysis workers
+#
+# The reader opens the stream written by heat_diffusion_insitu_parallel.py
+# (SST, or a BP file), and at every step reads "temperature" and "step" into
+# a free slot of a ring of shared-memory buffers, then ends the step at once,
+# so that the writer is released before any analysis is done. The slot is
+# handed to a process pool which runs the requested analyses on it without a
+# copy, and the slot is free again when they are done:
+#
+#   - statistics: min, max, mean and standard deviation
+#   - contours: the number of iso-line segments (marching_squares.py)
+#   - image: a pseudocolor image of the temperature (matplotlib)
+#
+# When all the slots are in use, the reader waits for one to be free before
+# it begins the next step, which slows down (SST Block policy) the writer. For
+# every step, the time spent waiting for the step and for a free slot, the
+# time of the read, the number of steps being analyzed (the queue depth) and
+# the latency from the start of the step to the end of its analysis are
+# written to a CSV file. A latency growing with the steps, or a queue depth
+# always equal to the number of slots, means that the consumer does not keep
+# up with the simulation.
+#
+# The contours analysis imports marching_squares.py from ../Python, which is
+# added to sys.path: run this file from its place in the repository.
+#
+# run: mpiexec -n 4 python3 ../Python/heat_diffusion_insitu_parallel.py &
+#      python3 adios_consumer.py --workers 4 --analysis statistics contours
+##############################################################################
+import os
+import sys
+import csv
+import time
+import queue
+import argparse
+import numpy as np
+import adios2
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# the iso-lines are computed by the module of the heat diffusion examples
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Python"))
+
+# the slots of the shared-memory ring, attached once per worker
+slots = []
+
+
+def attach(names, shape):
+    """Worker initializer: map the shared-memory slots, as 2D arrays"""
+    for name in names:
+        # the segments belong to the reader, which unlinks them: the workers
+        # must not track them
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # the workers share the resource tracker of the reader, in which
+            # this second registration is a no-op. Unregistering here would
+            # remove the reader's own registration, and its unlink() would fail
+            shm = shared_memory.SharedMemory(name=name)
+        slots.append((shm, np.ndarray(shape[-2:], dtype=np.float64, buffer=shm.buf)))
+
+
+def analyze(slot, step, analyses, levels):
+    """Run the analyses on one slot. Returns a dictionary of results"""
+    values = slots[slot][1]
+    results = {}
+    if "statistics" in analyses:
+        results.update(min=float(values.min()), max=float(values.max()),
+                       mean=float(values.mean()), std=float(values.std()))
+    if "contours" in analyses:
+        from marching_squares import isolines
+        points, segments, _ = isolines(values, levels)
+        results["segments"] = int(segments.shape[0])
+    if "image" in analyses:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        ax.imshow(values, origin="lower", cmap="inferno", vmin=0.0, vmax=1.0)
+        ax.set_title(f"temperature, step {step}")
+        fig.savefig(f"consumer-{step:06d}.png")
+        plt.close(fig)
+    return results
+
+
+class Consumer:
+    """
+    Reads the steps of an ADIOS stream into shared-memory slots and
+    dispatches them to a process pool
+
+    Attributes
+    ----------
+    fname : string
+        the ADIOS stream or file (default diffusion.bp)
+    workers : int
+        the number of analysis processes
+    slots : int
+        the number of shared-memory buffers, i.e. the largest number of
+        steps being analyzed at the same time (default: 2 * workers)
+    analyses : list
+        "statistics", "contours" and/or "image"
+    """
+    def __init__(self, fname="diffusion.bp", engine=None, config="adios2.xml",
+                 workers=2, slots=None, analyses=("statistics",), levels=10,
+                 log="consumer.csv"):
+        self.fname = fname
+        if os.path.exists(config):
+            self.adios = adios2.ADIOS(configFile=config)
+        else:
+            self.adios = adios2.ADIOS()
+        self.io = self.adios.DeclareIO("readerIO")
+        if engine is not None:
+            self.io.SetEngine(engine)
+        self.workers = workers
+        self.nslots = slots or 2 * workers
+        self.analyses = list(analyses)
+        # the temperature stays within the boundary values, 0 and 1
+        self.levels = np.linspace(0.0, 1.0, levels + 2)[1:-1]
+        self.log = log
+        self.memory = []
+        self.buffers = []
+        self.free = queue.Queue()
+        self.pool = None
+        self.rows = []
+
+    def _allocate(self, shape):
+        """Create the slots and the pool, once the shape is known"""
+        nbytes = int(np.prod(shape)) * 8
+        for slot in range(self.nslots):
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.memory.append(shm)
+            self.buffers.append(np.ndarray(shape, dtype=np.float64, buffer=shm.buf))
+            self.free.put(slot)
+        self.pool = ProcessPoolExecutor(self.workers, initializer=attach,
+                                        initargs=([shm.name for shm in self.memory], shape))
+
+    def _done(self, future, slot, row, started):
+        """Pool callback: record the latency and free the slot"""
+        row["latency"] = time.perf_counter() - started
+        try:
+            row.update(future.result())
+        except Exception as e:
+            row["error"] = str(e)
+        self.free.put(slot)
+
+    def run(self):
+        engine = self.io.Open(self.fname, adios2.Mode.Read)
+        futures = []
+        try:
+            self._read_steps(engine, futures)
+        finally:
+            # the shared-memory segments are unlinked even after an error
+            engine.Close()
+            for future in futures:
+                future.exception()
+            self.close()
+
+    def _read_steps(self, engine, futures):
+        while True:
+            t0 = time.perf_counter()
+            # the reader waits here when all the slots are being analyzed, before
+            # BeginStep so that no step is held open while the pool is saturated.
+            # The slots of the first step are allocated once its shape is known
+            slot = self.free.get() if self.pool is not None else None
+            t1 = time.perf_counter()
+            status = engine.BeginStep()
+            if status != adios2.StepStatus.OK:
+                if slot is not None:
+                    self.free.put(slot)
+                break
+            t2 = time.perf_counter()
+            temperature = self.io.InquireVariable("temperature")
+            if self.pool is None:
+                self._allocate(tuple(temperature.Shape()))
+                slot = self.free.get()
+            engine.Get(temperature, self.buffers[slot], adios2.Mode.Sync)
+            # "step" is a global single value, written with the same value by all ranks
+            steps = self.io.InquireVariable("step")
+            step = np.zeros(1, dtype=np.int32)
+            engine.Get(steps, step, adios2.Mode.Sync)
+            current = engine.CurrentStep()
+            engine.EndStep()
+            t3 = time.perf_counter()
+
+            row = {"step": current, "iteration": int(step[0]),
+                   "wait_slot": t1 - t0, "wait_step": t2 - t1, "read": t3 - t2,
+                   "queue_depth": self.nslots - self.free.qsize()}
+            self.rows.append(row)
+            future = self.pool.submit(analyze, slot, int(step[0]), self.analyses, self.levels)
+            future.add_done_callback(lambda f, s=slot, r=row, t=t2: self._done(f, s, r, t))
+            futures.append(future)
+            print("step {} (iteration {}): read {:.3f}s, waited {:.3f}s for a slot, "
+                  "{} steps in the pool".format(row["step"], row["iteration"], row["read"],
+                                                row["wait_slot"], row["queue_depth"]))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+        self.buffers = []
+        for shm in self.memory:
+            shm.close()
+            shm.unlink()
+        self.memory = []
+        if self.rows:
+            columns = []
+            for row in self.rows:
+                columns += [k for k in row if k not in columns]
+            with open(self.log, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.rows)
+            latency = np.array([row.get("latency", np.nan) for row in self.rows])
+            print("{} steps, latency mean {:.3f}s max {:.3f}s, largest queue depth {}, "
+                  "log in {}".format(len(self.rows), np.nanmean(latency), np.nanmax(latency),
+                                     max(row["queue_depth"] for row in self.rows),
+                                     self.log))
+
+
+parser = argparse.ArgumentParser(description="Python consumer of the in-transit stream")
+parser.add_argument("filename", nargs="?", default="diffusion.bp",
+                    help="the ADIOS stream or file (default: diffusion.bp)")
+parser.add_argument("-e", "--engine", type=str, default=None,
+                    help="the ADIOS engine (default: the readerIO of adios2.xml)")
+parser.add_argument("-w", "--workers", type=int, default=2,
+                    help="number of analysis processes (default: 2)")
+parser.add_argument("--slots", type=int, default=None,
+                    help="number of shared-memory buffers (default: 2 * workers)")
+parser.add_argument("-a", "--analysis", type=str, nargs="+", default=["statistics"],
+                    choices=["statistics", "contours", "image"],
+                    help="analyses of every step (default: statistics)")
+parser.add_argument("--levels", type=int, default=10,
+                    help="number of iso-lines of the contours analysis (default: 10)")
+parser.add_argument("--log", type=str, default="consumer.csv",
+                    help="CSV file of the per-step timings (default: consumer.csv)")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    consumer = Consumer(args.filename, engine=args.engine, workers=args.workers,
+                        slots=args.slots, analyses=args.analysis, levels=args.levels,
+                        log=args.log)
+    consumer.run()
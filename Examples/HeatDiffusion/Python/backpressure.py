@@ -0,0 +1,147 @@
+##############################################################################
+# Adaptive output frequency of an in-transit writer under backpressure
+#
+# With the SST engine and QueueFullPolicy=Block, a slow consumer stalls the
+# writer in BeginStep() or EndStep(), and the simulation waits without any
+# trace. With QueueFullPolicy=Discard, steps are lost silently. OutputPacer
+# decides which iterations are written, measures the time spent in ADIOS by
+# the slowest rank, and under the "adaptive" policy doubles the output stride
+# when a step stalls the simulation (it took longer than the threshold), and
+# halves it again after `recover` fast steps:
+#
+#   pacer = OutputPacer(comm, frequency=100, policy="adaptive", threshold=0.05,
+#                       keyframe=10, log="backpressure.csv")
+#   while running:
+#       if pacer.due(iteration, force=fired):
+#           t0 = MPI.Wtime()
+#           status = engine.BeginStep(adios2.StepMode.Append, timeout)
+#           ok = comm.allreduce(status == adios2.StepStatus.OK, op=MPI.LAND)
+#           ...if not ok, and the step was opened by some ranks, or is a
+#           ...keyframe or forced: BeginStep() again without timeout
+#           if ok:
+#               ...Put()...
+#               engine.EndStep()
+#           pacer.record(iteration, MPI.Wtime() - t0, ok)
+#       ...
+#   pacer.close()
+#
+# Only the intermediate outputs are dropped: every `keyframe`-th output of the
+# base frequency, and the iterations given to due() with force=True (e.g. a
+# trigger), must be waited for by the caller. The decisions are the same on
+# all ranks, as ADIOS steps are collective (see BeginStep() in
+# heat_diffusion_insitu_parallel.py). Rank 0 logs every dropped, stalled or
+# not ready step, with the time it cost to the simulation.
+##############################################################################
+import csv
+
+
+class OutputPacer:
+    """
+    Output decisions of a writer, slowed down when the consumer cannot follow
+
+    Attributes
+    ----------
+    frequency : int
+        the base output frequency, in iterations
+    policy : string
+        "fixed" (always the base frequency, the stalls are only logged) or
+        "adaptive"
+    threshold : float
+        a step stalls if the slowest rank spent more than this (seconds) in
+        BeginStep/Put/EndStep
+    max_stride : int
+        the largest multiple of the base frequency (default 16)
+    recover : int
+        the number of consecutive fast outputs after which the stride is
+        halved (default 4)
+    keyframe : int
+        every keyframe-th output of the base frequency is always written
+        (default 10, 0 for none)
+    log : string
+        CSV file of the events, written by rank 0. None to disable
+    """
+    def __init__(self, comm, frequency, policy="adaptive", threshold=0.05, max_stride=16,
+                 recover=4, keyframe=10, log="backpressure.csv"):
+        self.comm = comm
+        self.rank = comm.Get_rank() if comm is not None else 0
+        self.frequency = frequency
+        self.policy = policy
+        self.threshold = threshold
+        self.max_stride = max_stride
+        self.recover = recover
+        self.keyframe = keyframe
+        self.stride = 1
+        self.fast = 0
+        self.written = 0
+        self.dropped = 0
+        self.stalled = 0
+        self.stall_seconds = 0.0
+        self.seconds = 0.0
+        self.rows = []
+        self.log = log
+
+    def is_keyframe(self, iteration):
+        return self.keyframe > 0 and iteration % (self.frequency * self.keyframe) == 0
+
+    def due(self, iteration, force=False):
+        """True if the iteration must be written. The outputs of the base
+        frequency which are skipped are logged as dropped"""
+        if iteration % self.frequency != 0 and not force:
+            return False
+        if force or self.is_keyframe(iteration):
+            return True
+        if (iteration // self.frequency) % self.stride == 0:
+            return True
+        self.dropped += 1
+        self._event(iteration, "dropped", 0.0)
+        return False
+
+    def record(self, iteration, seconds, ok=True):
+        """The time spent in ADIOS by this rank for the output of an
+        iteration, and whether the step was accepted (StepStatus.OK)"""
+        if self.comm is not None:
+            from mpi4py import MPI
+            seconds = self.comm.allreduce(seconds, op=MPI.MAX)
+            ok = self.comm.allreduce(ok, op=MPI.LAND)
+        self.seconds += seconds
+        if not ok:
+            # e.g. BeginStep() timed out: the data was not written
+            self.dropped += 1
+            self._event(iteration, "not ready", seconds)
+            self._slow_down()
+            return
+        self.written += 1
+        if seconds > self.threshold:
+            self.stalled += 1
+            self.stall_seconds += seconds
+            self._event(iteration, "stalled", seconds)
+            self._slow_down()
+        else:
+            self.fast += 1
+            if self.policy == "adaptive" and self.stride > 1 and self.fast >= self.recover:
+                self.stride //= 2
+                self.fast = 0
+                self._event(iteration, "speed up", seconds)
+
+    def _slow_down(self):
+        self.fast = 0
+        if self.policy == "adaptive" and self.stride < self.max_stride:
+            self.stride *= 2
+
+    def _event(self, iteration, event, seconds):
+        if self.rank == 0:
+            self.rows.append((iteration, event, self.frequency * self.stride, seconds))
+
+    def close(self):
+        """Write the log and print a summary on rank 0"""
+        if self.rank != 0:
+            return
+        if self.log is not None:
+            with open(self.log, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["iteration", "event", "frequency", "seconds"])
+                writer.writerows(self.rows)
+        print("{} outputs written, {} dropped, {} stalled for {:.3f}s; {:.3f}s in ADIOS, "
+              "final frequency {}".format(self.written, self.dropped, self.stalled,
+                                          self.stall_seconds, self.seconds,
+                                          self.frequency * self.stride))
@@ -0,0 +1,272 @@
+##############################################################################
+# Strong and weak scaling benchmark of the parallel 2D heat diffusion miniapp
+#
+# Every case (resolution, number of ranks, mesh type, stencil kernel and
+# in-situ backend) is launched with mpiexec. The miniapps print one TIMING
+# line with the per-phase timings of the slowest rank, which is collected
+# and turned into strong- and weak-scaling tables and efficiency plots.
+#
+# The "null" backend runs heat_diffusion_insitu_parallel_Ascent.py with --null,
+# i.e. the solver and the Blueprint mesh description without any in-situ
+# library call. It is the baseline to which the in-situ costs are compared.
+#
+# The "adios" backend runs heat_diffusion_insitu_parallel.py, which streams or
+# writes the temperature with ADIOS (--adios-engine), once per compression
+# operator of --adios-operator ("none" for the uncompressed stream), so that
+# the cost of the compression on the simulation side can be compared with
+# the bytes saved. The size of the BP output is added to the tables.
+#
+# The defaults are sized for a single Linux box with a handful of cores:
+#
+# Run: python3 benchmark_scaling.py --ranks 1 2 4 --res 512 --weak-res 256 \
+#                                   --backend null ascent --mesh uniform
+#
+#      python3 benchmark_scaling.py --backend null adios --adios-engine BP5 \
+#                                   --adios-operator none zfp blosc --mode strong
+#
+#      python3 benchmark_scaling.py --dry-run  # only print the commands
+#
+##############################################################################
+import os
+import sys
+import csv
+import json
+import math
+import shlex
+import argparse
+import itertools
+import subprocess
+
+DRIVERS = {"null": "heat_diffusion_insitu_parallel_Ascent.py",
+           "ascent": "heat_diffusion_insitu_parallel_Ascent.py",
+           "catalyst": "heat_diffusion_insitu_parallel_Catalyst.py",
+           "adios": "heat_diffusion_insitu_parallel.py"}
+
+PHASES = ("initialize", "compute", "exchange", "insitu", "finalize", "total")
+
+
+def weak_resolution(base, ranks):
+    """Resolution keeping the number of grid points per rank constant.
+
+    The domain is split along Y only, so the resolution must also be a
+    multiple of the number of ranks."""
+    res = base * math.sqrt(ranks)
+    return max(ranks, int(round(res / ranks)) * ranks)
+
+
+def build_command(args, backend, ranks, res, mesh, kernel):
+    here = os.path.dirname(os.path.abspath(__file__))
+    driver, _, operator = backend.partition(":")
+    cmd = shlex.split(args.mpiexec) + ["-n", str(ranks)]
+    cmd += shlex.split(args.mpiexec_args)
+    cmd += [sys.executable, os.path.join(here, DRIVERS[driver]),
+            "--res", str(res), "--timesteps", str(args.timesteps), "--timing"]
+    if driver == "adios":
+        # uniform mesh and NumPy kernel only
+        cmd += ["--frequency", str(args.frequency), "--engine", args.adios_engine]
+        if args.adios_aggregators:
+            cmd += ["--aggregators", str(args.adios_aggregators)]
+        if args.adios_async:
+            cmd += ["--async"]
+        if operator != "none":
+            cmd += ["--operator", operator, "--accuracy", str(args.adios_accuracy)]
+        return cmd
+    cmd += ["--mesh", mesh, "--kernel", kernel]
+    if backend == "null":
+        cmd += ["--null", "--frequency", str(args.frequency)]
+    elif backend == "ascent":
+        cmd += ["--frequency", str(args.frequency)]
+    else:
+        cmd += ["--script", os.path.abspath(args.script)]
+    return cmd
+
+
+def run_case(args, mode, backend, ranks, res, mesh, kernel):
+    """Launch one case args.repeat times, return the fastest TIMING record"""
+    cmd = build_command(args, backend, ranks, res, mesh, kernel)
+    print(" ".join(cmd), flush=True)
+    if args.dry_run:
+        return None
+    rundir = os.path.join(args.outdir, f"{mode}-{backend}-{mesh}-{kernel}-n{ranks}-r{res}")
+    os.makedirs(rundir, exist_ok=True)
+    best = None
+    for _ in range(args.repeat):
+        proc = subprocess.run(cmd, cwd=rundir, capture_output=True, text=True)
+        with open(os.path.join(rundir, "output.txt"), "a") as log:
+            log.write(proc.stdout)
+            log.write(proc.stderr)
+        records = [json.loads(line.split(" ", 1)[1])
+                   for line in proc.stdout.splitlines() if line.startswith("TIMING ")]
+        if proc.returncode != 0 or not records:
+            # the other repeats may still succeed: keep the best of those
+            print(f"  failed (exit code {proc.returncode}), see {rundir}/output.txt")
+            continue
+        if best is None or records[0]["total"] < best["total"]:
+            best = records[0]
+    if best is None:
+        return None
+    best.update(mode=mode, backend=backend)
+    print("  total = {:.3f}s compute = {:.3f}s exchange = {:.3f}s insitu = {:.3f}s".format(
+          best["total"], best["compute"], best["exchange"], best["insitu"]))
+    if "bytes" in best:
+        print("  output = {} bytes".format(best["bytes"]))
+    return best
+
+
+def add_efficiency(records):
+    """Add speedup and parallel efficiency relative to the smallest rank count
+    of each (mode, backend, mesh, kernel) group"""
+    key = lambda r: (r["mode"], r["backend"], r["mesh"], r["kernel"])
+    for _, group in itertools.groupby(sorted(records, key=key), key=key):
+        group = sorted(group, key=lambda r: r["ranks"])
+        ref = group[0]
+        for r in group:
+            r["speedup"] = ref["total"] / r["total"]
+            if r["mode"] == "strong":
+                r["efficiency"] = r["speedup"] * ref["ranks"] / r["ranks"]
+            else:
+                r["efficiency"] = r["speedup"]
+            # the cost of the in-situ coupling, relative to the solver alone
+            solver = r["compute"] + r["exchange"]
+            r["insitu_overhead"] = r["insitu"] / solver if solver > 0 else 0.0
+
+
+def write_table(records, mode, outdir):
+    rows = [r for r in records if r["mode"] == mode]
+    if not rows:
+        return
+    columns = ["backend", "mesh", "kernel", "ranks", "res", "iterations"] + \
+              list(PHASES) + ["speedup", "efficiency", "insitu_overhead", "bytes"]
+    fname = os.path.join(outdir, f"{mode}_scaling.csv")
+    with open(fname, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"\n{mode.capitalize()} scaling ({fname})")
+    print("{:>9} {:>12} {:>8} {:>5} {:>6} {:>9} {:>9} {:>9} {:>9} {:>6}".format(
+          "backend", "mesh", "kernel", "ranks", "res", "compute", "exchange",
+          "insitu", "total", "eff."))
+    for r in rows:
+        print("{:>9} {:>12} {:>8} {:>5} {:>6} {:9.3f} {:9.3f} {:9.3f} {:9.3f} {:6.2f}".format(
+              r["backend"], r["mesh"], r["kernel"], r["ranks"], r["res"], r["compute"],
+              r["exchange"], r["insitu"], r["total"], r["efficiency"]))
+
+
+def plot_efficiency(records, mode, outdir):
+    rows = [r for r in records if r["mode"] == mode]
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not available, skipping the efficiency plot")
+        return
+    if not rows:
+        return
+    fig, ax = plt.subplots()
+    key = lambda r: (r["backend"], r["mesh"], r["kernel"])
+    for (backend, mesh, kernel), group in itertools.groupby(sorted(rows, key=key), key=key):
+        group = sorted(group, key=lambda r: r["ranks"])
+        ax.plot([r["ranks"] for r in group], [r["efficiency"] for r in group],
+                marker="o", label=f"{backend} {mesh} {kernel}")
+    ax.axhline(1.0, color="grey", linestyle="--", linewidth=1)
+    ax.set_xscale("log", base=2)
+    ax.set_xlabel("MPI ranks")
+    ax.set_ylabel("parallel efficiency")
+    ax.set_ylim(bottom=0.0)
+    ax.set_title(f"Heat diffusion, {mode} scaling")
+    ax.legend(fontsize=8)
+    fname = os.path.join(outdir, f"{mode}_scaling_efficiency.png")
+    fig.savefig(fname)
+    plt.close(fig)
+    print(f"Efficiency plot \"{fname}\" written to disk")
+
+
+def main(args):
+    if not args.dry_run:
+        os.makedirs(args.outdir, exist_ok=True)
+    records = []
+    # one backend "adios:<operator>" per compression operator
+    backends = [b for b in args.backend if b != "adios"]
+    if "adios" in args.backend:
+        backends += ["adios:" + op for op in args.adios_operator]
+    for mode in args.mode:
+        for backend, mesh, kernel, ranks in itertools.product(
+                backends, args.mesh, args.kernel, sorted(args.ranks)):
+            if backend.startswith("adios") and (mesh, kernel) != ("uniform", "numpy"):
+                if mode == args.mode[0] and ranks == min(args.ranks):
+                    print(f"skipping {backend} with --mesh {mesh} --kernel {kernel}: the ADIOS "
+                          "driver has the uniform mesh and the numpy kernel only")
+                continue
+            if mode == "strong":
+                res = args.res
+                if res % ranks:
+                    print(f"skipping {ranks} ranks: --res={res} is not a multiple of it")
+                    continue
+            else:
+                res = weak_resolution(args.weak_res, ranks)
+            record = run_case(args, mode, backend, ranks, res, mesh, kernel)
+            if record is not None:
+                records.append(record)
+
+    if not records:
+        return
+    add_efficiency(records)
+    with open(os.path.join(args.outdir, "results.jsonl"), "w") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+    for mode in args.mode:
+        write_table(records, mode, args.outdir)
+        plot_efficiency(records, mode, args.outdir)
+
+
+parser = argparse.ArgumentParser(
+    description="strong/weak scaling benchmark of the heat diffusion miniapp")
+parser.add_argument("--ranks", type=int, nargs="+", default=[1, 2, 4],
+                    help="numbers of MPI ranks to run (default: 1 2 4)")
+parser.add_argument("--res", type=int, default=512,
+                    help="global resolution of the strong scaling runs (default: 512)")
+parser.add_argument("--weak-res", type=int, default=256,
+                    help="resolution of the 1-rank weak scaling run (default: 256)")
+parser.add_argument("--mode", type=str, nargs="+", default=["strong", "weak"],
+                    choices=["strong", "weak"], help="scaling studies to run")
+parser.add_argument("-m", "--mesh", type=str, nargs="+", default=["uniform"],
+                    choices=["uniform", "rectilinear", "structured", "unstructured"],
+                    help="mesh types (default: uniform)")
+parser.add_argument("-k", "--kernel", type=str, nargs="+", default=["numpy"],
+                    choices=["numpy", "inplace"], help="stencil kernels (default: numpy)")
+parser.add_argument("-b", "--backend", type=str, nargs="+", default=["null", "ascent"],
+                    choices=list(DRIVERS), help="in-situ backends (default: null ascent)")
+parser.add_argument("-t", "--timesteps", type=int, default=500,
+                    help="number of timesteps of every run (default: 500)")
+parser.add_argument("-f", "--frequency", type=int, default=100,
+                    help="in-situ frequency of the Ascent runs (default: 100)")
+parser.add_argument("-s", "--script", type=str, default="../C++/catalyst_state.py",
+                    help="Catalyst script of the catalyst backend")
+parser.add_argument("--adios-engine", type=str, default="BP5",
+                    choices=["SST", "BP5", "BP4", "Inline"],
+                    help="ADIOS engine of the adios backend (default: BP5)")
+parser.add_argument("--adios-operator", type=str, nargs="+", default=["none"],
+                    choices=["none", "zfp", "sz", "mgard", "blosc", "bzip2"],
+                    help="compression operators of the adios backend (default: none)")
+parser.add_argument("--adios-accuracy", type=float, default=1e-6,
+                    help="error bound of the zfp, sz and mgard operators (default: 1e-6)")
+parser.add_argument("--adios-aggregators", type=int, default=None,
+                    help="number of aggregators of the BP engines")
+parser.add_argument("--adios-async", action="store_true",
+                    help="asynchronous writes of the BP5 engine")
+parser.add_argument("--repeat", type=int, default=1,
+                    help="run every case N times and keep the fastest (default: 1)")
+parser.add_argument("--mpiexec", type=str, default="mpiexec",
+                    help="MPI launcher (default: mpiexec)")
+parser.add_argument("--mpiexec-args", type=str, default="",
+                    help="extra launcher arguments, e.g. \"--oversubscribe\"")
+parser.add_argument("-o", "--outdir", type=str, default="benchmark",
+                    help="directory for the runs, tables and plots (default: benchmark)")
+parser.add_argument("--dry-run", action="store_true",
+                    help="print the commands without running them")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,226 @@
+##############################################################################
+# Record and replay of the Blueprint meshes published by a simulation
+#
+# BlueprintRecorder has the open/publish/execute/close interface of an Ascent
+# instance. It saves every published node, per rank and per cycle, in a
+# compact binary store (conduit_bin by default) and forwards the calls to the
+# wrapped Ascent instance, if any:
+#
+#   self.a = BlueprintRecorder("recording", comm, ascent.mpi.Ascent())
+#
+# Running this file streams a recording back into Ascent or Catalyst as fast
+# as possible, without the solver, and reports the cost of every cycle. This
+# makes it possible to tune an actions file or a Catalyst script offline:
+#
+# Run: mpiexec -n 2 python3 blueprint_recorder.py recording --ascent temperature_gradient.yaml
+#      mpiexec -n 2 python3 blueprint_recorder.py recording --catalyst ../C++/catalyst_state.py
+#
+# The number of ranks of the replay does not need to match the recording: the
+# domain files of a cycle are dealt round-robin to the ranks.
+##############################################################################
+import os
+import csv
+import glob
+import json
+import argparse
+
+
+class BlueprintRecorder:
+    """
+    Saves every published Blueprint node to an on-disk store
+
+    Attributes
+    ----------
+    store : string
+        the directory of the recording. Cycle N of rank R is saved
+        as store/cycle_NNNNNN/domain_RRRRRR.<protocol>. The domains of a
+        multi-domain node are saved under their state/domain_id instead
+    comm : mpi4py communicator
+        None in serial mode
+    insitu : Ascent instance
+        the calls are forwarded to it after recording. None to only record
+    protocol : string
+        a Conduit I/O protocol, "conduit_bin" (default) or "hdf5"
+    """
+    def __init__(self, store, comm=None, insitu=None, protocol="conduit_bin"):
+        self.store = store
+        self.comm = comm
+        self.insitu = insitu
+        self.protocol = protocol
+        self.rank = comm.Get_rank() if comm is not None else 0
+        self.size = comm.Get_size() if comm is not None else 1
+        self.cycles = []
+        self.actions_recorded = False
+
+    def cycle_dir(self, cycle):
+        return os.path.join(self.store, f"cycle_{cycle:06d}")
+
+    def open(self, opts=None):
+        os.makedirs(self.store, exist_ok=True)
+        if self.insitu is not None:
+            if opts is None:
+                self.insitu.open()
+            else:
+                self.insitu.open(opts)
+
+    def record(self, mesh, cycle=None):
+        """Save a single-domain or a multi-domain Blueprint node. The cycle
+        defaults to the state/cycle of the (first) domain, or to the number
+        of nodes recorded so far."""
+        if mesh.has_path("coordsets"):
+            domains = [(self.rank, mesh)]
+        else:
+            # a multi-domain node: every child is a domain with its own id
+            domains = [(int(mesh.child(i)["state/domain_id"]), mesh.child(i))
+                       for i in range(mesh.number_of_children())]
+        if cycle is None:
+            cycle = len(self.cycles)
+            if domains and domains[0][1].has_path("state/cycle"):
+                cycle = int(domains[0][1]["state/cycle"])
+        os.makedirs(self.cycle_dir(cycle), exist_ok=True)
+        for domain_id, domain in domains:
+            fname = os.path.join(self.cycle_dir(cycle), f"domain_{domain_id:06d}.{self.protocol}")
+            domain.save(fname, self.protocol)
+        self.cycles.append(cycle)
+        return cycle
+
+    def publish(self, mesh, cycle=None):
+        self.record(mesh, cycle)
+        if self.insitu is not None:
+            self.insitu.publish(mesh)
+
+    def execute(self, actions):
+        # the actions of the first cycle are kept as the default replay actions
+        if self.rank == 0 and not self.actions_recorded:
+            actions.save(os.path.join(self.store, "actions.yaml"), "yaml")
+            self.actions_recorded = True
+        if self.insitu is not None:
+            self.insitu.execute(actions)
+
+    def close(self):
+        if self.rank == 0:
+            index = {"ranks": self.size, "protocol": self.protocol,
+                     "cycles": sorted(set(self.cycles))}
+            with open(os.path.join(self.store, "index.json"), "w") as f:
+                json.dump(index, f, indent=1)
+        if self.insitu is not None:
+            self.insitu.close()
+
+
+def load_domains(conduit, store, index, cycle, rank, size):
+    """Load the domains of one cycle assigned to this rank into a
+    multi-domain Conduit node. The domain files are dealt round-robin, as
+    their number may differ from the number of ranks of the recording"""
+    domains = conduit.Node()
+    fnames = sorted(glob.glob(os.path.join(store, f"cycle_{cycle:06d}",
+                                           f"domain_*.{index['protocol']}")))
+    for fname in fnames[rank::size]:
+        name = os.path.basename(fname).split(".")[0]
+        domain = domains[name]
+        domain.load(fname, index["protocol"])
+        domain["state/domain_id"] = int(name[len("domain_"):])
+    return domains
+
+
+def replay(args):
+    from mpi4py import MPI
+    comm = MPI.COMM_WORLD
+    rank, size = comm.Get_rank(), comm.Get_size()
+
+    with open(os.path.join(args.store, "index.json")) as f:
+        index = json.load(f)
+    cycles = index["cycles"][args.first::args.stride]
+
+    if args.catalyst:
+        import catalyst
+        import catalyst_conduit as conduit
+        insitu = conduit.Node()
+        insitu["catalyst/scripts/script/filename"] = args.catalyst
+        insitu["catalyst_load/implementation"] = "paraview"
+        catalyst.initialize(insitu)
+    else:
+        import conduit
+        import ascent.mpi
+        ascent_opts = conduit.Node()
+        ascent_opts["mpi_comm"] = comm.py2f()
+        ascent_opts["exceptions"] = "forward"
+        if args.ghosts:
+            ascent_opts["ghost_field_name"] = args.ghosts
+        a = ascent.mpi.Ascent()
+        a.open(ascent_opts)
+        actions = conduit.Node()
+        actions.load(args.ascent or os.path.join(args.store, "actions.yaml"), "yaml")
+
+    # with --preload, the whole recording is read before the timed loop
+    preloaded = {}
+    if args.preload:
+        for cycle in cycles:
+            preloaded[cycle] = load_domains(conduit, args.store, index, cycle, rank, size)
+
+    timings = []
+    for cycle in cycles:
+        t0 = MPI.Wtime()
+        if args.preload:
+            domains = preloaded[cycle]
+        else:
+            domains = load_domains(conduit, args.store, index, cycle, rank, size)
+        comm.Barrier()
+        t1 = MPI.Wtime()
+        if args.catalyst:
+            exec_params = conduit.Node()
+            exec_params["catalyst/state/timestep"] = cycle
+            exec_params["catalyst/state/time"] = cycle * 0.1
+            channel = exec_params["catalyst/channels/" + args.channel]
+            channel["type"] = "multimesh"
+            channel["data"].set_external(domains)
+            t2 = MPI.Wtime()
+            catalyst.execute(exec_params)
+        else:
+            a.publish(domains)
+            t2 = MPI.Wtime()
+            a.execute(actions)
+        comm.Barrier()
+        t3 = MPI.Wtime()
+        timings.append((cycle, t1 - t0, t2 - t1, t3 - t2, t3 - t0))
+        if rank == 0:
+            print("cycle {:6d}: load {:8.4f}s publish {:8.4f}s execute {:8.4f}s".format(
+                  cycle, t1 - t0, t2 - t1, t3 - t2), flush=True)
+
+    if args.catalyst:
+        catalyst.finalize(insitu)
+    else:
+        a.close()
+
+    if rank == 0 and timings:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["cycle", "load", "publish", "execute", "total"])
+            writer.writerows(timings)
+        pipeline = sum(t[2] + t[3] for t in timings)
+        print(f"{len(timings)} cycles replayed, {pipeline / len(timings):.4f}s per cycle "
+              f"in the pipeline, timings written to \"{args.output}\"")
+
+
+parser = argparse.ArgumentParser(
+    description="replay a recording of Blueprint meshes into Ascent or Catalyst")
+parser.add_argument("store", type=str, help="directory written by BlueprintRecorder")
+parser.add_argument("-a", "--ascent", type=str, default=None,
+                    help="Ascent actions file (default: the recorded actions)")
+parser.add_argument("-c", "--catalyst", type=str, default=None,
+                    help="Catalyst script. Replays into Catalyst instead of Ascent")
+parser.add_argument("--channel", type=str, default="grid",
+                    help="name of the Catalyst channel (default: grid)")
+parser.add_argument("--ghosts", type=str, default=None,
+                    help="name of the Ascent ghost field, e.g. point_ghosts (default: none)")
+parser.add_argument("--first", type=int, default=0,
+                    help="index of the first recorded cycle to replay (default: 0)")
+parser.add_argument("--stride", type=int, default=1,
+                    help="replay every N-th recorded cycle (default: 1)")
+parser.add_argument("--preload", action="store_true",
+                    help="read all cycles in memory first, to time the pipeline only")
+parser.add_argument("-o", "--output", type=str, default="replay_timings.csv",
+                    help="CSV file of the per-cycle timings (default: replay_timings.csv)")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    replay(args)
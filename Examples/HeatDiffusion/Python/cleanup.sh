@@ -3,3 +3,7 @@ rm view*png
 rm -rf mesh.cycle*
 rm -rf datasets/*
 
+rm -f isolines.cycle*
+rm -f temperature.rank_*.delta*
+rm -rf diffusion.bp
+rm -f backpressure.csv
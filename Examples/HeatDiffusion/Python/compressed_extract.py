@@ -0,0 +1,250 @@
+##############################################################################
+# Compressed extracts of Blueprint meshes, written from the simulation
+#
+# The relay extracts ("blueprint/mesh/hdf5") are written uncompressed. Here,
+# every array of a Blueprint node is compressed with a codec chosen per field:
+#
+#   - lossless: the bytes of the array are shuffled (all the first bytes of
+#     the values, then all the second bytes, ...) and compressed with zlib,
+#     or lz4 if the lz4 module is installed
+#   - error-bounded: the values are quantized on a grid of step 2*tolerance,
+#     so that every value is reconstructed within the tolerance, stored in the
+#     smallest integer type, then shuffled and compressed as above
+#
+# The coordinates, the connectivity and the ghost fields are always lossless.
+# write_compressed() returns the compression ratio and the encoding throughput
+# of every array. With backend="hdf5" and h5py available, the HDF5 shuffle,
+# gzip and scale-offset filters are used instead and the file can be read by
+# any HDF5 tool.
+#
+#   write_compressed(mesh, "mesh.cycle_001000.rank_0000.cz", {"temperature": 1e-4})
+#   mesh = conduit.Node()
+#   read_compressed("mesh.cycle_001000.rank_0000.cz", mesh)
+#
+# Run: python3 compressed_extract.py mesh.cycle_001000.rank_0000.cz  # prints its content
+##############################################################################
+import json
+import time
+import zlib
+import argparse
+import numpy as np
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+MAGIC = b"CZBP0001"
+
+
+def leaves(node, prefix=""):
+    """All the (path, value) leaves of a Conduit node"""
+    if node.number_of_children() == 0:
+        yield prefix, node.value()
+        return
+    for name in node.child_names():
+        yield from leaves(node[name], prefix + "/" + name if prefix else name)
+
+
+def tolerance_of(path, tolerances):
+    """The tolerance of a field path, None for lossless"""
+    parts = path.split("/")
+    if len(parts) >= 3 and parts[0] == "fields":
+        return tolerances.get(parts[1])
+    return None
+
+
+def shuffle(data):
+    """Group the bytes of the values by significance"""
+    return np.ascontiguousarray(data.view(np.uint8).reshape(-1, data.itemsize).T)
+
+
+def unshuffle(raw, dtype, count):
+    itemsize = np.dtype(dtype).itemsize
+    return np.frombuffer(raw, dtype=np.uint8).reshape(itemsize, count).T.copy().view(dtype).ravel()
+
+
+def compress_bytes(raw, codec, level):
+    if codec == "lz4":
+        return lz4.frame.compress(raw)
+    if codec == "zlib":
+        return zlib.compress(raw, level)
+    return raw
+
+
+def decompress_bytes(raw, codec):
+    if codec == "lz4":
+        return lz4.frame.decompress(raw)
+    if codec == "zlib":
+        return zlib.decompress(raw)
+    return raw
+
+
+def smallest_int(qmin, qmax):
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if qmin >= info.min and qmax <= info.max:
+            return dtype
+    return np.int64
+
+
+def encode(values, tolerance, codec, level):
+    """Compress one array. Returns the header entry and the bytes"""
+    values = np.ascontiguousarray(values).ravel()
+    entry = {"dtype": values.dtype.str, "count": int(values.size), "codec": codec}
+    if tolerance and values.dtype.kind == "f" and values.size:
+        origin = float(values.min())
+        step = 2.0 * tolerance
+        q = np.rint((values - origin) / step)
+        qtype = smallest_int(0, q.max())
+        entry.update(tolerance=tolerance, origin=origin, step=step,
+                     qtype=np.dtype(qtype).str)
+        values = q.astype(qtype)
+    return entry, compress_bytes(shuffle(values).tobytes(), codec, level)
+
+
+def decode(entry, raw):
+    qtype = entry.get("qtype", entry["dtype"])
+    values = unshuffle(decompress_bytes(raw, entry["codec"]), qtype, entry["count"])
+    if "qtype" in entry:
+        values = (values * entry["step"] + entry["origin"]).astype(entry["dtype"])
+    return values
+
+
+def write_compressed(mesh, fname, tolerances=None, codec=None, level=4, backend="native"):
+    """
+    Write a Blueprint node to a compressed file. Returns a dictionary
+    {path: (raw bytes, compressed bytes, encoding seconds)}
+
+    Attributes
+    ----------
+    tolerances : dict
+        {field name: absolute error bound}. The fields not listed, and all
+        the other arrays of the node, are lossless
+    codec : string
+        "zlib", "lz4" or "none". The default is lz4 if installed, else zlib
+    backend : string
+        "native" for the format of this module, "hdf5" for HDF5 filters
+    """
+    tolerances = tolerances or {}
+    if codec is None:
+        codec = "lz4" if lz4 is not None else "zlib"
+    if codec == "lz4" and lz4 is None:
+        print("lz4 is not available, using zlib")
+        codec = "zlib"
+    if backend == "hdf5":
+        try:
+            return _write_hdf5(mesh, fname, tolerances, level)
+        except ImportError:
+            print("h5py is not available, using the native format")
+
+    scalars, entries, blobs, report = {}, {}, [], {}
+    offset = 0
+    for path, value in leaves(mesh):
+        if not isinstance(value, np.ndarray):
+            scalars[path] = value.item() if isinstance(value, np.generic) else value
+            continue
+        t0 = time.perf_counter()
+        entry, blob = encode(value, tolerance_of(path, tolerances), codec, level)
+        report[path] = (value.nbytes, len(blob), time.perf_counter() - t0)
+        entry.update(offset=offset, nbytes=len(blob))
+        entries[path] = entry
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps({"scalars": scalars, "arrays": entries}).encode()
+    with open(fname, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    return report
+
+
+def _write_hdf5(mesh, fname, tolerances, level):
+    import h5py
+    report = {}
+    with h5py.File(fname, "w") as f:
+        for path, value in leaves(mesh):
+            if not isinstance(value, np.ndarray):
+                f.attrs[path] = value
+                continue
+            t0 = time.perf_counter()
+            tolerance = tolerance_of(path, tolerances)
+            options = {"compression": "gzip", "compression_opts": level, "shuffle": True}
+            if tolerance and value.dtype.kind == "f":
+                # keep enough decimal digits for an error below the tolerance
+                options["scaleoffset"] = max(0, int(np.ceil(-np.log10(2.0 * tolerance))))
+            if value.size < 2:
+                options = {}
+            dset = f.create_dataset(path, data=value, **options)
+            report[path] = (value.nbytes, dset.id.get_storage_size(), time.perf_counter() - t0)
+    return report
+
+
+def read_compressed(fname, node=None):
+    """Read a compressed file into a Conduit node, or into a dictionary
+    {path: value} if node is None"""
+    with open(fname, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return _read_hdf5(fname, node)
+        size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(size))
+        data = f.read()
+    values = dict(header["scalars"])
+    for path, entry in header["arrays"].items():
+        start = entry["offset"]
+        values[path] = decode(entry, data[start:start + entry["nbytes"]])
+    if node is None:
+        return values
+    for path, value in values.items():
+        node[path] = value
+    return node
+
+
+def _read_hdf5(fname, node):
+    import h5py
+    values = {}
+    with h5py.File(fname, "r") as f:
+        values.update(f.attrs.items())
+        f.visititems(lambda path, item: values.__setitem__(path, item[()])
+                     if isinstance(item, h5py.Dataset) else None)
+    if node is None:
+        return values
+    for path, value in values.items():
+        node[path] = value
+    return node
+
+
+def print_report(report, comm=None):
+    """Print the compression ratio and the encoding throughput, summed over
+    all ranks"""
+    raw = sum(r[0] for r in report.values())
+    packed = sum(r[1] for r in report.values())
+    seconds = sum(r[2] for r in report.values())
+    if comm is not None:
+        from mpi4py import MPI
+        raw, packed = comm.reduce(raw, root=0), comm.reduce(packed, root=0)
+        seconds = comm.reduce(seconds, op=MPI.MAX, root=0)
+        if comm.Get_rank() != 0:
+            return
+        print("Compressed extract written by", comm.Get_size(), "ranks")
+    else:
+        for path, (r, p, s) in report.items():
+            print("  {:40s} {:10d} -> {:10d} bytes, ratio {:6.2f}, {:8.1f} MB/s".format(
+                  path, r, p, r / max(p, 1), r / max(s, 1e-9) / 1e6))
+    print("Total: {} -> {} bytes, ratio {:.2f}, encoding {:.1f} MB/s".format(
+          raw, packed, raw / max(packed, 1), raw / max(seconds, 1e-9) / 1e6))
+
+
+parser = argparse.ArgumentParser(description="print the content of a compressed extract")
+parser.add_argument("filename", type=str, help="a file written by write_compressed()")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    for path, value in read_compressed(args.filename).items():
+        if isinstance(value, np.ndarray):
+            print(path, value.dtype, value.shape, "min", value.min(), "max", value.max())
+        else:
+            print(path, value)
@@ -0,0 +1,221 @@
+##############################################################################
+# Delta-encoded time series of fields, storing only the blocks which changed
+#
+# A relay extract rewrites the whole field at every output cycle, even when
+# it has barely changed. DeltaWriter appends the fields of every output cycle
+# to a single file: a full copy (keyframe) every `keyframe` outputs, and in
+# between only the blocks of block x block values where the field differs
+# from the previous output by more than `threshold`. A changed block is
+# stored as the XOR of its 64-bit values with the previous ones, which has
+# mostly zero high-order bytes, byte-shuffled and compressed with the codecs
+# of compressed_extract.py.
+#
+# The difference is always taken with the state a reader reconstructs, not
+# with the previous exact field, so the reconstruction error never exceeds
+# the threshold (and is zero with threshold=0).
+#
+#   writer = DeltaWriter("temperature.rank_0000.delta", keyframe=10, threshold=1e-6)
+#   while running:
+#       ...
+#       writer.write(cycle, {"temperature": v}, time)
+#   writer.close()
+#
+#   reader = DeltaReader("temperature.rank_0000.delta")
+#   fields = reader.read(reader.cycles[5])   # from the keyframe before it
+#
+# Run: python3 delta_extract.py temperature.rank_0000.delta  # prints the index
+##############################################################################
+import json
+import time
+import argparse
+import numpy as np
+
+from compressed_extract import shuffle, unshuffle, compress_bytes, decompress_bytes, lz4
+
+
+class DeltaWriter:
+    """
+    Appends keyframes and block deltas of a set of 2D float64 fields
+
+    Attributes
+    ----------
+    fname : string
+        the data file. The index is written to fname + ".json"
+    keyframe : int
+        a full copy of the fields every `keyframe` outputs (default 10)
+    block : int
+        the number of values of a block along each axis (default 32)
+    threshold : float
+        a block is stored if one of its values differs by more than this
+        from the reconstructed state (default 0.0, any change)
+    codec : string
+        "zlib", "lz4" or "none", see compressed_extract.py
+    """
+    def __init__(self, fname, keyframe=10, block=32, threshold=0.0, codec=None, level=1):
+        self.fname = fname
+        self.keyframe = keyframe
+        self.block = block
+        self.threshold = threshold
+        self.codec = codec or ("lz4" if lz4 is not None else "zlib")
+        self.level = level
+        self.file = open(fname, "wb")
+        self.offset = 0
+        self.frames = []
+        self.shapes = {}
+        self.reference = {}  # the reconstructed state of every field
+        self.difference = {}
+        self.raw_bytes = 0
+        self.seconds = 0.0
+
+    def _append(self, data):
+        entry = {"offset": self.offset, "nbytes": len(data)}
+        self.file.write(data)
+        self.offset += len(data)
+        return entry
+
+    def _blocks(self, shape):
+        rows = np.arange(0, shape[0], self.block)
+        cols = np.arange(0, shape[1], self.block)
+        return rows, cols
+
+    def write(self, cycle, arrays, time_value=None):
+        """Append the fields of one output cycle"""
+        t0 = time.perf_counter()
+        key = len(self.frames) % self.keyframe == 0
+        frame = {"cycle": int(cycle), "time": float(cycle if time_value is None else time_value),
+                 "keyframe": key, "fields": {}}
+        for name, values in arrays.items():
+            values = np.asarray(values, dtype=np.float64)
+            self.raw_bytes += values.nbytes
+            if name not in self.reference:
+                self.shapes[name] = values.shape
+                self.reference[name] = np.zeros(values.shape)
+                self.difference[name] = np.zeros(values.shape)
+            ref = self.reference[name]
+            if key:
+                np.copyto(ref, values)
+                data = compress_bytes(shuffle(ref.ravel()).tobytes(), self.codec, self.level)
+                frame["fields"][name] = self._append(data)
+                continue
+            # the largest change of every block since the reconstructed state
+            diff = self.difference[name]
+            np.subtract(values, ref, out=diff)
+            np.abs(diff, out=diff)
+            rows, cols = self._blocks(values.shape)
+            change = np.maximum.reduceat(np.maximum.reduceat(diff, rows, axis=0), cols, axis=1)
+            changed = np.flatnonzero(change.ravel() > self.threshold)
+            parts = []
+            for b in changed:
+                i, j = divmod(b, cols.size)
+                r = slice(rows[i], rows[i] + self.block)
+                c = slice(cols[j], cols[j] + self.block)
+                parts.append((values[r, c].view(np.uint64) ^ ref[r, c].view(np.uint64)).ravel())
+                ref[r, c] = values[r, c]
+            xor = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint64)
+            data = compress_bytes(shuffle(xor).tobytes(), self.codec, self.level)
+            entry = self._append(data)
+            entry["blocks"] = changed.tolist()
+            frame["fields"][name] = entry
+        self.frames.append(frame)
+        if key:
+            self.write_index()
+        self.seconds += time.perf_counter() - t0
+
+    def write_index(self):
+        self.file.flush()
+        with open(self.fname + ".json", "w") as f:
+            json.dump({"codec": self.codec, "block": self.block, "threshold": self.threshold,
+                       "shapes": {k: list(v) for k, v in self.shapes.items()},
+                       "frames": self.frames}, f)
+
+    def close(self):
+        self.write_index()
+        self.file.close()
+
+    def report(self):
+        """Print the compression ratio and the write throughput"""
+        print("{}: {} outputs, {} -> {} bytes, ratio {:.1f}, {:.1f} MB/s".format(
+              self.fname, len(self.frames), self.raw_bytes, self.offset,
+              self.raw_bytes / max(self.offset, 1), self.raw_bytes / max(self.seconds, 1e-9) / 1e6))
+
+
+class DeltaReader:
+    """
+    Reconstructs any output cycle of a file written by DeltaWriter
+
+    Attributes
+    ----------
+    fname : string
+        the data file, with its index in fname + ".json"
+    """
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname + ".json") as f:
+            self.index = json.load(f)
+        self.frames = self.index["frames"]
+        self.cycles = [frame["cycle"] for frame in self.frames]
+        self.times = [frame["time"] for frame in self.frames]
+        self.block = self.index["block"]
+        self.codec = self.index["codec"]
+
+    def _read(self, f, entry):
+        f.seek(entry["offset"])
+        return decompress_bytes(f.read(entry["nbytes"]), self.codec)
+
+    def replay(self, first, last, fields=None):
+        """Yield (cycle, fields) for the output cycles in [first, last], the
+        fields being a dictionary of 2D arrays, updated in place. Only the
+        frames from the keyframe before `first` are read"""
+        targets = [k for k, cycle in enumerate(self.cycles) if first <= cycle <= last]
+        if not targets:
+            return
+        start = targets[0]
+        while not self.frames[start]["keyframe"]:
+            start -= 1
+        names = fields or list(self.index["shapes"].keys())
+        state = {}
+        with open(self.fname, "rb") as f:
+            for k in range(start, targets[-1] + 1):
+                frame = self.frames[k]
+                for name in names:
+                    shape = self.index["shapes"][name]
+                    entry = frame["fields"][name]
+                    raw = self._read(f, entry)
+                    if frame["keyframe"]:
+                        state[name] = unshuffle(raw, np.float64, shape[0] * shape[1]).reshape(shape)
+                    else:
+                        xor = unshuffle(raw, np.uint64, len(raw) // 8)
+                        self._apply(state[name], entry["blocks"], xor)
+                if k >= targets[0]:
+                    yield frame["cycle"], state
+
+    def read(self, cycle, fields=None):
+        """The fields at one output cycle"""
+        for _, state in self.replay(cycle, cycle, fields):
+            return state
+        raise KeyError("no output at cycle %d" % cycle)
+
+    def window(self, first, last, fields=None):
+        """All the output cycles in [first, last], as a list of (cycle, fields)"""
+        return [(cycle, {name: values.copy() for name, values in state.items()})
+                for cycle, state in self.replay(first, last, fields)]
+
+    def _apply(self, values, blocks, xor):
+        ncols = (values.shape[1] + self.block - 1) // self.block
+        bits = values.view(np.uint64)
+        offset = 0
+        for b in blocks:
+            i, j = divmod(b, ncols)
+            block = bits[i * self.block:(i + 1) * self.block, j * self.block:(j + 1) * self.block]
+            block ^= xor[offset:offset + block.size].reshape(block.shape)
+            offset += block.size
+
+parser = argparse.ArgumentParser(description="print the index of a delta-encoded extract")
+parser.add_argument("filename", type=str, help="a file written by DeltaWriter")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    reader = DeltaReader(args.filename)
+    for frame in reader.frames:
+        sizes = {name: entry["nbytes"] for name, entry in frame["fields"].items()}
+        print(frame["cycle"], frame["time"], "keyframe" if frame["keyframe"] else "delta", sizes)
@@ -0,0 +1,135 @@
+##############################################################################
+# Derived fields computed once per cycle in the simulation process
+#
+# The Ascent pipelines "gradient", "vector_magnitude" and "vorticity" re-run
+# their filter for every pipeline which needs them. DerivedFields computes
+# them with NumPy finite differences into arrays allocated once, and caches
+# the results until the next cycle. The arrays can be given to Conduit with
+# set_external and published as ordinary fields, shared by all the scenes:
+#
+#   derived = DerivedFields(v.shape, dx)
+#   mesh["fields/temperature_gradient_mag/values"].set_external(
+#       derived.buffer("gradient_magnitude:temperature").ravel())
+#   while running:
+#       ...
+#       derived.set_cycle(cycle)
+#       derived.gradient_magnitude("temperature", v)
+#       a.publish(mesh)
+#
+# The differences are centered, and one-sided on the first and last rows and
+# columns of the array. When the array includes ghost rows, the owned rows
+# use the values of the neighbors, and only the ghost rows are one-sided.
+##############################################################################
+import numpy as np
+
+
+def difference(values, axis, spacing, out):
+    """The derivative of `values` along `axis` (0: rows, Y, 1: columns, X)
+    into `out`, without temporary arrays"""
+    result = out
+    if axis == 1:
+        values, out = values.T, out.T
+    np.subtract(values[2:], values[:-2], out=out[1:-1])
+    out[1:-1] *= 0.5 / spacing
+    np.subtract(values[1], values[0], out=out[0])
+    np.subtract(values[-1], values[-2], out=out[-1])
+    out[0] /= spacing
+    out[-1] /= spacing
+    return result
+
+
+class DerivedFields:
+    """
+    A cache of derived fields, recomputed at most once per cycle
+
+    Attributes
+    ----------
+    shape : tuple
+        the shape (rows, columns) of the input fields, rows along Y
+    dx, dy : float
+        the grid spacing along X and Y. dy defaults to dx
+    """
+    def __init__(self, shape, dx, dy=None):
+        self.shape = shape
+        self.dx = dx
+        self.dy = dx if dy is None else dy
+        self.cycle = None
+        self.buffers = {}
+        self.valid = {}  # buffer name -> cycle of its last computation
+
+    def buffer(self, name):
+        """The array of a derived field, allocated on first use"""
+        if name not in self.buffers:
+            self.buffers[name] = np.zeros(self.shape)
+        return self.buffers[name]
+
+    def set_cycle(self, cycle):
+        """Start a new cycle: all the cached fields become invalid"""
+        self.cycle = cycle
+
+    def invalidate(self, name=None):
+        """Force the recomputation of one derived field, or of all"""
+        if name is None:
+            self.valid.clear()
+        else:
+            self.valid.pop(name, None)
+
+    def _cached(self, name):
+        if self.cycle is not None and self.valid.get(name) == self.cycle:
+            return True
+        self.valid[name] = self.cycle
+        return False
+
+    def gradient(self, field, values):
+        """The X and Y derivatives of a field"""
+        gx = self.buffer("gradient_x:" + field)
+        gy = self.buffer("gradient_y:" + field)
+        if not self._cached("gradient:" + field):
+            difference(values, 1, self.dx, gx)
+            difference(values, 0, self.dy, gy)
+        return gx, gy
+
+    def gradient_magnitude(self, field, values):
+        name = "gradient_magnitude:" + field
+        out = self.buffer(name)
+        if not self._cached(name):
+            gx, gy = self.gradient(field, values)
+            np.hypot(gx, gy, out=out)
+        return out
+
+    def velocity_magnitude(self, u, v):
+        out = self.buffer("velocity_magnitude")
+        if not self._cached("velocity_magnitude"):
+            np.hypot(u, v, out=out)
+        return out
+
+    def vorticity(self, u, v):
+        """The Z component of the vorticity, dv/dx - du/dy"""
+        out = self.buffer("vorticity")
+        if not self._cached("vorticity"):
+            _, du_dy = self.gradient("u", u)
+            dv_dx, _ = self.gradient("v", v)
+            np.subtract(dv_dx, du_dy, out=out)
+        return out
+
+    def vorticity_magnitude(self, u, v):
+        out = self.buffer("vorticity_magnitude")
+        if not self._cached("vorticity_magnitude"):
+            np.absolute(self.vorticity(u, v), out=out)
+        return out
+
+    def q_criterion(self, u, v):
+        """Q = (|Omega|^2 - |S|^2) / 2, which is, in 2D,
+        -(du/dx^2 + dv/dy^2) / 2 - du/dy * dv/dx"""
+        out = self.buffer("q_criterion")
+        if not self._cached("q_criterion"):
+            du_dx, du_dy = self.gradient("u", u)
+            dv_dx, dv_dy = self.gradient("v", v)
+            scratch = self.buffer("scratch")
+            np.multiply(du_dx, du_dx, out=out)
+            np.multiply(dv_dy, dv_dy, out=scratch)
+            out += scratch
+            out *= -0.5
+            np.multiply(du_dy, dv_dx, out=scratch)
+            out -= scratch
+        return out
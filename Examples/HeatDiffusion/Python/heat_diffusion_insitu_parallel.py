@@ -7,14 +7,42 @@
 #
 # third version runs in parallel, splitting the domain in the vertical direction
 #
+# Every rank writes to the ADIOS global array "temperature" only the rows it
+# owns, without the ghost rows of its neighbors, plus the bottom wall on the
+# first rank and the top wall on the last rank, so that every row of the
+# global array is written exactly once. verify_adios_decomposition.py checks
+# the global array against a serial computation.
+#
+# The ADIOS engine is the one of the IO "writerIO" in adios2.xml, unless it is
+# set on the command line: SST (in transit), BP5 (files, optionally with
+# asynchronous writes) or Inline (read back in the same process), with the
+# number of aggregators. A compression operator (zfp, sz, blosc, bzip2) can be
+# attached to the temperature. If ADIOS was built without it, the stream is
+# written uncompressed. --timing prints the time spent in the solver and in
+# ADIOS, for benchmark_scaling.py (backend "adios").
+#
+# With --backpressure, the time spent in ADIOS at every output is measured,
+# BeginStep() is given a timeout, and a slow consumer makes the writer drop
+# intermediate outputs instead of stalling the simulation (see backpressure.py).
+# The ranks agree on the result of BeginStep() before writing: a step opened
+# by some ranks only is waited for by the others, and so is a keyframe or an
+# output forced by a trigger (--trigger-max, --trigger-change, evaluated at
+# every iteration with insitu_triggers.py), which are never dropped.
+#
 # run: mpiexec -n 2 python3 heat_diffusion_insitu_parallel.py
+#      mpiexec -n 4 python3 heat_diffusion_insitu_parallel.py --engine BP5 \
+#                           --async --aggregators 2 --operator zfp --accuracy 1e-6
 #
 # Tested with Python 3.10.12, Tue 12 Sep 15:57:58 CEST 2023
 ##############################################################################
-import sys, math
+import os, math
+import json
+import argparse
 import numpy as np
 import adios2
 from mpi4py import MPI
+from backpressure import OutputPacer
+from insitu_triggers import TriggerEngine, ThresholdTrigger, RelativeChangeTrigger
 
 class Simulation:
     """
@@ -35,6 +63,10 @@ class Simulation:
         self.xres = resolution
         # self.yres is redefined when splitting the parallel domain
         self.dx = 1.0 / (self.xres + 1)
+        # accumulated wall-clock time (seconds) of each phase of the run
+        self.timers = dict.fromkeys(("initialize", "compute", "exchange",
+                                     "insitu", "finalize"), 0.0)
+        self.inline = None
 
     def Initialize(self):
         """ 2 additional boundary points are added. Iterations will only touch
@@ -45,23 +77,81 @@ class Simulation:
         self.v = np.zeros(self.rmesh_dims) # includes 2 ghosts
         #self.vnew = np.zeros([self.yres, self.xres])
         self.set_initial_bc()
-        
-    def Initialize_ADIOS(self):
-        self.adios = adios2.ADIOS(configFile="adios2.xml", comm=self.comm)
+        # the rows written by this rank: the owned rows, and the bottom (top)
+        # wall on the first (last) rank. The ghost rows are owned by the
+        # neighbors. A range of rows is a contiguous view of self.v, which
+        # is updated in place: it is given to ADIOS without a copy
+        first = 0 if self.par_rank == 0 else 1
+        last = self.yres + 2 if self.par_rank == self.par_size - 1 else self.yres + 1
+        self.first_row = first
+        self.owned = self.v[first:last]
+
+    def Initialize_ADIOS(self, config="adios2.xml", engine=None, aggregators=None,
+                         async_write=False, operator=None, accuracy=1e-6,
+                         queue_limit=None, queue_policy=None):
+        """
+        Define the ADIOS IO, its engine and the variables
+
+        Attributes
+        ----------
+        config : string
+            the ADIOS XML configuration, ignored if the file does not exist
+        engine : string
+            "SST", "BP5", "BP4" or "Inline". None keeps the engine of the
+            configuration (BP if there is none)
+        aggregators : int
+            the number of aggregators (NumAggregators) of the BP engines
+        async_write : boolean
+            BP5 only: write in a background thread (AsyncWrite)
+        operator : string
+            "zfp", "sz", "mgard" (error-bounded by accuracy), "blosc" or
+            "bzip2" (lossless). None for an uncompressed stream
+        queue_limit, queue_policy : int, string
+            SST only: the number of steps queued for the readers, and "Block"
+            or "Discard" when the queue is full
+        """
+        t0 = MPI.Wtime()
+        if os.path.exists(config):
+            self.adios = adios2.ADIOS(configFile=config, comm=self.comm)
+        else:
+            self.adios = adios2.ADIOS(self.comm)
         self.io    = self.adios.DeclareIO("writerIO")
         #self.io    = self.adios.DeclareIO("InTransit-vis")
-        self.T_id  = self.io.DefineVariable("temperature", self.v,
+        if engine is not None:
+            self.io.SetEngine(engine)
+        self.engine_type = engine or self.io.EngineType()
+        if aggregators is not None:
+            self.io.SetParameter("NumAggregators", str(aggregators))
+        if async_write:
+            self.io.SetParameter("AsyncWrite", "true")
+        if queue_limit is not None:
+            self.io.SetParameter("QueueLimit", str(queue_limit))
+        if queue_policy is not None:
+            self.io.SetParameter("QueueFullPolicy", queue_policy)
+        self.T_id  = self.io.DefineVariable("temperature", self.owned,
                                             [1, self.xres+2, self.xres+2], # Shape of global object
-                                            [0, self.par_rank * self.yres, 0], # Where to begin writing
-                                            [1, self.yres+2, self.xres+2], # Where to end writing
+                                            [0, self.par_rank * self.yres + self.first_row, 0], # Where to begin writing
+                                            [1, self.owned.shape[0], self.xres+2], # Size of the written block
                                             adios2.ConstantDims)
         self.step_id  = self.io.DefineVariable("step", np.array([1], dtype=np.int32))
+        self.operator = None
+        if operator is not None:
+            # an operator which is not compiled into ADIOS raises an exception
+            parameters = {"accuracy": str(accuracy)} if operator in ("zfp", "sz", "mgard") else {}
+            try:
+                op = self.adios.DefineOperator("temperature_" + operator, operator)
+                self.T_id.AddOperation(op, parameters)
+                self.operator = operator
+            except Exception as e:
+                if self.par_rank == 0:
+                    print("ADIOS operator", operator, "is not available, writing uncompressed:", e)
         self.io.DefineAttribute("Fides_Data_Model", "uniform")
         self.io.DefineAttribute("Fides_Origin", np.array([0, 0., 0.]))
         self.io.DefineAttribute("Fides_Spacing", np.array([self.dx, self.dx, self.dx]))
         self.io.DefineAttribute("Fides_Dimension_Variable", "temperature")
         self.io.DefineAttribute("Fides_Variable_List", ["temperature"])
         self.io.DefineAttribute("Fides_Variable_Associations", ["points"])
+        self.timers["initialize"] += MPI.Wtime() - t0
 
     def set_initial_bc(self):
         if self.par_size > 1:
@@ -69,7 +159,9 @@ class Simulation:
             self.v[0,:] = [math.sin(math.pi * j * self.dx)
                            for j in range(self.rmesh_dims[1])]
           if self.par_rank == (self.par_size - 1):
-            self.v[-1,:] = self.v[0,:] * math.exp(-math.pi)
+            # the top wall, as in the serial run: row 0 of this rank is a ghost row
+            self.v[-1,:] = [math.sin(math.pi * j * self.dx) * math.exp(-math.pi)
+                           for j in range(self.rmesh_dims[1])]
         else:
           #first (bottom) row
           self.v[0,:] = [math.sin(math.pi * j * self.dx)
@@ -81,6 +173,7 @@ class Simulation:
         pass
 
     def SimulateOneTimestep(self):
+        t0 = MPI.Wtime()
         self.iteration += 1
         
         if self.par_rank == 0:
@@ -92,6 +185,8 @@ class Simulation:
                              self.v[1:-1, :-2]) # west neighbor
         # copy now vnew to the interior region of v, leaving the boundary walls untouched.
         self.v[1:-1,1:-1] = self.vnew.copy()
+        t1 = MPI.Wtime()
+        self.timers["compute"] += t1 - t0
 
         if self.par_size > 1:
           # if in parallel, exchange ghost cells now
@@ -106,19 +201,93 @@ class Simulation:
                              dest=above, recvbuf=[self.v[-0,], self.xres + 2, MPI.DOUBLE], source=below)
           self.comm.Sendrecv([self.v[1,], self.xres + 2, MPI.DOUBLE],
                              dest=below, recvbuf=[self.v[-1,], self.xres + 2, MPI.DOUBLE], source=above)
+        self.timers["exchange"] += MPI.Wtime() - t1
 
-    def MainLoop(self, frequency=100):
-      engine = self.io.Open("diffusion.bp", adios2.Mode.Write)
+    def BeginStep(self, engine, timeout, block):
+      """Open the next step on all the ranks, or on none of them. Returns
+      True if the step is open. A step opened by some ranks only, or a step
+      which must be written (block), is waited for without a timeout by the
+      other ranks: EndStep() is collective, and would never return"""
+      status = engine.BeginStep(adios2.StepMode.Append, timeout)
+      opened = self.comm.allreduce(int(status == adios2.StepStatus.OK), op=MPI.SUM)
+      if opened == self.par_size:
+        return True
+      if opened == 0 and not block:
+        return False
+      if status != adios2.StepStatus.OK:
+        status = engine.BeginStep(adios2.StepMode.Append, -1.0)
+      opened = self.comm.allreduce(int(status == adios2.StepStatus.OK), op=MPI.SUM)
+      if opened != self.par_size:
+        raise RuntimeError("BeginStep failed on %d ranks" % (self.par_size - opened))
+      return True
+
+    def MainLoop(self, frequency=100, fname="diffusion.bp", pacer=None, timeout=-1.0,
+                 triggers=None):
+      """Write every frequency iterations, or when the OutputPacer decides,
+      and when a trigger of the TriggerEngine fires. timeout is the longest
+      wait (seconds) in BeginStep, -1 for no limit"""
+      t0 = MPI.Wtime()
+      engine = self.io.Open(fname, adios2.Mode.Write)
+      if self.engine_type.lower() == "inline":
+        # the Inline engine needs a reader in the same process, opened after the writer
+        self.inline = self.io.Open(fname, adios2.Mode.Read)
+        self.inline_values = np.zeros(self.owned.shape)
+      self.timers["initialize"] += MPI.Wtime() - t0
       while self.iteration < self.Max_iterations:
         # writing the ADIOS data before the first simulation step enables us to
         # verify the boundary conditions by writing the 0-th step
-        if self.iteration % frequency == 0:
-          engine.BeginStep()
-          engine.Put(self.T_id, self.v)
-          engine.Put(self.step_id, np.array([self.iteration], dtype=np.int32))
-          engine.EndStep()
+        t0 = MPI.Wtime()
+        forced = False
+        if triggers is not None:
+          forced = bool(triggers.evaluate(self.iteration, {"temperature": self.owned}))
+        if (pacer.due(self.iteration, force=forced) if pacer is not None
+            else self.iteration % frequency == 0 or forced):
+          # the keyframes and the forced outputs are waited for, never dropped
+          block = pacer is None or forced or pacer.is_keyframe(self.iteration)
+          t1 = MPI.Wtime()
+          ok = self.BeginStep(engine, timeout, block)
+          if ok:
+            engine.Put(self.T_id, self.owned)
+            engine.Put(self.step_id, np.array([self.iteration], dtype=np.int32))
+            engine.EndStep()
+            if triggers is not None:
+              triggers.published({"temperature": self.owned})
+          if pacer is not None:
+            pacer.record(self.iteration, MPI.Wtime() - t1, ok)
+          if self.inline is not None and ok:
+            self.inline.BeginStep()
+            var = self.io.InquireVariable("temperature")
+            var.SetBlockSelection(0)
+            self.inline.Get(var, self.inline_values, adios2.Mode.Sync)
+            self.inline.EndStep()
+        self.timers["insitu"] += MPI.Wtime() - t0
         self.SimulateOneTimestep()
+      t0 = MPI.Wtime()
+      if self.inline is not None:
+        self.inline.Close()
       engine.Close()
+      if pacer is not None:
+        pacer.close()
+      self.timers["finalize"] += MPI.Wtime() - t0
+
+    def ReportTimings(self, fname, **labels):
+        """Print one "TIMING {json}" line on rank 0 with the slowest rank's
+        time for each phase, the total of the slowest rank (not the sum of
+        the phase maxima, which may come from different ranks), and the size
+        of the BP output if there is one"""
+        local = np.array(list(self.timers.values()) + [sum(self.timers.values())])
+        slowest = np.zeros_like(local)
+        self.comm.Reduce(local, slowest, op=MPI.MAX, root=0)
+        if self.par_rank == 0:
+            record = dict(labels, ranks=self.par_size, res=self.xres, mesh="uniform",
+                          kernel="numpy", iterations=self.iteration,
+                          engine=self.engine_type, operator=self.operator or "none")
+            record.update(zip(self.timers.keys(), slowest[:-1].tolist()))
+            record["total"] = float(slowest[-1])
+            if os.path.isdir(fname):
+                record["bytes"] = sum(os.path.getsize(os.path.join(fname, f))
+                                      for f in os.listdir(fname))
+            print("TIMING", json.dumps(record), flush=True)
 
 class ParallelSimulation(Simulation):
     def __init__(self, resolution, iterations):
@@ -129,7 +298,9 @@ class ParallelSimulation(Simulation):
     def Initialize(self):
         self.par_size = self.comm.Get_size()
         self.par_rank = self.comm.Get_rank()
-        # split the parallel domain along the Y axis. No error check!
+        # split the parallel domain along the Y axis, in equal slabs
+        assert self.xres % self.par_size == 0, \
+            "the resolution %d is not a multiple of the number of ranks %d" % (self.xres, self.par_size)
         self.yres = self.xres // self.par_size
         Simulation.Initialize(self)
 
@@ -138,11 +309,83 @@ class ParallelSimulation(Simulation):
 
 # Main program
 #
-def main():
-    sim = ParallelSimulation(resolution=64, iterations=10000)
+def main(args):
+    sim = ParallelSimulation(resolution=args.res, iterations=args.timesteps)
     sim.Initialize()
-    sim.Initialize_ADIOS()
-    sim.MainLoop(frequency=500)
+    sim.Initialize_ADIOS(config=args.config, engine=args.engine,
+                         aggregators=args.aggregators, async_write=args.async_write,
+                         operator=args.operator, accuracy=args.accuracy,
+                         queue_limit=args.queue_limit, queue_policy=args.queue_policy)
+    pacer = None
+    if args.backpressure:
+        pacer = OutputPacer(sim.comm, args.frequency, policy=args.backpressure,
+                            threshold=args.stall_threshold, max_stride=args.max_stride,
+                            keyframe=args.keyframe, log=args.backpressure_log)
+    triggers = []
+    if args.trigger_max is not None:
+        triggers.append(ThresholdTrigger("temperature", above=args.trigger_max))
+    if args.trigger_change is not None:
+        triggers.append(RelativeChangeTrigger("temperature", args.trigger_change))
+    sim.MainLoop(frequency=args.frequency, fname=args.output, pacer=pacer,
+                 timeout=args.step_timeout,
+                 triggers=TriggerEngine(sim.comm, triggers) if triggers else None)
     sim.Finalize()
+    if args.timing:
+        sim.ReportTimings(args.output, backend="adios")
+
+
+parser = argparse.ArgumentParser(
+    description="parallel heat diffusion miniapp writing its temperature with ADIOS")
+parser.add_argument("-t", "--timesteps", type=int, default=10000,
+                    help="number of timesteps to run the miniapp (default: 10000)")
+parser.add_argument("--res", type=int, default=64,
+                    help="resolution in each coordinate direction (default: 64)")
+parser.add_argument("-f", "--frequency", type=int, default=500,
+                    help="frequency of the ADIOS steps (default: 500)")
+parser.add_argument("-o", "--output", type=str, default="diffusion.bp",
+                    help="the ADIOS file or stream name (default: diffusion.bp)")
+parser.add_argument("--config", type=str, default="adios2.xml",
+                    help="ADIOS XML configuration (default: adios2.xml, if it exists)")
+parser.add_argument("-e", "--engine", type=str, default=None,
+                    choices=["SST", "BP5", "BP4", "Inline"],
+                    help="ADIOS engine (default: the engine of writerIO in the configuration)")
+parser.add_argument("--aggregators", type=int, default=None,
+                    help="number of aggregators of the BP engines")
+parser.add_argument("--async", dest="async_write", action="store_true",
+                    help="asynchronous writes of the BP5 engine")
+parser.add_argument("--operator", type=str, default=None,
+                    choices=["zfp", "sz", "mgard", "blosc", "bzip2"],
+                    help="compression operator of the temperature (default: none)")
+parser.add_argument("--accuracy", type=float, default=1e-6,
+                    help="absolute error bound of zfp, sz and mgard (default: 1e-6)")
+parser.add_argument("--queue-limit", type=int, default=None,
+                    help="number of steps queued by the SST engine")
+parser.add_argument("--queue-policy", type=str, default=None, choices=["Block", "Discard"],
+                    help="what the SST engine does when its queue is full")
+parser.add_argument("--backpressure", type=str, default=None, choices=["fixed", "adaptive"],
+                    help="measure the time spent in ADIOS at every output, and with "
+                         "\"adaptive\" drop intermediate outputs when the consumer is slow")
+parser.add_argument("--stall-threshold", type=float, default=0.05,
+                    help="an output stalls if it took longer (seconds, default: 0.05)")
+parser.add_argument("--max-stride", type=int, default=16,
+                    help="the largest multiple of --frequency between two outputs (default: 16)")
+parser.add_argument("--keyframe", type=int, default=10,
+                    help="every KEYFRAME-th output of --frequency is never dropped (default: 10)")
+parser.add_argument("--step-timeout", type=float, default=-1.0,
+                    help="longest wait in BeginStep, in seconds, for the outputs which "
+                         "--backpressure may drop (default: -1, no limit)")
+parser.add_argument("--trigger-max", type=float, default=None,
+                    help="also write the iteration where the maximum temperature rises "
+                         "above this value")
+parser.add_argument("--trigger-change", type=float, default=None,
+                    help="also write the iterations where the relative L2 change of the "
+                         "temperature since the last output is above this value")
+parser.add_argument("--backpressure-log", type=str, default="backpressure.csv",
+                    help="CSV file of the dropped and stalled outputs (default: backpressure.csv)")
+parser.add_argument("--timing",
+                    help="print the per-phase timings as a single TIMING line on rank 0",
+                    action='store_true')  # on/off flag
 
-main()
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args)
@@ -11,16 +11,31 @@
 #
 # Tested with Python 3.10.12, Tue 12 Sep 16:28:23 CEST 2023
 ##############################################################################
+import os
 import sys
 import math
+import json
 import argparse
 import numpy as np
 import conduit
 import conduit.blueprint
+import conduit.relay.io
 import ascent.mpi
 import matplotlib.pyplot as plt
 
 from mpi4py import MPI
+from blueprint_recorder import BlueprintRecorder
+from insitu_triggers import (TriggerEngine, CycleTrigger, ThresholdTrigger,
+                             RelativeChangeTrigger, EntropyTrigger)
+from insitu_statistics import FieldStatistics, TemporalStatistics
+from parallel_contours import save_contour_image
+from marching_squares import isolines, line_mesh
+from derived_fields import DerivedFields
+from multiresolution import CoarseField
+from roi_blocks import ActiveBlocks
+from delta_extract import DeltaWriter
+from timeseries_hdf5 import TimeSeriesWriter
+from compressed_extract import write_compressed, print_report
 
 class Simulation:
     """
@@ -33,13 +48,17 @@ class Simulation:
         the number of grid points on the I and J axis (default 64)
     iterations : int
         the maximum number of iterations (default 100)
+    kernel : string
+        "numpy" evaluates the stencil with temporary arrays, "inplace" accumulates
+        into the preallocated self.vnew buffer (default "numpy")
     """
-    def __init__(self, resolution=64, iterations=100):
+    def __init__(self, resolution=64, iterations=100, kernel="numpy"):
         self.par_size = 1
         self.par_rank = 0
         self.iteration = 0  # current iteration
         self.Max_iterations = iterations
         self.xres = resolution
+        self.kernel = kernel
         self.yres = resolution  # redefined when splitting the parallel domain
         self.dx = 1.0 / (self.xres + 1)
 
@@ -86,6 +105,15 @@ class Simulation:
         # there is no ghost-data exchange. Run in serial-mode only
         self.iteration += 1
 
+        if self.kernel == "inplace":
+            # same summation order as below, without any temporary array
+            np.add(self.v[2:, 1:-1], self.v[0:-2, 1:-1], out=self.vnew)
+            np.add(self.vnew, self.v[1:-1, 2:], out=self.vnew)
+            np.add(self.vnew, self.v[1:-1, :-2], out=self.vnew)
+            self.vnew *= 0.25
+            self.v[1:-1, 1:-1] = self.vnew
+            return
+
         self.vnew = 0.25 * (self.v[2:, 1:-1] +  # north neighbor
                             self.v[0:-2, 1:-1] +  # south neighbor
                             self.v[1:-1, 2:] +  # east neighbor
@@ -116,21 +144,122 @@ class ParallelSimulation_With_Ascent(Simulation):
         process each MPI partition correcly with all 4 grid types.
     verbose : boolean
         prints the Conduit node(s) describing the mesh
+    kernel : string
+        "numpy" or "inplace", see Simulation
+    insitu : boolean
+        when False, the mesh is described but Ascent is never opened. This is
+        the "null" backend used as a baseline by benchmark_scaling.py
+    record : string
+        if set, every published mesh is also saved in this directory for
+        offline replay with blueprint_recorder.py
+    triggers : list
+        if set, the mesh is published only on the cycles where one of these
+        insitu_triggers objects fires, instead of every `frequency` cycles
+    statistics : string
+        if set, the global min/max/mean/std of the temperature at every cycle
+        are written to this CSV (or .h5) file
+    temporal : boolean
+        publish the running mean and standard deviation over time of the
+        temperature at every point, as the fields temperature_mean and
+        temperature_std
+    temporal_alpha : float
+        if set, use an exponential window of about 1/temporal_alpha iterations
+        instead of all the iterations since the start
+    compress : float
+        if set, the final mesh is also written by every rank with
+        compressed_extract.py, next to the relay extract. The temperature
+        fields are reconstructed within this absolute error (0 is lossless)
+    isolines : int
+        if set, the iso-lines of the temperature for this number of levels
+        are extracted with marching_squares.py at every iteration, equally
+        spaced within the global range of the temperature. Every rank saves
+        its domain of a Blueprint line mesh, and rank 0 the root file of the
+        cycle, isolines.cycle_NNNNNN.root, in the output directory of MainLoop
+    derived : boolean
+        publish the magnitude of the temperature gradient, computed with
+        derived_fields.py, as the field temperature_gradient_mag, and render it
+    coarsen : int
+        if set, a copy of the temperature averaged over blocks of coarsen x
+        coarsen points (a power of 2) is published every `coarse_frequency`
+        iterations and rendered as a small image, between the full-resolution
+        publications
+    coarse_frequency : int
+        how often the coarse mesh is published (default 10)
+    roi : float
+        if set, only the blocks of roi_block x roi_block points where the
+        temperature varies by more than this value are published, each as a
+        domain, with the outlines of the other blocks (see roi_blocks.py).
+        The blocks have no derived fields: not with derived
+    roi_block : int
+        the size of the blocks of roi (default 32)
+    delta : int
+        if set, every rank appends its temperature to a delta-encoded time
+        series every `frequency` iterations, with a keyframe every `delta`
+        outputs (see delta_extract.py)
+    delta_threshold : float
+        the largest change of a value not stored in the deltas (default 0.0)
+    timeseries : string
+        if set, the temperature of every published cycle is appended to this
+        HDF5 file (see timeseries_hdf5.py)
+    aggregators : int
+        the number of timeseries files, each written by one rank for a group
+        of ranks (default 1)
     """
 
-    def __init__(self, resolution=64, iterations=100, meshtype="uniform", verbose=False):
+    def __init__(self, resolution=64, iterations=100, meshtype="uniform", verbose=False,
+                 kernel="numpy", insitu=True, record=None, triggers=None, statistics=None,
+                 temporal=False, temporal_alpha=None, compress=None,
+                 isolines=None, derived=False, coarsen=None, coarse_frequency=10,
+                 roi=None, roi_block=32, delta=None, delta_threshold=0.0,
+                 timeseries=None, aggregators=1):
         self.comm = MPI.COMM_WORLD
-        Simulation.__init__(self, resolution, iterations)
+        Simulation.__init__(self, resolution, iterations, kernel)
         self.MeshType = meshtype
         self.verbose = verbose
+        self.insitu = insitu
+        self.record = record
+        self.triggers = None
+        if triggers:
+            self.triggers = TriggerEngine(self.comm, triggers)
+        self.statistics = None
+        if statistics:
+            self.statistics = FieldStatistics(["temperature"], self.comm, statistics)
+        self.temporal = temporal
+        self.temporal_alpha = temporal_alpha
+        self.temporal_stats = None
+        self.compress = compress
+        self.derived = derived
+        self.derived_fields = None
+        self.coarsen = coarsen
+        self.coarse_frequency = coarse_frequency
+        self.coarse = None
+        self.roi_threshold = roi
+        self.roi_block = roi_block
+        self.roi = None
+        self.delta_keyframe = delta
+        self.delta_threshold = delta_threshold
+        self.delta = None
+        self.timeseries = timeseries
+        self.aggregators = aggregators
+        self.series = None
+        self.isolines = isolines
+        # accumulated wall-clock time (seconds) of each phase of the run
+        self.timers = dict.fromkeys(("initialize", "compute", "exchange",
+                                     "insitu", "finalize"), 0.0)
 
     # Override Initialize for parallel
     def Initialize(self):
+        t0 = MPI.Wtime()
         self.par_size = self.comm.Get_size()
         self.par_rank = self.comm.Get_rank()
         # split the parallel domain along the Y axis. No error check!
         self.yres = self.xres // self.par_size
         Simulation.Initialize(self)
+        # the rows owned by this rank: the interior rows, plus the global
+        # boundary rows on the first and on the last rank. A contiguous view
+        lo = 0 if self.par_rank == 0 else 1
+        hi = self.yres + 2 if self.par_rank == self.par_size - 1 else self.yres + 1
+        self.owned = self.v[lo:hi]
 
         # Add Conduit node and Ascent actions
         # set options to allow errors propagate to python
@@ -143,8 +272,14 @@ class ParallelSimulation_With_Ascent(Simulation):
             # not implemented yet
             pass
         # open Ascent
-        self.a = ascent.mpi.Ascent()
-        self.a.open(ascent_opts)
+        if self.insitu:
+            self.a = ascent.mpi.Ascent()
+            # the coarse previews are not recorded: the recording holds the
+            # full-resolution mesh only
+            self.preview = self.a
+            if self.record:
+                self.a = BlueprintRecorder(self.record, self.comm, self.a)
+            self.a.open(ascent_opts)
 
         # setup a mesh
         self.mesh = conduit.Node()
@@ -211,6 +346,24 @@ class ParallelSimulation_With_Ascent(Simulation):
         # Views that are effectively 1D-strided are supported.
         self.mesh["fields/temperature/values"].set_external(self.v.ravel())
 
+        if self.temporal:
+            # running statistics over time, updated in place at every iteration
+            self.temporal_stats = TemporalStatistics(self.v.shape, self.temporal_alpha)
+            for name, values in (("temperature_mean", self.temporal_stats.mean),
+                                 ("temperature_std", self.temporal_stats.std)):
+                self.mesh["fields/" + name + "/association"] = "vertex"
+                self.mesh["fields/" + name + "/topology"] = "mesh"
+                self.mesh["fields/" + name + "/values"].set_external(values.ravel())
+
+        if self.derived:
+            # computed from the ghosted array, so that the owned rows use
+            # centered differences across the rank boundaries
+            self.derived_fields = DerivedFields(self.v.shape, self.dx)
+            self.mesh["fields/temperature_gradient_mag/association"] = "vertex"
+            self.mesh["fields/temperature_gradient_mag/topology"] = "mesh"
+            self.mesh["fields/temperature_gradient_mag/values"].set_external(
+                self.derived_fields.buffer("gradient_magnitude:temperature").ravel())
+
         if self.MeshType in ('uniform', 'rectilinear'):
             # create a vertex associated field called "point_ghosts"
             self.mesh["fields/point_ghosts/association"] = "vertex"
@@ -237,9 +390,37 @@ class ParallelSimulation_With_Ascent(Simulation):
         self.scenes["s1/plots/p1/field"] = "temperature"
         # add a second plot to draw the grid lines
         self.scenes["s1/plots/p2/type"] = "mesh"
+        if self.derived:
+            self.scenes["s2/plots/p1/type"] = "pseudocolor"
+            self.scenes["s2/plots/p1/field"] = "temperature_gradient_mag"
+        if self.coarsen:
+            # the interior points owned by this rank, averaged by blocks
+            self.coarse = CoarseField((self.yres, self.xres), self.coarsen)
+            self.coarse_mesh = self.coarse.describe(
+                conduit.Node(), (self.dx, (self.par_rank * self.yres + 1) * self.dx),
+                self.dx, "temperature")
+            self.coarse_actions = conduit.Node()
+            add_act = self.coarse_actions.append()
+            add_act["action"] = "add_scenes"
+            self.coarse_scenes = add_act["scenes"]
+            self.coarse_scenes["s1/plots/p1/type"] = "pseudocolor"
+            self.coarse_scenes["s1/plots/p1/field"] = "temperature"
+            self.coarse_scenes["s1/renders/r1/image_width"] = 256
+            self.coarse_scenes["s1/renders/r1/image_height"] = 256
+        if self.timeseries:
+            self.series = TimeSeriesWriter(self.timeseries, self.comm, self.aggregators)
+        if self.delta_keyframe:
+            self.delta = DeltaWriter("temperature.rank_%04d.delta" % self.par_rank,
+                                     self.delta_keyframe, threshold=self.delta_threshold)
+        if self.roi_threshold is not None:
+            self.roi = ActiveBlocks(self.v.shape, self.roi_block, self.roi_threshold)
+        self.timers["initialize"] += MPI.Wtime() - t0
 
     def SimulateOneTimestep(self):
+        t0 = MPI.Wtime()
         Simulation.SimulateOneTimestep(self)
+        t1 = MPI.Wtime()
+        self.timers["compute"] += t1 - t0
 
         if self.par_size > 1:
             # if in parallel, exchange ghost cells now
@@ -254,24 +435,83 @@ class ParallelSimulation_With_Ascent(Simulation):
                                recvbuf=[self.v[-0,], self.xres + 2, MPI.DOUBLE], source=below)
             self.comm.Sendrecv([self.v[1,], self.xres + 2, MPI.DOUBLE], dest=below,
                                recvbuf=[self.v[-1,], self.xres + 2, MPI.DOUBLE], source=above)
+        self.timers["exchange"] += MPI.Wtime() - t1
 
-    def MainLoop(self, frequency=100):
+    def MainLoop(self, frequency=100, savedir="./"):
         while self.iteration < self.Max_iterations:
             self.SimulateOneTimestep()
-            if not self.iteration % frequency:
+            if self.statistics is not None:
+                self.statistics.update(self.iteration, {"temperature": self.owned},
+                                       self.iteration * 0.1)
+            if self.temporal_stats is not None:
+                self.temporal_stats.update(self.v)
+            if self.isolines:
+                self.SaveIsolines(savedir)
+            if self.delta is not None and not self.iteration % frequency:
+                self.delta.write(self.iteration, {"temperature": self.v}, self.iteration * 0.1)
+            if not self.insitu:
+                continue
+            t0 = MPI.Wtime()
+            if self.triggers is not None:
+                fired = self.triggers.evaluate(self.iteration, {"temperature": self.owned})
+                if fired and self.verbose and self.par_rank == 0:
+                    print("cycle", self.iteration, "triggered by", ", ".join(fired))
+            else:
+                fired = not self.iteration % frequency
+            if fired:
                 self.mesh["state/cycle"] = self.iteration
                 self.mesh["state/time"] = self.iteration * 0.1
                 self.mesh["state/title"] = "2D Heat diffusion simulation"
                 self.mesh["state/info"] = "In-situ pseudocolor rendering of temperature"
 
                 self.scenes["s1/renders/r1/image_name"] = "temperature-par.%04d" % self.iteration
+                if self.temporal_stats is not None:
+                    self.temporal_stats.update_std()
+                if self.derived_fields is not None:
+                    self.scenes["s2/renders/r1/image_name"] = "temperature-gradient.%04d" % self.iteration
+                    self.derived_fields.set_cycle(self.iteration)
+                    self.derived_fields.gradient_magnitude("temperature", self.v)
                 # execute the actions
-                self.a.publish(self.mesh)
+                published = self.PublishedBlocks() if self.roi is not None else self.mesh
+                if self.record:
+                    # the blocks of --roi have no top-level state/cycle
+                    self.a.publish(published, cycle=self.iteration)
+                else:
+                    self.a.publish(published)
                 self.a.execute(self.actions)
+                if self.triggers is not None:
+                    self.triggers.published({"temperature": self.owned})
+                if self.series is not None:
+                    self.series.append(self.iteration, self.iteration * 0.1,
+                                       {"temperature": self.owned})
+            elif self.coarse is not None and not self.iteration % self.coarse_frequency:
+                # a low-resolution preview between the full-resolution images
+                self.coarse.restrict(self.v[1:-1, 1:-1])
+                self.coarse_mesh["state/cycle"] = self.iteration
+                self.coarse_scenes["s1/renders/r1/image_name"] = "temperature-coarse.%04d" % self.iteration
+                self.preview.publish(self.coarse_mesh)
+                self.preview.execute(self.coarse_actions)
+            self.timers["insitu"] += MPI.Wtime() - t0
 
     def Finalize(self, savedir="./"):
         """ After the final timestep, we save the solution array to disk
         and we close Ascent"""
+        if self.statistics is not None:
+            self.statistics.flush()
+        if self.series is not None:
+            self.series.close()
+        if self.delta is not None:
+            self.delta.close()
+            if self.verbose:
+                self.delta.report()
+        if not self.insitu:
+            return
+        t0 = MPI.Wtime()
+        if self.temporal_stats is not None:
+            self.temporal_stats.update_std()
+        if self.derived_fields is not None:
+            self.derived_fields.set_cycle(self.iteration)
+            self.derived_fields.gradient_magnitude("temperature", self.v)
         self.a.publish(self.mesh)
         action = conduit.Node()
         add_extr = action.append()
@@ -281,7 +521,87 @@ class ParallelSimulation_With_Ascent(Simulation):
         extracts["e1/params/path"] = savedir + "mesh"
         extracts["e1/params/protocol"] = "blueprint/mesh/hdf5"
         self.a.execute(action)
+        if self.compress is not None:
+            # every rank writes its own domain, error-bounded on the temperature
+            tolerances = dict.fromkeys(("temperature", "temperature_mean",
+                                        "temperature_std"), self.compress)
+            fname = savedir + "mesh.cycle_%06d.rank_%04d.cz" % (self.iteration, self.par_rank)
+            print_report(write_compressed(self.mesh, fname, tolerances), self.comm)
         self.a.close()
+        self.timers["finalize"] += MPI.Wtime() - t0
+
+    def PublishedBlocks(self):
+        """The active blocks of the temperature as a multi-domain mesh, and
+        the outlines of the inactive blocks"""
+        nblocks = self.roi.active.size + 1  # the outline is one more domain
+        # the cycle and time of the mesh are copied into every domain
+        state = {"cycle": self.mesh["state/cycle"], "time": self.mesh["state/time"]}
+        blocks = self.roi.describe(conduit.Node(), self.v, self.ghosts,
+                                   (0.0, self.par_rank * self.yres * self.dx), self.dx,
+                                   "temperature", self.par_rank * nblocks, state=state)
+        if self.verbose:
+            active = self.comm.reduce(int(self.roi.active.sum()), root=0)
+            if self.par_rank == 0:
+                print("cycle", self.iteration, ":", active, "active blocks out of",
+                      self.par_size * (nblocks - 1))
+        return blocks
+
+    def SaveIsolines(self, savedir="./"):
+        """Save the iso-lines of the temperature as a multi-domain Blueprint
+        line mesh in `savedir`: one file per rank, and a root file written by
+        rank 0"""
+        # the levels are equally spaced within the global range of the field
+        extents = np.array([-self.owned.min(), self.owned.max()])
+        self.comm.Allreduce(MPI.IN_PLACE, extents, op=MPI.MAX)
+        levels = np.linspace(-extents[0], extents[1], self.isolines + 2)[1:-1]
+        # the rows up to the first row of the next rank, all rows on the last rank
+        hi = self.yres + 2 if self.par_rank == self.par_size - 1 else self.yres + 1
+        points, segments, values = isolines(self.v[:hi], levels,
+                                            (0.0, self.par_rank * self.yres * self.dx), self.dx)
+        contours = line_mesh(conduit.Node(), points, segments, values)
+        contours["state/cycle"] = self.iteration
+        contours["state/domain_id"] = self.par_rank
+        pattern = "isolines.cycle_%06d" % self.iteration
+        conduit.relay.io.save(contours, os.path.join(savedir, pattern + ".rank_%04d.hdf5"
+                                                     % self.par_rank))
+        if self.par_rank == 0:
+            # the schema of the domains is the same on all ranks, even empty
+            root = conduit.Node()
+            conduit.blueprint.mesh.generate_index(contours, "", self.par_size,
+                                                  root["blueprint_index/contours"])
+            root["protocol/name"] = "hdf5"
+            root["protocol/version"] = conduit.about()["version"]
+            root["number_of_files"] = self.par_size
+            root["number_of_trees"] = self.par_size
+            # relative to the directory of the root file
+            root["file_pattern"] = pattern + ".rank_%04d.hdf5"
+            root["tree_pattern"] = "/"
+            conduit.relay.io.save(root, os.path.join(savedir, pattern + ".root"), "hdf5")
+
+    def SaveContourImage(self):
+        """Write one image of the global iso-contours. Only the contour
+        polylines are sent to rank 0, see parallel_contours.py"""
+        # the rows up to the first row of the next rank, all rows on the last rank
+        hi = self.yres + 2 if self.par_rank == self.par_size - 1 else self.yres + 1
+        save_contour_image(self.comm, self.v[:hi], self.par_rank * self.yres * self.dx, self.dx,
+                           f'Temperature-iso-contours.{self.iteration:04d}.png')
+
+    def ReportTimings(self, **labels):
+        """Print one "TIMING {json}" line on rank 0 with the slowest rank's
+        time for each phase, and the total of the slowest rank (not the sum
+        of the phase maxima, which may come from different ranks). The labels
+        are copied verbatim into the record so that benchmark_scaling.py can
+        identify the case."""
+        local = np.array(list(self.timers.values()) + [sum(self.timers.values())])
+        slowest = np.zeros_like(local)
+        self.comm.Reduce(local, slowest, op=MPI.MAX, root=0)
+        if self.par_rank == 0:
+            record = dict(labels, ranks=self.par_size, res=self.xres,
+                          mesh=self.MeshType, kernel=self.kernel,
+                          iterations=self.iteration)
+            record.update(zip(self.timers.keys(), slowest[:-1].tolist()))
+            record["total"] = float(slowest[-1])
+            print("TIMING", json.dumps(record), flush=True)
 
 
 def main(args):
@@ -293,14 +613,47 @@ def main(args):
         sim0.Finalize()
     else:
         # run with in-situ Ascent coupling and with MPI
+        # publish on triggers if any trigger condition is requested
+        triggers = []
+        if args.trigger_max is not None or args.trigger_min is not None:
+            triggers.append(ThresholdTrigger("temperature", above=args.trigger_max,
+                                             below=args.trigger_min))
+        if args.trigger_change is not None:
+            triggers.append(RelativeChangeTrigger("temperature", args.trigger_change))
+        if args.trigger_entropy is not None:
+            triggers.append(EntropyTrigger("temperature", args.trigger_entropy))
+        if triggers:
+            triggers.append(CycleTrigger(args.frequency))
         # meshtype can be one of "uniform", "rectilinear", "structured", "unstructured"
         sim = ParallelSimulation_With_Ascent(resolution=args.res,
                                              meshtype=args.mesh,
                                              iterations=args.timesteps,
-                                             verbose=args.verbose)
+                                             verbose=args.verbose,
+                                             kernel=args.kernel,
+                                             insitu=not args.null,
+                                             record=args.record,
+                                             triggers=triggers,
+                                             statistics=args.statistics,
+                                             temporal=args.temporal_stats,
+                                             temporal_alpha=args.temporal_alpha,
+                                             compress=args.compress,
+                                             isolines=args.isolines,
+                                             derived=args.derived,
+                                             coarsen=args.coarsen,
+                                             coarse_frequency=args.coarse_frequency,
+                                             roi=args.roi,
+                                             roi_block=args.roi_block,
+                                             delta=args.delta,
+                                             delta_threshold=args.delta_threshold,
+                                             timeseries=args.timeseries,
+                                             aggregators=args.aggregators)
         sim.Initialize()
-        sim.MainLoop(frequency=args.frequency)
+        sim.MainLoop(frequency=args.frequency, savedir=args.dir)
         sim.Finalize(savedir=args.dir)
+        if args.contours:
+            sim.SaveContourImage()
+        if args.timing:
+            sim.ReportTimings(backend="null" if args.null else "ascent")
 
 
 parser = argparse.ArgumentParser(
@@ -325,7 +678,73 @@ parser.add_argument("-n", "--noinsitu",
 parser.add_argument("-v", "--verbose",
                     help="toggle printing of the conduit nodes",
                     action='store_true')  # on/off flag
+parser.add_argument("-k", "--kernel", type=str, default="numpy",
+                    choices=["numpy", "inplace"],
+                    help="implementation of the stencil update (default: numpy)")
+parser.add_argument("--null",
+                    help="describe the mesh but never open Ascent (benchmark baseline)",
+                    action='store_true')  # on/off flag
+parser.add_argument("--record", type=str, default=None,
+                    help="directory where to record the published meshes for offline replay")
+parser.add_argument("--trigger-max", type=float, default=None,
+                    help="publish when the maximum temperature rises above this value")
+parser.add_argument("--trigger-min", type=float, default=None,
+                    help="publish when the minimum temperature falls below this value")
+parser.add_argument("--trigger-change", type=float, default=None,
+                    help="publish when the relative L2 change of the temperature since "
+                         "the last publish is above this value")
+parser.add_argument("--trigger-entropy", type=float, default=None,
+                    help="publish when the temperature histogram entropy has changed by "
+                         "more than this value since the last publish")
+parser.add_argument("--statistics", type=str, default=None,
+                    help="CSV (or .h5) file receiving the temperature statistics of every cycle")
+parser.add_argument("--temporal-stats",
+                    help="publish the running mean and std over time of the temperature",
+                    action='store_true')  # on/off flag
+parser.add_argument("--temporal-alpha", type=float, default=None,
+                    help="weight of the newest iteration in an exponentially weighted "
+                         "--temporal-stats (default: equal weights since the start)")
+parser.add_argument("--compress", type=float, default=None,
+                    help="also write the final mesh with compressed_extract.py, next to the "
+                         "relay extract, with this absolute error bound on the temperature "
+                         "(0 for lossless)")
+parser.add_argument("--isolines", type=int, default=None,
+                    help="save the iso-lines of the temperature for this number of levels, "
+                         "within its global range, at every iteration (one Blueprint root "
+                         "file per cycle)")
+parser.add_argument("--derived",
+                    help="publish and render the magnitude of the temperature gradient, "
+                         "computed in the simulation",
+                    action='store_true')  # on/off flag
+parser.add_argument("--coarsen", type=int, default=None,
+                    help="also publish the temperature averaged over blocks of this many points "
+                         "(a power of 2) for small preview images")
+parser.add_argument("--coarse-frequency", type=int, default=10,
+                    help="how often the --coarsen mesh is published (default: 10)")
+parser.add_argument("--roi", type=float, default=None,
+                    help="publish only the blocks where the temperature varies by more than "
+                         "this value")
+parser.add_argument("--roi-block", type=int, default=32,
+                    help="the number of points along each axis of the --roi blocks (default: 32)")
+parser.add_argument("--delta", type=int, default=None,
+                    help="append the temperature to a delta-encoded time series every "
+                         "--frequency iterations, with a keyframe every DELTA outputs")
+parser.add_argument("--delta-threshold", type=float, default=0.0,
+                    help="the largest change not stored in the --delta time series (default: 0)")
+parser.add_argument("--timeseries", type=str, default=None,
+                    help="HDF5 file receiving the temperature of every published cycle")
+parser.add_argument("--aggregators", type=int, default=1,
+                    help="number of --timeseries files, one per group of ranks (default: 1)")
+parser.add_argument("--contours",
+                    help="write one image of the global iso-contours at the end of the run",
+                    action='store_true')  # on/off flag
+parser.add_argument("--timing",
+                    help="print the per-phase timings as a single TIMING line on rank 0",
+                    action='store_true')  # on/off flag
 
 if __name__ == "__main__":
     args = parser.parse_args()
+    if args.roi is not None and args.derived:
+        # the blocks carry the temperature only
+        parser.error("--roi cannot be combined with --derived")
     main(args)
@@ -17,6 +17,7 @@
 #
 ##############################################################################
 import math
+import json
 import argparse
 import numpy as np
 import matplotlib.pyplot as plt
@@ -25,6 +26,11 @@ import catalyst_conduit as conduit
 import catalyst_conduit.blueprint
 
 from mpi4py import MPI
+from blueprint_recorder import BlueprintRecorder
+from insitu_statistics import FieldStatistics
+from parallel_contours import save_contour_image
+from multiresolution import CoarseField
+from timeseries_hdf5 import TimeSeriesWriter
 
 
 class Simulation:
@@ -38,13 +44,17 @@ class Simulation:
         the number of grid points on the I and J axis (default 64)
     iterations : int
         the maximum number of iterations (default 100)
+    kernel : string
+        "numpy" evaluates the stencil with temporary arrays, "inplace" accumulates
+        into the preallocated self.vnew buffer (default "numpy")
     """
-    def __init__(self, resolution=64, iterations=100):
+    def __init__(self, resolution=64, iterations=100, kernel="numpy"):
         self.par_size = 1
         self.par_rank = 0
         self.iteration = 0  # current iteration
         self.Max_iterations = iterations
         self.xres = resolution
+        self.kernel = kernel
         self.yres = resolution  # is redefined when splitting the parallel domain
         self.dx = 1.0 / (self.xres + 1)
 
@@ -91,6 +101,15 @@ class Simulation:
         # there is no ghost-data exchange. Run in serial-mode only
         self.iteration += 1
 
+        if self.kernel == "inplace":
+            # same summation order as below, without any temporary array
+            np.add(self.v[2:, 1:-1], self.v[0:-2, 1:-1], out=self.vnew)
+            np.add(self.vnew, self.v[1:-1, 2:], out=self.vnew)
+            np.add(self.vnew, self.v[1:-1, :-2], out=self.vnew)
+            self.vnew *= 0.25
+            self.v[1:-1, 1:-1] = self.vnew
+            return
+
         self.vnew = 0.25 * ( self.v[2:, 1:-1]  +  # north neighbor
                              self.v[0:-2, 1:-1] +  # south neighbor
                              self.v[1:-1, 2:] +  # east neighbor
@@ -123,25 +142,72 @@ class ParallelSimulation_With_Catalyst(Simulation):
         a ParaView Catalyst script file to generate images and other visualization outputs
     verbose : boolean
         prints the Conduit node(s) describing the mesh
+    kernel : string
+        "numpy" or "inplace", see Simulation
+    record : string
+        if set, every mesh passed to Catalyst is also saved in this directory
+        for offline replay with blueprint_recorder.py
+    statistics : string
+        if set, the global min/max/mean/std of the temperature at every cycle
+        are written to this CSV (or .h5) file
+    coarsen : int
+        if set, a copy of the temperature averaged over blocks of coarsen x
+        coarsen points (a power of 2) is passed to Catalyst at every iteration,
+        in the channel "coarse"
+    full_frequency : int
+        with coarsen, how often the full-resolution channel "grid" is passed
+        to Catalyst too (default 1, every iteration)
+    timeseries : string
+        if set, the temperature is appended to this HDF5 file every
+        `timeseries_frequency` iterations (see timeseries_hdf5.py)
+    timeseries_frequency : int
+        default 100
+    aggregators : int
+        the number of timeseries files, each written by one rank for a group
+        of ranks (default 1)
     """
 
-    def __init__(self, resolution=64, iterations=100, meshtype="uniform", pv_script="catalyst_state.py", verbose=False):
+    def __init__(self, resolution=64, iterations=100, meshtype="uniform", pv_script="catalyst_state.py", verbose=False,
+                 kernel="numpy", record=None, statistics=None, coarsen=None, full_frequency=1,
+                 timeseries=None, timeseries_frequency=100, aggregators=1):
         self.comm = MPI.COMM_WORLD
-        Simulation.__init__(self, resolution, iterations)
+        Simulation.__init__(self, resolution, iterations, kernel)
         self.MeshType = meshtype
 
         self.insitu = conduit.Node()
         self.pv_script = pv_script
         self.verbose = verbose
+        self.recorder = None
+        if record:
+            self.recorder = BlueprintRecorder(record, self.comm)
+        self.statistics = None
+        if statistics:
+            self.statistics = FieldStatistics(["temperature"], self.comm, statistics)
+        self.coarsen = coarsen
+        self.full_frequency = full_frequency
+        self.coarse = None
+        self.series = None
+        if timeseries:
+            self.series = TimeSeriesWriter(timeseries, self.comm, aggregators)
+        self.timeseries_frequency = timeseries_frequency
+        # accumulated wall-clock time (seconds) of each phase of the run
+        self.timers = dict.fromkeys(("initialize", "compute", "exchange",
+                                     "insitu", "finalize"), 0.0)
     # Add Catalyst mesh definition
 
     def Initialize(self):
+        t0 = MPI.Wtime()
         self.par_size = self.comm.Get_size()
         self.par_rank = self.comm.Get_rank()
         # split the parallel domain along the Y axis. No error check!
         self.yres = self.xres // self.par_size
 
         Simulation.Initialize(self)
+        # the rows owned by this rank: the interior rows, plus the global
+        # boundary rows on the first and on the last rank. A contiguous view
+        lo = 0 if self.par_rank == 0 else 1
+        hi = self.yres + 2 if self.par_rank == self.par_size - 1 else self.yres + 1
+        self.owned = self.v[lo:hi]
         self.initialize_catalyst()
         
         self.exec_params = conduit.Node()
@@ -221,8 +287,23 @@ class ParallelSimulation_With_Catalyst(Simulation):
             if self.verbose:
                 print(mesh)
 
+        if self.coarsen:
+            # the interior points owned by this rank, averaged by blocks. The
+            # coarse channel is passed alone when the full mesh is not due
+            self.coarse = CoarseField((self.yres, self.xres), self.coarsen)
+            self.exec_coarse = conduit.Node()
+            origin = (self.dx, (self.par_rank * self.yres + 1) * self.dx)
+            for params in (self.exec_params, self.exec_coarse):
+                params["catalyst/channels/coarse/type"] = "mesh"
+                self.coarse.describe(params["catalyst/channels/coarse/data"], origin,
+                                     self.dx, "temperature")
+        self.timers["initialize"] += MPI.Wtime() - t0
+
     def SimulateOneTimestep(self):
+        t0 = MPI.Wtime()
         Simulation.SimulateOneTimestep(self)
+        t1 = MPI.Wtime()
+        self.timers["compute"] += t1 - t0
 
         if self.par_size > 1:
             # if in parallel, exchange ghost cells now
@@ -237,15 +318,34 @@ class ParallelSimulation_With_Catalyst(Simulation):
                                recvbuf=[self.v[-0,], self.xres + 2, MPI.DOUBLE], source=below)
             self.comm.Sendrecv([self.v[1,], self.xres + 2, MPI.DOUBLE], dest=below,
                                recvbuf=[self.v[-1,], self.xres + 2, MPI.DOUBLE], source=above)
+        self.timers["exchange"] += MPI.Wtime() - t1
 
     def MainLoop(self):
         while self.iteration < self.Max_iterations:
             self.SimulateOneTimestep()
-
-            state = self.exec_params["catalyst/state"]
+            if self.statistics is not None:
+                self.statistics.update(self.iteration, {"temperature": self.owned},
+                                       self.iteration * 0.1)
+
+            t0 = MPI.Wtime()
+            params = self.exec_params
+            full = True
+            if self.coarse is not None:
+                self.coarse.restrict(self.v[1:-1, 1:-1])
+                if self.iteration % self.full_frequency:
+                    params = self.exec_coarse
+                    full = False
+            state = params["catalyst/state"]
             state["timestep"] = self.iteration
             state["time"] = self.iteration * 0.1
-            catalyst.execute(self.exec_params)
+            if self.recorder is not None and full:
+                self.recorder.record(self.exec_params["catalyst/channels/grid/data"],
+                                     self.iteration)
+            catalyst.execute(params)
+            if self.series is not None and not self.iteration % self.timeseries_frequency:
+                self.series.append(self.iteration, self.iteration * 0.1,
+                                   {"temperature": self.owned})
+            self.timers["insitu"] += MPI.Wtime() - t0
 
     def initialize_catalyst(self):
         """Creates a Conduit node """
@@ -254,10 +354,45 @@ class ParallelSimulation_With_Catalyst(Simulation):
 
         # open Catalyst
         catalyst.initialize(self.insitu)
+        if self.recorder is not None:
+            self.recorder.open()
 
     def finalize_catalyst(self):
         """close"""
+        t0 = MPI.Wtime()
+        if self.statistics is not None:
+            self.statistics.flush()
         catalyst.finalize(self.insitu)
+        if self.series is not None:
+            self.series.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        self.timers["finalize"] += MPI.Wtime() - t0
+
+    def SaveContourImage(self):
+        """Write one image of the global iso-contours. Only the contour
+        polylines are sent to rank 0, see parallel_contours.py"""
+        # the rows up to the first row of the next rank, all rows on the last rank
+        hi = self.yres + 2 if self.par_rank == self.par_size - 1 else self.yres + 1
+        save_contour_image(self.comm, self.v[:hi], self.par_rank * self.yres * self.dx, self.dx,
+                           f'Temperature-iso-contours.{self.iteration:04d}.png')
+
+    def ReportTimings(self, **labels):
+        """Print one "TIMING {json}" line on rank 0 with the slowest rank's
+        time for each phase, and the total of the slowest rank (not the sum
+        of the phase maxima, which may come from different ranks). The labels
+        are copied verbatim into the record so that benchmark_scaling.py can
+        identify the case."""
+        local = np.array(list(self.timers.values()) + [sum(self.timers.values())])
+        slowest = np.zeros_like(local)
+        self.comm.Reduce(local, slowest, op=MPI.MAX, root=0)
+        if self.par_rank == 0:
+            record = dict(labels, ranks=self.par_size, res=self.xres,
+                          mesh=self.MeshType, kernel=self.kernel,
+                          iterations=self.iteration)
+            record.update(zip(self.timers.keys(), slowest[:-1].tolist()))
+            record["total"] = float(slowest[-1])
+            print("TIMING", json.dumps(record), flush=True)
 
 
 def main(args):
@@ -274,10 +409,22 @@ def main(args):
                                                meshtype=args.mesh,
                                                iterations=args.timesteps,
                                                pv_script=args.script,
-                                               verbose=args.verbose)
+                                               verbose=args.verbose,
+                                               kernel=args.kernel,
+                                               record=args.record,
+                                               statistics=args.statistics,
+                                               coarsen=args.coarsen,
+                                               full_frequency=args.full_frequency,
+                                               timeseries=args.timeseries,
+                                               timeseries_frequency=args.timeseries_frequency,
+                                               aggregators=args.aggregators)
         sim.Initialize()
         sim.MainLoop()
         sim.finalize_catalyst()
+        if args.contours:
+            sim.SaveContourImage()
+        if args.timing:
+            sim.ReportTimings(backend="catalyst")
 
 
 parser = argparse.ArgumentParser(
@@ -299,6 +446,31 @@ parser.add_argument("-n", "--noinsitu",
 parser.add_argument("-v", "--verbose",
                     help="toggle printing of the conduit nodes",
                     action='store_true')  # on/off flag
+parser.add_argument("-k", "--kernel", type=str, default="numpy",
+                    choices=["numpy", "inplace"],
+                    help="implementation of the stencil update (default: numpy)")
+parser.add_argument("--record", type=str, default=None,
+                    help="directory where to record the published meshes for offline replay")
+parser.add_argument("--statistics", type=str, default=None,
+                    help="CSV (or .h5) file receiving the temperature statistics of every cycle")
+parser.add_argument("--coarsen", type=int, default=None,
+                    help="also pass the temperature averaged over blocks of this many points "
+                         "(a power of 2) in the Catalyst channel 'coarse'")
+parser.add_argument("--full-frequency", type=int, default=1,
+                    help="with --coarsen, how often the full-resolution channel 'grid' is passed "
+                         "(default: 1)")
+parser.add_argument("--timeseries", type=str, default=None,
+                    help="HDF5 file receiving the temperature every --timeseries-frequency iterations")
+parser.add_argument("--timeseries-frequency", type=int, default=100,
+                    help="how often the temperature is appended to --timeseries (default: 100)")
+parser.add_argument("--aggregators", type=int, default=1,
+                    help="number of --timeseries files, one per group of ranks (default: 1)")
+parser.add_argument("--contours",
+                    help="write one image of the global iso-contours at the end of the run",
+                    action='store_true')  # on/off flag
+parser.add_argument("--timing",
+                    help="print the per-phase timings as a single TIMING line on rank 0",
+                    action='store_true')  # on/off flag
 
 if __name__ == "__main__":
     args = parser.parse_args()
@@ -0,0 +1,239 @@
+##############################################################################
+# Streaming statistics of the simulation fields, computed in the simulation loop
+#
+# FieldStatistics computes the global count, mean, variance, minimum and
+# maximum of a set of fields at every cycle. Each rank computes its local
+# Welford accumulators (count, mean, M2, min, max) and all fields are combined
+# with a single Allreduce of a small packed vector, using Chan's parallel
+# update as a user-defined MPI operation. The communication cost per cycle is
+# independent of the grid size.
+#
+# The results are appended to an in-memory time series which is written to a
+# CSV file (or to an HDF5 file if the name ends with .h5 and h5py is
+# available) in batches of `batch` cycles:
+#
+#   stats = FieldStatistics(["temperature"], comm, "statistics.csv")
+#   while running:
+#       ...
+#       stats.update(cycle, {"temperature": owned_rows}, time)
+#   stats.flush()
+#
+# The arrays given to update() must not include ghost points, otherwise they
+# are counted twice.
+##############################################################################
+import os
+import numpy as np
+
+COUNT, MEAN, M2, MIN, MAX = range(5)
+
+
+def combine(a, b):
+    """Chan's parallel update: merge the accumulators a into b, in place.
+    a and b are arrays of shape (number of fields, 5)"""
+    n = a[:, COUNT] + b[:, COUNT]
+    nz = n > 0
+    delta = a[:, MEAN] - b[:, MEAN]
+    wa = np.divide(a[:, COUNT], n, out=np.zeros_like(n), where=nz)
+    b[:, M2] += a[:, M2] + delta * delta * b[:, COUNT] * wa
+    b[:, MEAN] += delta * wa
+    b[:, COUNT] = n
+    np.minimum(a[:, MIN], b[:, MIN], out=b[:, MIN])
+    np.maximum(a[:, MAX], b[:, MAX], out=b[:, MAX])
+
+
+def _welford_op(inbuf, inoutbuf, datatype):
+    # the buffers hold whole records of 5 doubles, one per field: the
+    # reduction uses a contiguous datatype of 5 doubles, so that MPI never
+    # splits a record between two calls of the operation
+    a = np.frombuffer(inbuf, dtype=np.float64).reshape(-1, 5)
+    b = np.frombuffer(inoutbuf, dtype=np.float64).reshape(-1, 5)
+    combine(a, b)
+
+
+class FieldStatistics:
+    """
+    Global per-cycle statistics of several fields, and their time series
+
+    Attributes
+    ----------
+    fields : list of string
+        the names of the fields, in the order of the output columns
+    comm : mpi4py communicator
+        None in serial mode
+    filename : string
+        the CSV (or .h5) file receiving the time series, written by rank 0
+    batch : int
+        the number of cycles kept in memory before writing them (default 100)
+    """
+    def __init__(self, fields, comm=None, filename="statistics.csv", batch=100):
+        self.fields = list(fields)
+        self.comm = comm
+        self.rank = comm.Get_rank() if comm is not None else 0
+        self.filename = filename
+        self.batch = batch
+        self.columns = ["cycle", "time"]
+        for name in self.fields:
+            self.columns += [f"{name}_{s}" for s in ("min", "max", "mean", "std")]
+        # the accumulators of the current cycle, and of all cycles so far
+        self.local = np.zeros((len(self.fields), 5))
+        self.current = np.zeros_like(self.local)
+        self.running = np.zeros_like(self.local)
+        self.running[:, MIN] = np.inf
+        self.running[:, MAX] = -np.inf
+        self.series = np.zeros((batch, len(self.columns)))
+        self.rows = 0
+        self.written = False
+        self.scratch = {}
+        self.op = None
+        self.record = None
+        if comm is not None:
+            from mpi4py import MPI
+            self.op = MPI.Op.Create(_welford_op, commute=True)
+            self.record = MPI.DOUBLE.Create_contiguous(5).Commit()
+
+    def update(self, cycle, arrays, time=None):
+        """Compute the global statistics of the arrays of this cycle.
+        arrays is a dictionary {field name: local NumPy array}"""
+        for i, name in enumerate(self.fields):
+            values = arrays[name]
+            if values.size == 0:
+                self.local[i] = (0.0, 0.0, 0.0, np.inf, -np.inf)
+                continue
+            # two passes over the local array, in a reusable scratch buffer
+            scratch = self.scratch.get(name)
+            if scratch is None or scratch.shape != values.shape:
+                scratch = self.scratch[name] = np.empty_like(values, dtype=np.float64)
+            mean = values.mean()
+            np.subtract(values, mean, out=scratch)
+            d = scratch.ravel()
+            self.local[i] = (values.size, mean, np.dot(d, d), values.min(), values.max())
+        if self.comm is not None:
+            n = len(self.fields)
+            self.comm.Allreduce([self.local, n, self.record], [self.current, n, self.record],
+                                op=self.op)
+        else:
+            self.current[:] = self.local
+        combine(self.current, self.running)
+
+        row = self.series[self.rows]
+        row[0] = cycle
+        row[1] = cycle if time is None else time
+        stats = row[2:].reshape(-1, 4)
+        stats[:, 0] = self.current[:, MIN]
+        stats[:, 1] = self.current[:, MAX]
+        stats[:, 2] = self.current[:, MEAN]
+        stats[:, 3] = np.sqrt(self.current[:, M2] / np.maximum(self.current[:, COUNT], 1))
+        self.rows += 1
+        if self.rows == self.batch:
+            self.flush()
+        return self.current
+
+    def mean(self, field, running=False):
+        acc = self.running if running else self.current
+        return acc[self.fields.index(field), MEAN]
+
+    def variance(self, field, running=False):
+        acc = self.running if running else self.current
+        i = self.fields.index(field)
+        return acc[i, M2] / max(acc[i, COUNT], 1)
+
+    def flush(self):
+        """Append the cycles kept in memory to the output file"""
+        if self.rows == 0:
+            return
+        if self.rank == 0:
+            rows = self.series[:self.rows]
+            if self.filename.endswith(".h5"):
+                self._write_hdf5(rows)
+            else:
+                self._write_csv(rows)
+        self.written = True
+        self.rows = 0
+
+    def _write_csv(self, rows):
+        with open(self.filename, "a" if self.written else "w") as f:
+            np.savetxt(f, rows, delimiter=",", fmt="%.10g",
+                       header="" if self.written else ",".join(self.columns),
+                       comments="")
+
+    def _write_hdf5(self, rows):
+        try:
+            import h5py
+        except ImportError:
+            self.filename = os.path.splitext(self.filename)[0] + ".csv"
+            print("h5py is not available, writing", self.filename, "instead")
+            return self._write_csv(rows)
+        with h5py.File(self.filename, "a" if self.written else "w") as f:
+            for j, name in enumerate(self.columns):
+                if name not in f:
+                    f.create_dataset(name, shape=(0,), maxshape=(None,),
+                                     dtype=np.float64, chunks=(self.batch,))
+                dset = f[name]
+                start = dset.shape[0]
+                dset.resize((start + rows.shape[0],))
+                dset[start:] = rows[:, j]
+
+
+class TemporalStatistics:
+    """
+    Running mean and standard deviation of a field over time, at every point
+
+    All the arrays are allocated once, and updated in place, so that they can
+    be given to Conduit with set_external and published as ordinary fields:
+
+        temporal = TemporalStatistics(v.shape)
+        mesh["fields/temperature_mean/values"].set_external(temporal.mean.ravel())
+        mesh["fields/temperature_std/values"].set_external(temporal.std.ravel())
+        while running:
+            ...
+            temporal.update(v)
+            if publishing:
+                temporal.update_std()
+
+    Attributes
+    ----------
+    shape : tuple
+        the shape of the field
+    alpha : float
+        None (default) for the statistics of all the updates so far (Welford).
+        Otherwise, the weight of the newest value in an exponentially weighted
+        mean and variance, i.e. a window of about 1/alpha updates
+    """
+    def __init__(self, shape, alpha=None):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)  # sum of squared deviations, or the variance if alpha
+        self.std = np.zeros(shape)
+        self.delta = np.zeros(shape)
+        self.scratch = np.zeros(shape)
+
+    def update(self, values):
+        self.count += 1
+        if self.count == 1 and self.alpha is not None:
+            # start the exponential window from the first value, not from 0
+            np.copyto(self.mean, values)
+            return
+        np.subtract(values, self.mean, out=self.delta)
+        if self.alpha is None:
+            np.multiply(self.delta, 1.0 / self.count, out=self.scratch)
+            self.mean += self.scratch
+            np.subtract(values, self.mean, out=self.scratch)
+            self.scratch *= self.delta
+            self.m2 += self.scratch
+        else:
+            np.multiply(self.delta, self.delta, out=self.scratch)
+            self.scratch *= self.alpha
+            self.m2 += self.scratch
+            self.m2 *= 1.0 - self.alpha
+            self.delta *= self.alpha
+            self.mean += self.delta
+
+    def update_std(self):
+        """Update the standard deviation array from the accumulators"""
+        if self.alpha is None:
+            np.multiply(self.m2, 1.0 / max(self.count, 1), out=self.std)
+        else:
+            np.copyto(self.std, self.m2)
+        np.sqrt(self.std, out=self.std)
+        return self.std
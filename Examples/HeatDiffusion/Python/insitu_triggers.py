@@ -0,0 +1,172 @@
+##############################################################################
+# A lightweight trigger engine evaluated inside the simulation loop
+#
+# Ascent triggers evaluate their condition after the mesh has been published.
+# Here the conditions are evaluated on the local NumPy arrays, and the partial
+# results of all triggers are combined with at most two small Allreduce calls
+# (one MPI.SUM, one MPI.MAX). The simulation calls publish/execute only when
+# a trigger fires:
+#
+#   triggers = TriggerEngine(comm, [CycleTrigger(100),
+#                                   RelativeChangeTrigger("temperature", 0.05)])
+#   ...
+#   if triggers.evaluate(cycle, {"temperature": owned_rows}):
+#       a.publish(mesh)
+#       a.execute(actions)
+#       triggers.published({"temperature": owned_rows})
+#
+# The arrays given to the engine must not include ghost points, otherwise they
+# are counted twice in the global sums.
+##############################################################################
+import numpy as np
+
+from streaming_histogram import StreamingHistogram
+
+
+class CycleTrigger:
+    """Fires every `frequency` cycles"""
+    def __init__(self, frequency):
+        self.name = f"cycle%{frequency}"
+        self.frequency = frequency
+        self.cycle = 0
+
+    def local(self, cycle, fields):
+        self.cycle = cycle
+        return [], []
+
+    def fires(self, sums, maxs):
+        return self.cycle % self.frequency == 0
+
+    def published(self, fields):
+        pass
+
+
+class ThresholdTrigger:
+    """Fires when the global maximum of a field rises above `above`, or when
+    its global minimum falls below `below`. It fires on the crossing only, not
+    at every cycle where the condition holds: the condition must become false
+    again before the trigger can fire another time"""
+    def __init__(self, field, above=None, below=None):
+        self.name = f"threshold({field})"
+        self.field = field
+        self.above = above
+        self.below = below
+        self.crossed = False
+
+    def local(self, cycle, fields):
+        values = fields[self.field]
+        # the minimum is reduced as the maximum of the opposite values
+        return [], [values.max(), -values.min()]
+
+    def fires(self, sums, maxs):
+        vmax, vmin = maxs[0], -maxs[1]
+        crossed = bool((self.above is not None and vmax > self.above) or
+                       (self.below is not None and vmin < self.below))
+        # edge-triggered: fires on the false -> true transition only
+        fires = crossed and not self.crossed
+        self.crossed = crossed
+        return fires
+
+    def published(self, fields):
+        pass
+
+
+class RelativeChangeTrigger:
+    """Fires when the relative L2 norm of the change of a field since the
+    last published snapshot is larger than `threshold`"""
+    def __init__(self, field, threshold):
+        self.name = f"change({field})"
+        self.field = field
+        self.threshold = threshold
+        self.snapshot = None  # allocated once, on the first call
+        self.scratch = None
+
+    def local(self, cycle, fields):
+        values = fields[self.field]
+        if self.snapshot is None:
+            self.snapshot = np.zeros_like(values)
+            self.scratch = np.empty_like(values)
+        np.subtract(values, self.snapshot, out=self.scratch)
+        diff = self.scratch.ravel()
+        ref = self.snapshot.ravel()
+        return [np.dot(diff, diff), np.dot(ref, ref)], []
+
+    def fires(self, sums, maxs):
+        diff2, ref2 = sums
+        if ref2 == 0.0:
+            return diff2 > 0.0
+        return np.sqrt(diff2 / ref2) > self.threshold
+
+    def published(self, fields):
+        np.copyto(self.snapshot, fields[self.field])
+
+
+class EntropyTrigger:
+    """Fires when the Shannon entropy of the global histogram of a field has
+    changed by more than `delta` since the last published snapshot. The bins
+    are fixed, `num_bins` equal bins over [vmin, vmax], and the histogram is
+    updated incrementally (see streaming_histogram.py)"""
+    def __init__(self, field, delta, vmin=0.0, vmax=1.0, num_bins=128):
+        self.name = f"entropy({field})"
+        self.field = field
+        self.delta = delta
+        # the reduction is done by the engine, the histogram stays local
+        self.histogram = StreamingHistogram(num_bins, vmin, vmax)
+        self.entropy = 0.0
+        self.reference = None
+
+    def local(self, cycle, fields):
+        self.histogram.update_delta(fields[self.field])
+        return self.histogram.counts, []
+
+    def fires(self, sums, maxs):
+        self.histogram.set_global(sums)
+        self.entropy = self.histogram.entropy()
+        if self.reference is None:
+            return True
+        return abs(self.entropy - self.reference) > self.delta
+
+    def published(self, fields):
+        self.reference = self.entropy
+
+
+class TriggerEngine:
+    """
+    Evaluates a list of triggers with one Allreduce per reduction operation
+
+    Attributes
+    ----------
+    comm : mpi4py communicator
+        None in serial mode
+    triggers : list
+        trigger objects with local(), fires() and published() methods
+    """
+    def __init__(self, comm, triggers):
+        self.comm = comm
+        self.triggers = triggers
+        self.fired = []
+
+    def evaluate(self, cycle, fields):
+        """Returns the list of the names of the triggers which fired"""
+        sums, maxs, parts = [], [], []
+        for trigger in self.triggers:
+            s, m = trigger.local(cycle, fields)
+            parts.append((len(sums), len(s), len(maxs), len(m)))
+            sums.extend(s)
+            maxs.extend(m)
+        sums = np.array(sums, dtype=np.float64)
+        maxs = np.array(maxs, dtype=np.float64)
+        if self.comm is not None:
+            from mpi4py import MPI
+            if sums.size:
+                self.comm.Allreduce(MPI.IN_PLACE, sums, op=MPI.SUM)
+            if maxs.size:
+                self.comm.Allreduce(MPI.IN_PLACE, maxs, op=MPI.MAX)
+        self.fired = [trigger.name for trigger, (s0, ns, m0, nm) in zip(self.triggers, parts)
+                      if trigger.fires(sums[s0:s0 + ns], maxs[m0:m0 + nm])]
+        return self.fired
+
+    def published(self, fields):
+        """To be called after publishing, to reset the reference snapshots"""
+        for trigger in self.triggers:
+            trigger.published(fields)
@@ -0,0 +1,191 @@
+##############################################################################
+# Iso-lines of a 2D field with a vectorized marching squares
+#
+# All the cells of the grid are classified at once for every level: the
+# 4 corners give a case number (0-15), and a lookup table gives the 0, 1 or 2
+# segments of the cell, as pairs of cell edges. The saddle cases (5 and 10)
+# are resolved with the average of the 4 corners. Every intersection point is
+# identified by the id of the grid edge it lies on, so that the points shared
+# by two cells are computed and stored only once.
+#
+#   points, segments, values = isolines(v[:hi], levels, origin=(0.0, y0), spacing=dx)
+#   mesh = conduit.Node()
+#   line_mesh(mesh, points, segments, values)
+#
+# In a parallel run, the slabs given by the ranks must not overlap: each rank
+# gives its rows up to the first row of the next rank (v[:yres+1]), and the
+# last rank gives all its rows (v[:yres+2]). The output is a few thousand
+# points, and can be saved at every cycle.
+##############################################################################
+import numpy as np
+
+# the corners of a cell (i, j) are 0: (i, j), 1: (i, j+1), 2: (i+1, j+1),
+# 3: (i+1, j). Its edges are 0: bottom (0-1), 1: right (1-2), 2: top (3-2),
+# 3: left (0-3). The case number has bit k set if corner k is above the level
+_ = -1
+SEGMENTS = np.array([
+    [[_, _], [_, _]],  # 0
+    [[3, 0], [_, _]],  # 1
+    [[0, 1], [_, _]],  # 2
+    [[3, 1], [_, _]],  # 3
+    [[1, 2], [_, _]],  # 4
+    [[0, 3], [1, 2]],  # 5, center below: corners 0 and 2 are separated
+    [[0, 2], [_, _]],  # 6
+    [[3, 2], [_, _]],  # 7
+    [[2, 3], [_, _]],  # 8
+    [[0, 2], [_, _]],  # 9
+    [[0, 1], [3, 2]],  # 10, center below: corners 1 and 3 are separated
+    [[1, 2], [_, _]],  # 11
+    [[1, 3], [_, _]],  # 12
+    [[0, 1], [_, _]],  # 13
+    [[3, 0], [_, _]],  # 14
+    [[_, _], [_, _]],  # 15
+    [[0, 1], [3, 2]],  # 16: case 5, center above: corners 1 and 3 are separated
+    [[0, 3], [1, 2]],  # 17: case 10, center above: corners 0 and 2 are separated
+])
+
+
+def edge_ids(nrows, ncols):
+    """The ids of the 4 edges of every cell, an array (4, number of cells).
+    The horizontal edges are numbered first, then the vertical edges"""
+    i, j = np.mgrid[0:nrows - 1, 0:ncols - 1]
+    i, j = i.ravel(), j.ravel()
+    nh = nrows * (ncols - 1)
+    return np.stack([i * (ncols - 1) + j,              # bottom
+                     nh + i * ncols + j + 1,           # right
+                     (i + 1) * (ncols - 1) + j,        # top
+                     nh + i * ncols + j])              # left
+
+
+def edge_points(values, ids, level):
+    """The (row, column) grid coordinates of the level on the edges `ids`"""
+    nrows, ncols = values.shape
+    nh = nrows * (ncols - 1)
+    vertical = ids >= nh
+    k = np.where(vertical, ids - nh, ids)
+    i = np.where(vertical, k // ncols, k // (ncols - 1))
+    j = np.where(vertical, k % ncols, k % (ncols - 1))
+    # the second end of the edge
+    i1 = i + vertical
+    j1 = j + ~vertical
+    z = values.ravel()
+    za = z[i * ncols + j]
+    zb = z[i1 * ncols + j1]
+    t = (level - za) / (zb - za)
+    return i + t * vertical, j + t * ~vertical
+
+
+def isolines(values, levels, origin=(0.0, 0.0), spacing=1.0):
+    """
+    The iso-lines of a 2D array for a set of levels
+
+    Returns the points (n, 2) with x, y coordinates, the segments (m, 2) as
+    pairs of point indices, and the level of every segment (m,)
+
+    Attributes
+    ----------
+    values : NumPy array (rows, columns)
+        the field, row index along Y
+    levels : list of float
+        the iso-values
+    origin : float, float
+        the x, y coordinates of values[0, 0]
+    spacing : float or (float, float)
+        the distance between grid points along x and y
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    nrows, ncols = values.shape
+    dx, dy = np.broadcast_to(spacing, (2,))
+    ids = edge_ids(nrows, ncols)
+    corners = (values[:-1, :-1].ravel(), values[:-1, 1:].ravel(),
+               values[1:, 1:].ravel(), values[1:, :-1].ravel())
+    center = 0.25 * (corners[0] + corners[1] + corners[2] + corners[3])
+
+    points, segments, segment_levels = [], [], []
+    npoints = 0
+    for level in levels:
+        case = np.zeros(center.size, dtype=np.intp)
+        for k, corner in enumerate(corners):
+            case |= (corner > level).astype(np.intp) << k
+        saddle = center > level
+        case[(case == 5) & saddle] = 16
+        case[(case == 10) & saddle] = 17
+        cells = np.flatnonzero((case != 0) & (case != 15))
+        if cells.size == 0:
+            continue
+        # (cells, 2 segments, 2 edges) -> the segments which exist
+        edges = SEGMENTS[case[cells]]
+        cell = np.repeat(cells, 2)
+        edges = edges.reshape(-1, 2)
+        valid = edges[:, 0] >= 0
+        cell, edges = cell[valid], edges[valid]
+        segment_ids = ids[edges, cell[:, None]]
+        # one point per grid edge
+        unique, inverse = np.unique(segment_ids, return_inverse=True)
+        row, col = edge_points(values, unique, level)
+        points.append(np.column_stack([origin[0] + col * dx, origin[1] + row * dy]))
+        segments.append(inverse.reshape(-1, 2) + npoints)
+        segment_levels.append(np.full(segment_ids.shape[0], level))
+        npoints += unique.size
+
+    if not points:
+        return np.zeros((0, 2)), np.zeros((0, 2), dtype=np.intp), np.zeros(0)
+    return np.concatenate(points), np.concatenate(segments), np.concatenate(segment_levels)
+
+
+def polylines(segments, npoints):
+    """Chain the segments into polylines, a list of arrays of point indices.
+    Every point belongs to at most 2 segments. Closed lines repeat their
+    first point at the end"""
+    neighbors = np.full((npoints, 2), -1, dtype=np.intp)
+    ends = np.concatenate([segments, segments[:, ::-1]])
+    ends = ends[np.argsort(ends[:, 0], kind="stable")]
+    first = np.ones(ends.shape[0], dtype=bool)
+    first[1:] = ends[1:, 0] != ends[:-1, 0]
+    neighbors[ends[first, 0], 0] = ends[first, 1]
+    neighbors[ends[~first, 0], 1] = ends[~first, 1]
+
+    used = np.zeros(npoints, dtype=bool)
+    used[neighbors[:, 0] < 0] = True  # points of no segment
+    lines = []
+    # open lines start at a point with one neighbor, then the closed lines
+    starts = np.concatenate([np.flatnonzero((neighbors[:, 0] >= 0) & (neighbors[:, 1] < 0)),
+                             np.arange(npoints)])
+    for start in starts:
+        if used[start]:
+            continue
+        line = [start]
+        used[start] = True
+        previous, current = -1, start
+        while True:
+            a, b = neighbors[current]
+            following = b if a == previous else a
+            if following < 0:
+                break
+            if following == start:
+                line.append(start)
+                break
+            if used[following]:
+                break
+            line.append(following)
+            used[following] = True
+            previous, current = current, following
+        lines.append(np.array(line))
+    return lines
+
+
+def line_mesh(mesh, points, segments, levels, topology="contours"):
+    """Describe the iso-lines as a Blueprint mesh: explicit coordinates, an
+    unstructured topology of lines, and an element field "level" """
+    coordset = topology + "_coords"
+    mesh["coordsets/" + coordset + "/type"] = "explicit"
+    mesh["coordsets/" + coordset + "/values/x"] = np.ascontiguousarray(points[:, 0])
+    mesh["coordsets/" + coordset + "/values/y"] = np.ascontiguousarray(points[:, 1])
+    mesh["topologies/" + topology + "/type"] = "unstructured"
+    mesh["topologies/" + topology + "/coordset"] = coordset
+    mesh["topologies/" + topology + "/elements/shape"] = "line"
+    mesh["topologies/" + topology + "/elements/connectivity"] = segments.astype(np.int32).ravel()
+    mesh["fields/level/association"] = "element"
+    mesh["fields/level/topology"] = topology
+    mesh["fields/level/values"] = np.ascontiguousarray(levels, dtype=np.float64)
+    return mesh
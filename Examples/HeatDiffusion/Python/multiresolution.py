@@ -0,0 +1,80 @@
+##############################################################################
+# A coarse copy of a field, for frequent low-resolution publishing
+#
+# Small preview images do not need the full-resolution mesh. CoarseField
+# averages blocks of factor x factor grid points (factor = 2, 4, 8, ...) into
+# a coarse array allocated once, and describes it as a rectilinear Blueprint
+# mesh with one element per block. The coarse mesh can be published often, and
+# the full mesh rarely:
+#
+#   coarse = CoarseField(v[1:-1, 1:-1].shape, 4)
+#   coarse.describe(coarse_mesh, (0.5 * dx, y0 + 0.5 * dx), dx, "temperature")
+#   while running:
+#       ...
+#       coarse.restrict(v[1:-1, 1:-1])
+#       a.publish(coarse_mesh)
+#
+# Only the points owned by the rank are averaged (the ghost points belong to
+# the blocks of the neighbors), so that the coarse domains of the ranks do not
+# overlap and need no ghost field. If the size of the array is not a multiple
+# of the factor, the last blocks average fewer points, and their elements are
+# narrower: the coarse mesh covers exactly the same domain as the fine points.
+##############################################################################
+import numpy as np
+
+
+class CoarseField:
+    """
+    Block averages of a 2D field, updated in place
+
+    Attributes
+    ----------
+    shape : tuple
+        the shape (rows, columns) of the fine array, without ghost points
+    factor : int
+        the number of fine points along each axis of a block, a power of 2
+    """
+    def __init__(self, shape, factor):
+        if factor < 1 or factor & (factor - 1):
+            raise ValueError("the coarsening factor must be a power of 2")
+        self.factor = factor
+        self.shape = shape
+        rows, cols = shape
+        self.rows = np.arange(0, rows, factor)
+        self.cols = np.arange(0, cols, factor)
+        self.partial = np.zeros((self.rows.size, cols))  # sums over the rows of a block
+        self.coarse = np.zeros((self.rows.size, self.cols.size))
+        counts = np.outer(np.diff(np.append(self.rows, rows)),
+                          np.diff(np.append(self.cols, cols)))
+        self.weights = 1.0 / counts
+
+    def restrict(self, values):
+        """Average the blocks of `values` into self.coarse"""
+        np.add.reduceat(values, self.rows, axis=0, out=self.partial)
+        np.add.reduceat(self.partial, self.cols, axis=1, out=self.coarse)
+        self.coarse *= self.weights
+        return self.coarse
+
+    def edges(self, origin, spacing):
+        """The x and y coordinates of the block edges. The blocks extend half
+        a fine spacing around their points, the last ones end half a spacing
+        after the last fine point"""
+        rows, cols = self.shape
+        x = origin[0] + (np.append(self.cols, cols) - 0.5) * spacing
+        y = origin[1] + (np.append(self.rows, rows) - 0.5) * spacing
+        return x, y
+
+    def describe(self, mesh, origin, spacing, field):
+        """Describe the coarse field as an element field of a rectilinear
+        mesh. `origin` is the position of the first fine point, `spacing` the
+        distance between fine points"""
+        x, y = self.edges(origin, spacing)
+        mesh["coordsets/coords/type"] = "rectilinear"
+        mesh["coordsets/coords/values/x"] = x
+        mesh["coordsets/coords/values/y"] = y
+        mesh["topologies/mesh/type"] = "rectilinear"
+        mesh["topologies/mesh/coordset"] = "coords"
+        mesh["fields/" + field + "/association"] = "element"
+        mesh["fields/" + field + "/topology"] = "mesh"
+        mesh["fields/" + field + "/values"].set_external(self.coarse.ravel())
+        return mesh
@@ -0,0 +1,77 @@
+##############################################################################
+# A single image of the iso-contours of a domain-decomposed field
+#
+# Calling ax.contour() on every rank draws the local slab only, and all ranks
+# write the same file. Here, every rank extracts the polylines of its own
+# slab with marching_squares.py, with contour levels computed from the global
+# range (one Allreduce), and only the polylines are gathered to rank 0, which
+# draws them all in one figure. The gathered data is proportional to the
+# length of the contours, not to the size of the grid.
+#
+#   save_contour_image(comm, v[lo:hi], y0, dx, "Temperature-iso-contours.1000.png")
+#
+# The slabs given by the ranks must not overlap: each rank gives its rows up
+# to the first row of the next rank, and the last rank gives all its rows.
+##############################################################################
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.ticker import MaxNLocator
+
+from marching_squares import isolines, polylines
+
+
+def global_levels(comm, values, num_levels=10):
+    """The contour levels chosen by matplotlib for `num_levels` levels,
+    over the global range of the field"""
+    extents = np.array([-values.min(), values.max()])
+    if comm is not None:
+        from mpi4py import MPI
+        comm.Allreduce(MPI.IN_PLACE, extents, op=MPI.MAX)
+    vmin, vmax = -extents[0], extents[1]
+    levels = MaxNLocator(num_levels + 1).tick_values(vmin, vmax)
+    return levels[(levels >= vmin) & (levels <= vmax)]
+
+
+def local_polylines(values, y0, dx, levels):
+    """The polylines of the slab, a list (one item per level) of lists of
+    (n, 2) arrays of x, y coordinates"""
+    points, segments, segment_levels = isolines(values, levels, (0.0, y0), dx)
+    # the points of a line are all on the same level
+    point_levels = np.empty(points.shape[0])
+    point_levels[segments] = segment_levels[:, None]
+    lines = {float(level): [] for level in levels}
+    for line in polylines(segments, points.shape[0]):
+        lines[float(point_levels[line[0]])].append(points[line])
+    return [lines[float(level)] for level in levels]
+
+
+def save_contour_image(comm, values, y0, dx, fname, num_levels=10,
+                       title="Temperature iso-contours"):
+    """Extract the local polylines, gather them to rank 0, and draw them.
+    Returns the number of bytes of polylines received by rank 0"""
+    levels = global_levels(comm, values, num_levels)
+    polylines = local_polylines(values, y0, dx, levels)
+    if comm is not None:
+        gathered = comm.gather(polylines, root=0)
+        if comm.Get_rank() != 0:
+            return 0
+    else:
+        gathered = [polylines]
+
+    fig, ax = plt.subplots()
+    colors = plt.get_cmap("viridis")(np.linspace(0.0, 1.0, max(len(levels), 1)))
+    nbytes = 0
+    for i, level in enumerate(levels):
+        lines = [line for rank in gathered for line in rank[i]]
+        nbytes += sum(line.nbytes for line in lines)
+        ax.add_collection(LineCollection(lines, colors=[colors[i]], label=f"{level:g}"))
+    ax.autoscale_view()
+    ax.set_aspect("equal")
+    ax.legend(loc="center left", bbox_to_anchor=(1.0, 0.5), fontsize=8)
+    ax.set_title(title)
+    plt.savefig(fname, bbox_inches="tight")
+    plt.close(fig)
+    print("Final image \"", fname, "\" written to disk (", nbytes,
+          " bytes of contours gathered)", sep="")
+    return nbytes
@@ -0,0 +1,160 @@
+##############################################################################
+# Raw extracts of Blueprint meshes, for a hand-off on the same node
+#
+# A relay extract in HDF5, or a VTK XML file, is encoded by the simulation
+# and decoded by the post-processing script, even when both run on the same
+# node and the file never leaves /dev/shm. A raw extract is made of two
+# files: "fname", the arrays of the Blueprint node written one after the
+# other with tofile(), every array starting on a 64-byte boundary, and
+# "fname.json", the schema of the node (the non-array values, and the dtype,
+# count and offset of every array). The reader maps "fname" in memory once,
+# and every array is a NumPy view of this mapping: nothing is parsed, copied
+# or read before it is used.
+#
+# Both files are written under temporary names and renamed into place, so a
+# reader never sees a partial file. The data file starts with a random token
+# which is repeated in the schema: a reader which maps the data of one write
+# and the schema of another (the extract was rewritten between the two
+# opens) sees that the tokens differ, and opens both again.
+#
+#   write_raw(mesh, "/dev/shm/mesh.cycle_000100.raw")
+#
+#   values = read_raw("/dev/shm/mesh.cycle_000100.raw")     # {path: value}
+#   mesh = read_raw("/dev/shm/mesh.cycle_000100.raw", conduit.Node())
+#   grid = read_vtk("/dev/shm/mesh.cycle_000100.raw")       # in pvpython
+#
+# The scalar fields and the coordinates are given to VTK without a copy. The
+# components of a vector field are separate arrays in Blueprint, and are
+# interleaved into one VTK array.
+#
+# Run: python3 raw_extract.py /dev/shm/mesh.cycle_000100.raw  # prints its content
+##############################################################################
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+from compressed_extract import leaves
+
+ALIGNMENT = 64
+TOKEN = 8  # the bytes of the token, at the start of the data file
+
+
+def write_raw(mesh, fname):
+    """
+    Write a Blueprint node to a raw extract. Returns the number of bytes
+    and the seconds spent writing
+
+    Attributes
+    ----------
+    mesh : Conduit node
+        a single domain Blueprint mesh
+    fname : string
+        the data file. The schema is written to fname + ".json"
+    """
+    t0 = time.perf_counter()
+    scalars, entries = {}, {}
+    token = os.urandom(TOKEN)
+    offset = TOKEN
+    with open(fname + ".tmp", "wb") as f:
+        f.write(token)
+        for path, value in leaves(mesh):
+            if not isinstance(value, np.ndarray):
+                scalars[path] = value.item() if isinstance(value, np.generic) else value
+                continue
+            padding = -offset % ALIGNMENT
+            f.write(bytes(padding))
+            offset += padding
+            value = np.ascontiguousarray(value).ravel()
+            value.tofile(f)
+            entries[path] = {"dtype": value.dtype.str, "count": int(value.size), "offset": offset}
+            offset += value.nbytes
+    with open(fname + ".json.tmp", "w") as f:
+        json.dump({"token": token.hex(), "scalars": scalars, "arrays": entries}, f)
+    os.replace(fname + ".tmp", fname)
+    os.replace(fname + ".json.tmp", fname + ".json")
+    return offset, time.perf_counter() - t0
+
+
+def read_raw(fname, node=None, retries=10):
+    """Map a raw extract into a dictionary {path: value}, or into a Conduit
+    node if node is given. The arrays are views of the mapped file"""
+    for _ in range(retries):
+        # copy-on-write: the arrays are writable, the file is never modified
+        data = np.memmap(fname, dtype=np.uint8, mode="c")
+        with open(fname + ".json") as f:
+            header = json.load(f)
+        if data[:TOKEN].tobytes().hex() == header["token"]:
+            break
+        # the extract was rewritten between the two opens
+        time.sleep(0.01)
+    else:
+        raise RuntimeError("raw extract %s: the data and the schema do not match" % fname)
+    values = dict(header["scalars"])
+    for path, entry in header["arrays"].items():
+        values[path] = np.frombuffer(data, dtype=entry["dtype"], count=entry["count"],
+                                     offset=entry["offset"])
+    if node is None:
+        return values
+    for path, value in values.items():
+        if isinstance(value, np.ndarray):
+            node[path].set_external(value)
+        else:
+            node[path] = value
+    return node
+
+
+def read_vtk(fname, topology="mesh"):
+    """Map a raw extract of a uniform or rectilinear mesh into a
+    vtkImageData or a vtkRectilinearGrid, with all its fields"""
+    from vtk import vtkImageData, vtkRectilinearGrid
+    from vtk.numpy_interface import dataset_adapter as dsa
+    values = read_raw(fname)
+    topo = "topologies/" + topology + "/"
+    coords = "coordsets/" + values[topo + "coordset"] + "/"
+    if values[topo + "type"] == "uniform":
+        grid = vtkImageData()
+        dims = [values.get(coords + "dims/" + d, 1) for d in ("i", "j", "k")]
+        grid.SetDimensions(dims)
+        grid.SetOrigin([values.get(coords + "origin/" + a, 0.0) for a in ("x", "y", "z")])
+        grid.SetSpacing([values.get(coords + "spacing/d" + a, 1.0) for a in ("x", "y", "z")])
+    elif values[topo + "type"] == "rectilinear":
+        grid = vtkRectilinearGrid()
+        axis = [values.get(coords + "values/" + a, np.zeros(1)) for a in ("x", "y", "z")]
+        grid.SetDimensions([a.size for a in axis])
+        grid.SetXCoordinates(dsa.numpyTovtkDataArray(axis[0], "x"))
+        grid.SetYCoordinates(dsa.numpyTovtkDataArray(axis[1], "y"))
+        grid.SetZCoordinates(dsa.numpyTovtkDataArray(axis[2], "z"))
+    else:
+        raise ValueError("raw extract: topology type %s not implemented" % values[topo + "type"])
+
+    fields = {}
+    for path, value in values.items():
+        parts = path.split("/")
+        if parts[0] == "fields" and parts[2] == "values" and isinstance(value, np.ndarray):
+            fields.setdefault(parts[1], []).append(value)
+    for name, components in fields.items():
+        if values["fields/" + name + "/topology"] != topology:
+            continue
+        if len(components) == 1:
+            array = dsa.numpyTovtkDataArray(components[0], name)
+        else:
+            array = dsa.numpyTovtkDataArray(np.column_stack(components), name)
+        if values["fields/" + name + "/association"] == "vertex":
+            grid.GetPointData().AddArray(array)
+        else:
+            grid.GetCellData().AddArray(array)
+    return grid
+
+
+parser = argparse.ArgumentParser(description="print the content of a raw extract")
+parser.add_argument("filename", type=str, help="a file written by write_raw()")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    for path, value in read_raw(args.filename).items():
+        if isinstance(value, np.ndarray):
+            print(path, value.dtype, value.shape, "min", value.min(), "max", value.max())
+        else:
+            print(path, value)
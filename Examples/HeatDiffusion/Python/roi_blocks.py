@@ -0,0 +1,183 @@
+##############################################################################
+# Region-of-interest publishing: only the active sub-blocks of the grid
+#
+# For most of a run, the interesting part of a field covers a small part of
+# the grid. ActiveBlocks tiles the local array into blocks of block x block
+# points, and flags as active the blocks where the range of the values
+# (max - min), or the largest difference between neighbor points, exceeds a
+# threshold. Only the active blocks are described, each as one domain of a
+# multi-domain Blueprint mesh with its own origin and ghost field. All the
+# inactive blocks of the rank are described together by one cheap domain, the
+# outline of each block, with the mean value of the block. The outline has
+# the topology name ("mesh") and the fields of the block domains, so that the
+# plots of a scene find them on every domain:
+#
+#   roi = ActiveBlocks(v.shape, block=32, range_threshold=1e-3)
+#   while running:
+#       ...
+#       if publishing:
+#           mesh = roi.describe(conduit.Node(), v, ghosts, (0.0, y0), dx,
+#                               "temperature", rank * (roi.active.size + 1),
+#                               state={"cycle": cycle, "time": time})
+#           a.publish(mesh)
+#
+# The blocks share their last row and column of points with the next blocks,
+# so that there is no gap between them. These shared points are ghosts of the
+# next block.
+##############################################################################
+import numpy as np
+
+
+class ActiveBlocks:
+    """
+    Tiling of a 2D array into blocks, and selection of the active blocks
+
+    Attributes
+    ----------
+    shape : tuple
+        the shape (rows, columns) of the local array, ghost points included
+    block : int
+        the number of points of a block along each axis (default 32)
+    range_threshold : float
+        a block is active if max - min of its values is larger
+    gradient_threshold : float
+        a block is active if the largest absolute difference between two
+        neighbor points, divided by the spacing, is larger
+    """
+    def __init__(self, shape, block=32, range_threshold=None, gradient_threshold=None):
+        self.shape = shape
+        self.block = block
+        self.range_threshold = range_threshold
+        self.gradient_threshold = gradient_threshold
+        rows, cols = shape
+        self.rows = np.arange(0, rows - 1, block)
+        self.cols = np.arange(0, cols - 1, block)
+        # the last point of every block, shared with the next block
+        self.row_ends = np.minimum(self.rows + block, rows - 1)
+        self.col_ends = np.minimum(self.cols + block, cols - 1)
+        nblocks = (self.rows.size, self.cols.size)
+        self.partial = np.zeros((self.rows.size, cols))
+        self.vmax = np.zeros(nblocks)
+        self.vmin = np.zeros(nblocks)
+        self.mean = np.zeros(nblocks)
+        self.steepest = np.zeros(nblocks)
+        self.steepest_x = np.zeros(nblocks)
+        self.dy = np.zeros((rows - 1, cols))
+        self.dx = np.zeros((rows, cols - 1))
+        self.counts = np.outer(np.diff(np.append(self.rows, rows)),
+                               np.diff(np.append(self.cols, cols)))
+        self.active = np.zeros(nblocks, dtype=bool)
+        self.buffers = {}  # block index -> (values, ghosts) copies, allocated once
+
+    def _reduce(self, ufunc, values, out):
+        partial = self.partial[:, :values.shape[1]]
+        ufunc.reduceat(values, self.rows, axis=0, out=partial)
+        ufunc.reduceat(partial, self.cols, axis=1, out=out)
+        return out
+
+    def select(self, values, spacing=1.0):
+        """Flag the active blocks of `values`. Returns self.active"""
+        self._reduce(np.maximum, values, self.vmax)
+        self._reduce(np.minimum, values, self.vmin)
+        self._reduce(np.add, values, self.mean)
+        self.mean /= self.counts
+        self.active[:] = False
+        if self.range_threshold is not None:
+            self.active |= (self.vmax - self.vmin) > self.range_threshold
+        if self.gradient_threshold is not None:
+            np.subtract(values[1:], values[:-1], out=self.dy)
+            np.abs(self.dy, out=self.dy)
+            np.subtract(values[:, 1:], values[:, :-1], out=self.dx)
+            np.abs(self.dx, out=self.dx)
+            self._reduce(np.maximum, self.dy, self.steepest)
+            self._reduce(np.maximum, self.dx, self.steepest_x)
+            np.maximum(self.steepest, self.steepest_x, out=self.steepest)
+            self.active |= self.steepest / spacing > self.gradient_threshold
+        return self.active
+
+    def fraction(self):
+        """The fraction of the blocks which are active"""
+        return self.active.mean()
+
+    def describe(self, mesh, values, ghosts, origin, spacing, field, domain_offset=0,
+                 select=True, state=None):
+        """Fill an empty Conduit node with a multi-domain mesh: one domain per
+        active block, and one domain with the outlines of the inactive blocks.
+        The domain ids are domain_offset + the block index, and the outline
+        is the domain domain_offset + the number of blocks. The items of
+        `state`, e.g. {"cycle": 100, "time": 10.0}, are copied into the state
+        of every domain"""
+        if select:
+            self.select(values, spacing)
+        nblocks = self.active.size
+        for b in np.flatnonzero(self.active):
+            i, j = divmod(b, self.cols.size)
+            r0, r1 = self.rows[i], self.row_ends[i] + 1
+            c0, c1 = self.cols[j], self.col_ends[j] + 1
+            if b not in self.buffers:
+                self.buffers[b] = (np.zeros((r1 - r0, c1 - c0)),
+                                   np.zeros((r1 - r0, c1 - c0), dtype=ghosts.dtype))
+            block_values, block_ghosts = self.buffers[b]
+            np.copyto(block_values, values[r0:r1, c0:c1])
+            np.copyto(block_ghosts, ghosts[r0:r1, c0:c1])
+            # the last row and column belong to the next blocks
+            if r1 < values.shape[0]:
+                block_ghosts[-1, :] = 1
+            if c1 < values.shape[1]:
+                block_ghosts[:, -1] = 1
+
+            domain = mesh["domain_%06d" % (domain_offset + b)]
+            self._state(domain, domain_offset + b, state)
+            domain["coordsets/coords/type"] = "uniform"
+            domain["coordsets/coords/dims/i"] = c1 - c0
+            domain["coordsets/coords/dims/j"] = r1 - r0
+            domain["coordsets/coords/origin/x"] = origin[0] + c0 * spacing
+            domain["coordsets/coords/origin/y"] = origin[1] + r0 * spacing
+            domain["coordsets/coords/spacing/dx"] = spacing
+            domain["coordsets/coords/spacing/dy"] = spacing
+            domain["topologies/mesh/type"] = "uniform"
+            domain["topologies/mesh/coordset"] = "coords"
+            domain["fields/" + field + "/association"] = "vertex"
+            domain["fields/" + field + "/topology"] = "mesh"
+            domain["fields/" + field + "/values"].set_external(block_values.ravel())
+            domain["fields/point_ghosts/association"] = "vertex"
+            domain["fields/point_ghosts/topology"] = "mesh"
+            domain["fields/point_ghosts/values"].set_external(block_ghosts.ravel())
+
+        inactive = np.flatnonzero(~self.active.ravel())
+        if inactive.size:
+            domain = mesh["domain_%06d" % (domain_offset + nblocks)]
+            self._state(domain, domain_offset + nblocks, state)
+            self.outline(domain, inactive, origin, spacing, field, ghosts.dtype)
+        return mesh
+
+    @staticmethod
+    def _state(domain, domain_id, state):
+        domain["state/domain_id"] = domain_id
+        for key, value in (state or {}).items():
+            domain["state/" + key] = value
+
+    def outline(self, domain, blocks, origin, spacing, field, ghost_dtype=np.uint8):
+        """The rectangles around the `blocks`, as an unstructured line mesh,
+        with the mean value of each block on its 4 corners, and no ghosts"""
+        i, j = np.divmod(blocks, self.cols.size)
+        x0 = origin[0] + self.cols[j] * spacing
+        x1 = origin[0] + self.col_ends[j] * spacing
+        y0 = origin[1] + self.rows[i] * spacing
+        y1 = origin[1] + self.row_ends[i] * spacing
+        domain["coordsets/coords/type"] = "explicit"
+        domain["coordsets/coords/values/x"] = np.column_stack([x0, x1, x1, x0]).ravel()
+        domain["coordsets/coords/values/y"] = np.column_stack([y0, y0, y1, y1]).ravel()
+        corners = 4 * np.arange(blocks.size)[:, None] + np.array([0, 1, 1, 2, 2, 3, 3, 0])
+        domain["topologies/mesh/type"] = "unstructured"
+        domain["topologies/mesh/coordset"] = "coords"
+        domain["topologies/mesh/elements/shape"] = "line"
+        domain["topologies/mesh/elements/connectivity"] = corners.astype(np.int32).ravel()
+        # the corners are not shared between blocks: a vertex field, as on
+        # the block domains
+        domain["fields/" + field + "/association"] = "vertex"
+        domain["fields/" + field + "/topology"] = "mesh"
+        domain["fields/" + field + "/values"] = np.repeat(self.mean.ravel()[blocks], 4)
+        domain["fields/point_ghosts/association"] = "vertex"
+        domain["fields/point_ghosts/topology"] = "mesh"
+        domain["fields/point_ghosts/values"] = np.zeros(4 * blocks.size, dtype=ghost_dtype)
@@ -0,0 +1,174 @@
+##############################################################################
+# An incremental histogram for in-situ triggering
+#
+# Rebuilding a histogram from scratch every cycle (np.histogram, or the
+# Ascent expression histogram(field('gyre'), num_bins=128)) sorts or searches
+# the whole array. StreamingHistogram keeps the value and the bin index of
+# every point, and only rebins the points whose value has changed since the
+# previous update (or the points listed by the caller). The local counts of
+# all ranks are merged with a single Allreduce of the counts.
+#
+#   hist = StreamingHistogram(128, 0.0, 1.0, comm=comm)
+#   while running:
+#       ...
+#       hist.update_delta(owned_rows)
+#       hist.reduce(cycle)
+#       print(hist.entropy(), hist.quantile(0.5))
+#
+# With adaptive=True, the range is widened symmetrically by factors of 2 when
+# values fall outside of it, merging pairs of bins. Ranks agree on the range
+# with one extra Allreduce of a single number, the width of the range.
+##############################################################################
+import numpy as np
+
+
+class StreamingHistogram:
+    """
+    A fixed number of equal bins over [vmin, vmax], updated incrementally
+
+    Attributes
+    ----------
+    num_bins : int
+        the number of bins, a multiple of 4 if adaptive (default 128)
+    vmin, vmax : float
+        the initial range of the bins
+    adaptive : boolean
+        widen the range when values fall outside of it. When False, the
+        values outside of the range are counted in the first or last bin
+    comm : mpi4py communicator
+        None in serial mode
+    """
+    def __init__(self, num_bins=128, vmin=0.0, vmax=1.0, adaptive=False, comm=None):
+        if adaptive and num_bins % 4:
+            raise ValueError("an adaptive histogram needs a multiple of 4 bins")
+        self.num_bins = num_bins
+        self.vmin = float(vmin)
+        self.vmax = float(vmax)
+        self.adaptive = adaptive
+        self.comm = comm
+        self.counts = np.zeros(num_bins, dtype=np.int64)  # local counts
+        self.global_counts = np.zeros(num_bins, dtype=np.int64)
+        self.index = None  # bin index of every point of the last update
+        self.previous = None  # value of every point of the last update
+        self.history = []
+
+    @property
+    def edges(self):
+        return np.linspace(self.vmin, self.vmax, self.num_bins + 1)
+
+    def bin_index(self, values):
+        """The bin of every value, as an array of the shape of `values`"""
+        scale = self.num_bins / (self.vmax - self.vmin)
+        index = ((values - self.vmin) * scale).astype(np.intp)
+        np.clip(index, 0, self.num_bins - 1, out=index)
+        return index
+
+    def widen(self, levels=1):
+        """Double the range `levels` times, keeping its center"""
+        half = self.num_bins // 2
+        for _ in range(levels):
+            width = self.vmax - self.vmin
+            self.vmin -= 0.5 * width
+            self.vmax += 0.5 * width
+            merged = self.counts[0::2] + self.counts[1::2]
+            self.counts[:] = 0
+            self.counts[half // 2:half // 2 + half] = merged
+            if self.index is not None:
+                self.index += half
+                self.index //= 2
+
+    def levels_needed(self, values):
+        """How many doublings are needed for `values` to fit in the range"""
+        vmin, vmax = values.min(), values.max()
+        lo, hi, levels = self.vmin, self.vmax, 0
+        while vmin < lo or vmax > hi:
+            width = hi - lo
+            lo -= 0.5 * width
+            hi += 0.5 * width
+            levels += 1
+        return levels
+
+    def update(self, values):
+        """Rebuild the local counts from all values"""
+        if self.adaptive:
+            self.widen(self.levels_needed(values))
+        self.previous = values.ravel().copy()
+        self.index = self.bin_index(self.previous)
+        self.counts[:] = np.bincount(self.index, minlength=self.num_bins)
+
+    def update_delta(self, values, changed=None):
+        """Update the local counts, rebinning only the points whose value has
+        changed since the last update. `values` must keep the same shape.
+        `changed`, the flat indices of the points which may have changed, saves
+        the comparison with the previous values when the caller knows them."""
+        if self.index is None:
+            return self.update(values)
+        flat = values.ravel()
+        if changed is None:
+            changed = np.flatnonzero(flat != self.previous)
+        if changed.size == 0:
+            return
+        moved = flat[changed]
+        if self.adaptive:
+            self.widen(self.levels_needed(moved))
+        index = self.bin_index(moved)
+        self.counts -= np.bincount(self.index[changed], minlength=self.num_bins)
+        self.counts += np.bincount(index, minlength=self.num_bins)
+        self.index[changed] = index
+        self.previous[changed] = moved
+
+    def update_sampled(self, values, stride=8):
+        """Estimate the local counts from every `stride`-th value"""
+        sample = values.ravel()[::stride]
+        if self.adaptive:
+            self.widen(self.levels_needed(sample))
+        self.index = None  # the next update_delta has to start from scratch
+        self.previous = None
+        self.counts[:] = np.bincount(self.bin_index(sample), minlength=self.num_bins) * stride
+
+    def reduce(self, cycle=None):
+        """Merge the local counts of all ranks into global_counts, and append
+        the entropy and quartiles of the result to the history"""
+        if self.comm is not None:
+            from mpi4py import MPI
+            if self.adaptive:
+                # all ranks have widened from the same initial range, the
+                # widest one is the global one
+                width = self.vmax - self.vmin
+                widest = self.comm.allreduce(width, op=MPI.MAX)
+                self.widen(int(round(np.log2(widest / width))))
+            self.comm.Allreduce(self.counts, self.global_counts, op=MPI.SUM)
+        else:
+            self.global_counts[:] = self.counts
+        if cycle is not None:
+            self.history.append({"cycle": cycle, "entropy": self.entropy(),
+                                 "q25": self.quantile(0.25), "q50": self.quantile(0.5),
+                                 "q75": self.quantile(0.75)})
+        return self.global_counts
+
+    def set_global(self, counts):
+        """Set the global counts, when the reduction is done by the caller"""
+        self.global_counts[:] = counts
+
+    def entropy(self):
+        """Shannon entropy (bits) of the global counts"""
+        counts = self.global_counts[self.global_counts > 0]
+        if counts.size == 0:
+            return 0.0
+        p = counts / counts.sum()
+        return float(-np.sum(p * np.log2(p)))
+
+    def quantile(self, q):
+        """Quantile of the global counts, interpolated linearly in the bin"""
+        cumulative = np.cumsum(self.global_counts)
+        total = cumulative[-1]
+        if total == 0:
+            return float("nan")
+        target = q * total
+        b = int(np.searchsorted(cumulative, target))
+        b = min(b, self.num_bins - 1)
+        below = cumulative[b - 1] if b > 0 else 0
+        inside = self.global_counts[b]
+        fraction = (target - below) / inside if inside else 0.0
+        width = (self.vmax - self.vmin) / self.num_bins
+        return float(self.vmin + (b + fraction) * width)
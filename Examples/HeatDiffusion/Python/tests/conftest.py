@@ -0,0 +1,5 @@
+# The modules under test are scripts of the parent directory, not a package
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,47 @@
+from backpressure import OutputPacer
+
+
+def pacer(**kwargs):
+    return OutputPacer(None, frequency=10, log=None, **kwargs)
+
+
+def test_base_frequency():
+    p = pacer(keyframe=0)
+    assert [i for i in range(0, 60) if p.due(i)] == [0, 10, 20, 30, 40, 50]
+    assert p.dropped == 0
+
+
+def test_stride_doubles_on_stalls_and_recovers():
+    p = pacer(threshold=0.05, keyframe=0, recover=2, max_stride=4)
+    p.record(0, 1.0)
+    assert p.stride == 2 and p.stalled == 1
+    p.record(20, 1.0)
+    p.record(40, 1.0)
+    assert p.stride == 4  # max_stride
+    assert [i for i in range(0, 90, 10) if p.due(i)] == [0, 40, 80]
+    assert p.dropped == 6
+    p.record(80, 0.0)
+    p.record(120, 0.0)
+    assert p.stride == 2
+
+
+def test_not_ready_steps_are_dropped():
+    p = pacer(keyframe=0)
+    p.record(0, 0.0, ok=False)
+    assert p.written == 0 and p.dropped == 1 and p.stride == 2
+
+
+def test_fixed_policy_only_logs():
+    p = pacer(policy="fixed", keyframe=0)
+    p.record(0, 1.0)
+    assert p.stride == 1 and p.stalled == 1
+
+
+def test_keyframes_and_forced_outputs_are_always_written():
+    p = pacer(keyframe=5, max_stride=16)
+    for i in range(4):
+        p.record(i, 1.0)
+    assert p.stride == 16
+    assert [i for i in range(0, 210, 10) if p.due(i)] == [0, 50, 100, 150, 160, 200]
+    assert p.due(33, force=True)
+    assert p.is_keyframe(100) and not p.is_keyframe(110)
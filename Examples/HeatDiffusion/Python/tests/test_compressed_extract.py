@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from compressed_extract import encode, decode, smallest_int, tolerance_of
+
+
+@pytest.mark.parametrize("tolerance", [1e-2, 1e-4, 1e-7])
+def test_error_bound(tolerance):
+    rng = np.random.default_rng(3)
+    values = rng.normal(0.5, 0.2, 10000)
+    entry, blob = encode(values, tolerance, "zlib", 4)
+    decoded = decode(entry, blob)
+    assert decoded.dtype == values.dtype
+    assert np.abs(decoded - values).max() <= tolerance * (1.0 + 1e-9)
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.int32, np.int64])
+def test_lossless(dtype):
+    values = (np.arange(1000) * 7 % 101).astype(dtype)
+    entry, blob = encode(values, None, "zlib", 4)
+    np.testing.assert_array_equal(decode(entry, blob), values)
+
+
+def test_integer_arrays_are_never_quantized():
+    values = np.arange(100, dtype=np.int32)
+    entry, blob = encode(values, 0.5, "none", 0)
+    assert "qtype" not in entry
+    np.testing.assert_array_equal(decode(entry, blob), values)
+
+
+def test_tolerances_apply_to_fields_only():
+    tolerances = {"temperature": 1e-3}
+    assert tolerance_of("fields/temperature/values", tolerances) == 1e-3
+    assert tolerance_of("fields/ghosts/values", tolerances) is None
+    assert tolerance_of("coordsets/coords/values/x", tolerances) is None
+    assert smallest_int(0, 200) == np.int16
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from delta_extract import DeltaWriter, DeltaReader
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(2)
+    v = rng.uniform(size=(50, 70))
+    frames = []
+    for cycle in range(0, 120, 10):
+        v = v.copy()
+        # a change in a few blocks only, and none at cycle 30
+        if cycle != 30:
+            v[cycle % 50, 5:9] += 0.01
+        frames.append((cycle, v))
+    return frames
+
+
+@pytest.mark.parametrize("codec", ["zlib", "none"])
+def test_lossless_round_trip(tmp_path, frames, codec):
+    fname = str(tmp_path / "temperature.delta")
+    writer = DeltaWriter(fname, keyframe=4, block=16, codec=codec)
+    for cycle, v in frames:
+        writer.write(cycle, {"temperature": v, "twice": 2.0 * v})
+    writer.close()
+    reader = DeltaReader(fname)
+    assert reader.cycles == [cycle for cycle, _ in frames]
+    for cycle, v in frames:
+        fields = reader.read(cycle)
+        np.testing.assert_array_equal(fields["temperature"], v)
+        np.testing.assert_array_equal(fields["twice"], 2.0 * v)
+    window = reader.window(20, 60, ["temperature"])
+    assert [cycle for cycle, _ in window] == [20, 30, 40, 50, 60]
+    for cycle, fields in window:
+        np.testing.assert_array_equal(fields["temperature"], dict(frames)[cycle])
+
+
+def test_threshold_bounds_the_error(tmp_path, frames):
+    fname = str(tmp_path / "temperature.delta")
+    writer = DeltaWriter(fname, keyframe=100, block=8, threshold=0.015, codec="zlib")
+    for cycle, v in frames:
+        writer.write(cycle, {"temperature": v})
+    writer.close()
+    reader = DeltaReader(fname)
+    for cycle, v in frames:
+        assert np.abs(reader.read(cycle)["temperature"] - v).max() <= 0.015
+
+
+def test_read_missing_cycle(tmp_path, frames):
+    fname = str(tmp_path / "temperature.delta")
+    writer = DeltaWriter(fname, codec="zlib")
+    writer.write(*frames[0][:1], {"temperature": frames[0][1]})
+    writer.close()
+    with pytest.raises(KeyError):
+        DeltaReader(fname).read(5)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from derived_fields import DerivedFields, difference
+
+
+def test_difference_matches_np_gradient():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0.0, 1.0, (12, 9))
+    gy, gx = np.gradient(values, 0.5, 0.25, edge_order=1)
+    np.testing.assert_allclose(difference(values, 1, 0.25, np.empty_like(values)), gx)
+    np.testing.assert_allclose(difference(values, 0, 0.5, np.empty_like(values)), gy)
+
+
+def test_gradient_magnitude_of_a_linear_field():
+    y, x = np.mgrid[0:10, 0:20] * 0.1
+    derived = DerivedFields(x.shape, 0.1)
+    derived.set_cycle(0)
+    magnitude = derived.gradient_magnitude("t", 3.0 * x + 4.0 * y)
+    np.testing.assert_allclose(magnitude, 5.0)
+    assert magnitude is derived.buffer("gradient_magnitude:t")
+
+
+def test_fields_are_computed_once_per_cycle():
+    derived = DerivedFields((8, 8), 1.0)
+    values = np.outer(np.arange(8.0), np.ones(8))
+    derived.set_cycle(0)
+    first = derived.gradient_magnitude("t", values).copy()
+    # same cycle: the cache is returned even if the input has changed
+    np.testing.assert_array_equal(derived.gradient_magnitude("t", 2.0 * values), first)
+    derived.invalidate("gradient_magnitude:t")
+    derived.invalidate("gradient:t")
+    np.testing.assert_array_equal(derived.gradient_magnitude("t", 2.0 * values), 2.0 * first)
+    derived.set_cycle(1)
+    np.testing.assert_array_equal(derived.gradient_magnitude("t", values), first)
+
+
+def test_vorticity_and_q_criterion_of_a_solid_rotation():
+    # u = -y, v = x: vorticity 2, Q = 1
+    y, x = np.mgrid[0:6, 0:7] * 0.5
+    derived = DerivedFields(x.shape, 0.5)
+    derived.set_cycle(0)
+    np.testing.assert_allclose(derived.vorticity(-y, x), 2.0)
+    np.testing.assert_allclose(derived.vorticity_magnitude(-y, x), 2.0)
+    np.testing.assert_allclose(derived.q_criterion(-y, x), 1.0)
@@ -0,0 +1,34 @@
+import numpy as np
+
+from insitu_statistics import combine, COUNT, MEAN, M2, MIN, MAX
+
+
+def accumulators(*arrays):
+    """The (count, mean, M2, min, max) of every array, one row per field"""
+    return np.array([[a.size, a.mean(), ((a - a.mean()) ** 2).sum(), a.min(), a.max()]
+                     for a in arrays])
+
+
+def test_combine_matches_the_statistics_of_the_union():
+    rng = np.random.default_rng(1)
+    x = [rng.normal(3.0, 2.0, 100), rng.uniform(-1.0, 1.0, 37)]
+    y = [rng.normal(-1.0, 0.5, 250), rng.uniform(0.0, 5.0, 3)]
+    a = accumulators(*x)
+    b = accumulators(*y)
+    combine(a, b)
+    expected = accumulators(*[np.concatenate(pair) for pair in zip(x, y)])
+    np.testing.assert_allclose(b, expected, rtol=1e-12)
+
+
+def test_combine_with_an_empty_rank():
+    values = np.arange(10.0)
+    empty = np.array([[0.0, 0.0, 0.0, np.inf, -np.inf]])
+    b = accumulators(values)
+    combine(empty, b)
+    np.testing.assert_allclose(b, accumulators(values))
+    a = accumulators(values)
+    b = empty.copy()
+    combine(a, b)
+    np.testing.assert_allclose(b, accumulators(values))
+    assert b[0, COUNT] == 10 and b[0, MIN] == 0.0 and b[0, MAX] == 9.0
+    assert np.isclose(b[0, M2] / b[0, COUNT], values.var()) and b[0, MEAN] == 4.5
@@ -0,0 +1,46 @@
+import numpy as np
+
+from insitu_triggers import (CycleTrigger, ThresholdTrigger, RelativeChangeTrigger,
+                             TriggerEngine)
+
+
+def test_cycle_trigger_fires_every_frequency_cycles():
+    engine = TriggerEngine(None, [CycleTrigger(3)])
+    fired = [c for c in range(10) if engine.evaluate(c, {})]
+    assert fired == [0, 3, 6, 9]
+
+
+def test_threshold_trigger_fires_on_the_crossing_only():
+    engine = TriggerEngine(None, [ThresholdTrigger("t", above=1.0)])
+    maxima = [0.5, 1.5, 2.0, 1.2, 0.8, 1.1]
+    fired = [c for c, vmax in enumerate(maxima)
+             if engine.evaluate(c, {"t": np.array([0.0, vmax])})]
+    # the condition holds at cycles 1, 2, 3 and 5: it fires again after it
+    # became false at cycle 4
+    assert fired == [1, 5]
+
+
+def test_threshold_trigger_below():
+    engine = TriggerEngine(None, [ThresholdTrigger("t", below=-1.0)])
+    assert not engine.evaluate(0, {"t": np.array([0.0, 1.0])})
+    assert engine.evaluate(1, {"t": np.array([-2.0, 1.0])}) == ["threshold(t)"]
+    assert not engine.evaluate(2, {"t": np.array([-3.0, 1.0])})
+
+
+def test_relative_change_trigger_resets_on_publish():
+    trigger = RelativeChangeTrigger("t", 0.1)
+    engine = TriggerEngine(None, [trigger])
+    values = np.ones((4, 4))
+    # no snapshot yet: any non-zero field fires
+    assert engine.evaluate(0, {"t": values})
+    engine.published({"t": values})
+    assert not engine.evaluate(1, {"t": values * 1.05})
+    assert engine.evaluate(2, {"t": values * 1.2})
+    engine.published({"t": values * 1.2})
+    assert not engine.evaluate(3, {"t": values * 1.2})
+
+
+def test_engine_reports_every_trigger_which_fired():
+    engine = TriggerEngine(None, [CycleTrigger(2), ThresholdTrigger("t", above=0.5)])
+    assert engine.evaluate(2, {"t": np.array([1.0])}) == ["cycle%2", "threshold(t)"]
+    assert engine.evaluate(3, {"t": np.array([1.0])}) == []
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from marching_squares import SEGMENTS, isolines, polylines
+
+
+# the corners of a cell in the order of the case bits: (row, column)
+CORNERS = [(0, 0), (0, 1), (1, 1), (1, 0)]
+# the corners at the ends of every edge
+EDGES = [(0, 1), (1, 2), (3, 2), (0, 3)]
+
+
+@pytest.mark.parametrize("case", range(16))
+def test_segments_separate_the_corners(case):
+    """Every edge crossed by a segment has one corner above the level and one
+    below, and every such edge is crossed exactly once"""
+    above = [(case >> k) & 1 for k in range(4)]
+    crossed = sorted(e for e, (a, b) in enumerate(EDGES) if above[a] != above[b])
+    cases = [case] + ([16] if case == 5 else []) + ([17] if case == 10 else [])
+    for c in cases:
+        edges = sorted(e for pair in SEGMENTS[c] for e in pair if e >= 0)
+        assert edges == crossed
+
+
+@pytest.mark.parametrize("corners, center_above", [((1.0, 0.0, 1.0, 0.0), True),
+                                                   ((0.6, 0.0, 0.6, 0.0), True),
+                                                   ((0.4, 0.0, 0.4, 0.0), False),
+                                                   ((0.0, 1.0, 0.0, 1.0), True),
+                                                   ((0.0, 0.4, 0.0, 0.4), False)])
+def test_saddles_are_resolved_with_the_center(corners, center_above):
+    values = np.zeros((2, 2))
+    for (i, j), value in zip(CORNERS, corners):
+        values[i, j] = value
+    points, segments, _ = isolines(values, [0.25])
+    assert segments.shape == (2, 2)
+    # the two corners above the level are joined through the center when it
+    # is above, i.e. the segments cut off the corners below
+    above = [k for k, value in enumerate(corners) if value > 0.25]
+    for segment in segments:
+        xy = points[segment]
+        # every segment cuts one corner off: both its points are within one
+        # cell length of that corner
+        cut = [k for k, (i, j) in enumerate(CORNERS)
+               if np.all(np.abs(xy[:, 0] - j) + np.abs(xy[:, 1] - i) <= 1.0)]
+        assert len(cut) == 1
+        assert (cut[0] not in above) == center_above
+
+
+def test_points_lie_on_the_level():
+    y, x = np.mgrid[0:20, 0:30]
+    values = np.sin(0.3 * x) * np.cos(0.2 * y)
+    levels = [-0.5, 0.0, 0.5]
+    points, segments, segment_levels = isolines(values, levels)
+    assert segments.shape[0] == segment_levels.size > 0
+    # linear interpolation along the grid edges: exact on a linear field
+    linear = 0.1 * x + 0.05 * y
+    points, segments, segment_levels = isolines(linear, [1.03, 2.07])
+    for (a, b), level in zip(segments, segment_levels):
+        for px, py in points[[a, b]]:
+            assert np.isclose(0.1 * px + 0.05 * py, level)
+    # shared points are stored once
+    assert np.unique(points, axis=0).shape[0] == points.shape[0]
+
+
+def test_polylines_chain_the_segments():
+    y, x = np.mgrid[0:40, 0:40]
+    values = np.exp(-((x - 20.0) ** 2 + (y - 20.0) ** 2) / 100.0)
+    # a closed ring around the peak, and an open line cut by the border
+    points, segments, _ = isolines(values, [0.5])
+    lines = polylines(segments, points.shape[0])
+    assert len(lines) == 1
+    assert lines[0][0] == lines[0][-1]
+    assert len(lines[0]) == segments.shape[0] + 1
+    points, segments, _ = isolines(values[:20], [0.5])
+    lines = polylines(segments, points.shape[0])
+    assert len(lines) == 1
+    assert lines[0][0] != lines[0][-1]
+    assert len(lines[0]) == segments.shape[0] + 1
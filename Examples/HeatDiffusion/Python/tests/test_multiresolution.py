@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from multiresolution import CoarseField
+
+
+@pytest.mark.parametrize("shape", [(8, 16), (10, 6), (3, 5)])
+def test_blocks_cover_the_fine_domain(shape):
+    coarse = CoarseField(shape, 4)
+    x, y = coarse.edges((1.0, 2.0), 0.1)
+    # half a fine spacing before the first point and after the last one
+    assert np.isclose(x[0], 0.95) and np.isclose(x[-1], 1.0 + (shape[1] - 0.5) * 0.1)
+    assert np.isclose(y[0], 1.95) and np.isclose(y[-1], 2.0 + (shape[0] - 0.5) * 0.1)
+    assert x.size == coarse.coarse.shape[1] + 1 and y.size == coarse.coarse.shape[0] + 1
+
+
+def test_restrict_averages_partial_blocks():
+    values = np.arange(60.0).reshape(10, 6)
+    coarse = CoarseField(values.shape, 4)
+    expected = [[values[r:r + 4, c:c + 4].mean() for c in (0, 4)] for r in (0, 4, 8)]
+    np.testing.assert_allclose(coarse.restrict(values), expected)
+
+
+def test_factor_is_a_power_of_2():
+    with pytest.raises(ValueError):
+        CoarseField((8, 8), 3)
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+import pytest
+
+from raw_extract import write_raw, read_raw, ALIGNMENT
+
+
+class Node:
+    """The part of the Conduit node interface used by leaves()"""
+    def __init__(self, tree):
+        self.tree = tree
+
+    def number_of_children(self):
+        return len(self.tree) if isinstance(self.tree, dict) else 0
+
+    def child_names(self):
+        return list(self.tree)
+
+    def __getitem__(self, name):
+        return Node(self.tree[name])
+
+    def value(self):
+        return self.tree
+
+
+@pytest.fixture
+def mesh():
+    return Node({"state": {"cycle": np.int64(100)},
+                 "coordsets": {"coords": {"type": "uniform", "dims": {"i": 5, "j": 3}}},
+                 "fields": {"vel_x": {"association": "vertex",
+                                      "values": np.linspace(0.0, 1.0, 15)},
+                            "ids": {"values": np.arange(7, dtype=np.int32)}}})
+
+
+def test_round_trip(tmp_path, mesh):
+    fname = str(tmp_path / "mesh.raw")
+    write_raw(mesh, fname)
+    values = read_raw(fname)
+    assert values["state/cycle"] == 100 and values["coordsets/coords/type"] == "uniform"
+    np.testing.assert_array_equal(values["fields/vel_x/values"], np.linspace(0.0, 1.0, 15))
+    np.testing.assert_array_equal(values["fields/ids/values"], np.arange(7))
+    with open(fname + ".json") as f:
+        header = json.load(f)
+    assert all(entry["offset"] % ALIGNMENT == 0 for entry in header["arrays"].values())
+    # nothing is left under the temporary names
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["mesh.raw", "mesh.raw.json"]
+
+
+def test_schema_of_another_write_is_detected(tmp_path, mesh):
+    fname = str(tmp_path / "mesh.raw")
+    write_raw(mesh, fname)
+    with open(fname + ".json") as f:
+        old = f.read()
+    write_raw(mesh, fname)
+    with open(fname + ".json", "w") as f:
+        f.write(old)
+    with pytest.raises(RuntimeError):
+        read_raw(fname, retries=2)
@@ -0,0 +1,54 @@
+import numpy as np
+
+from roi_blocks import ActiveBlocks
+
+
+class Node(dict):
+    """The subset of conduit.Node used by ActiveBlocks.describe"""
+    def __getitem__(self, path):
+        node = self
+        for key in path.split("/"):
+            node = node.setdefault(key, Node())
+        return node
+
+    def __setitem__(self, path, value):
+        parent, _, key = path.rpartition("/")
+        node = self[parent] if parent else self
+        dict.__setitem__(node, key, value)
+
+    def set_external(self, values):
+        dict.__setitem__(self, "external", values)
+
+
+def step(shape, column):
+    values = np.zeros(shape)
+    values[:, column:] = 1.0
+    return values
+
+
+def test_only_the_blocks_across_the_step_are_active():
+    roi = ActiveBlocks((33, 65), block=16, range_threshold=0.5)
+    active = roi.select(step((33, 65), 40))
+    assert active.shape == (2, 4)
+    np.testing.assert_array_equal(active, [[False, False, True, False]] * 2)
+    assert roi.fraction() == 0.25
+
+
+def test_describe_copies_the_state_into_every_domain():
+    shape = (33, 65)
+    roi = ActiveBlocks(shape, block=16, range_threshold=0.5)
+    ghosts = np.zeros(shape, dtype=np.uint8)
+    mesh = roi.describe(Node(), step(shape, 40), ghosts, (0.0, 1.0), 0.1, "temperature",
+                        domain_offset=9, state={"cycle": 100, "time": 10.0})
+    # 2 active blocks, and the outline of the 6 inactive ones
+    assert sorted(mesh) == ["domain_000011", "domain_000015", "domain_000017"]
+    for name, domain in mesh.items():
+        assert domain["state"] == {"domain_id": int(name[7:]), "cycle": 100, "time": 10.0}
+    outline = mesh["domain_000017"]
+    assert outline["topologies"]["mesh"]["elements"]["connectivity"].size == 6 * 8
+    block = mesh["domain_000011"]
+    assert block["coordsets"]["coords"]["origin"] == {"x": 3.2, "y": 1.0}
+    # the last row and column are ghosts of the next blocks
+    block_ghosts = block["fields"]["point_ghosts"]["values"]["external"].reshape(17, 17)
+    assert block_ghosts[-1].all() and block_ghosts[:, -1].all()
+    assert not block_ghosts[:-1, :-1].any()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from streaming_histogram import StreamingHistogram
+
+
+def test_widen_merges_bins_and_keeps_the_center():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0.0, 1.0, 1000)
+    hist = StreamingHistogram(8, 0.0, 1.0, adaptive=True)
+    hist.update(values)
+    hist.widen()
+    assert (hist.vmin, hist.vmax) == (-0.5, 1.5)
+    assert hist.counts.sum() == values.size
+    np.testing.assert_array_equal(hist.counts, np.histogram(values, hist.edges)[0])
+    # the incremental bin indices follow the new bins
+    np.testing.assert_array_equal(hist.index, hist.bin_index(values))
+
+
+def test_update_delta_widens_to_fit_new_values():
+    values = np.linspace(0.0, 1.0, 64, endpoint=False)
+    hist = StreamingHistogram(16, 0.0, 1.0, adaptive=True)
+    hist.update_delta(values)
+    values = values * 3.0
+    hist.update_delta(values)
+    assert hist.vmin <= values.min() and hist.vmax >= values.max()
+    np.testing.assert_array_equal(hist.counts, np.bincount(hist.bin_index(values), minlength=16))
+
+
+def test_adaptive_needs_a_multiple_of_4_bins():
+    with pytest.raises(ValueError):
+        StreamingHistogram(10, adaptive=True)
+
+
+def test_update_delta_rebins_the_changed_points_only():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(0.0, 1.0, (32, 32))
+    hist = StreamingHistogram(16, 0.0, 1.0)
+    hist.update(values)
+    values[3:7, 10:20] = rng.uniform(0.0, 1.0, (4, 10))
+    hist.update_delta(values)
+    np.testing.assert_array_equal(hist.counts, np.bincount(hist.bin_index(values.ravel()), minlength=16))
+    # with the changed points given by the caller
+    values[0, :] = 0.99
+    hist.update_delta(values, changed=np.arange(32))
+    np.testing.assert_array_equal(hist.counts, np.bincount(hist.bin_index(values.ravel()), minlength=16))
+    np.testing.assert_array_equal(hist.index, hist.bin_index(values.ravel()))
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from timeseries_hdf5 import TimeSeriesWriter, TimeSeriesReader, aggregator_file
+
+
+def test_aggregator_file_names():
+    assert aggregator_file("heat.h5", 0, 1) == "heat.h5"
+    assert aggregator_file("heat.h5", 3, 4) == "heat.agg_0003.h5"
+    assert aggregator_file("heat", 1, 2) == "heat.agg_0001.h5"
+
+
+def test_window_reads_the_appended_cycles(tmp_path):
+    pytest.importorskip("h5py")
+    fname = str(tmp_path / "heat.h5")
+    series = TimeSeriesWriter(fname)
+    snapshots = [np.full((3, 4), float(cycle)) + np.arange(12).reshape(3, 4)
+                 for cycle in range(0, 50, 10)]
+    for cycle, values in zip(range(0, 50, 10), snapshots):
+        series.append(cycle, cycle * 0.1, {"temperature": values})
+    series.close()
+
+    reader = TimeSeriesReader(fname)
+    assert reader.fields() == ["temperature"]
+    np.testing.assert_array_equal(reader.domains, [[0, 3, 4, 0]])
+    cycles, times, values = reader.window("temperature", 1.0, 3.0)
+    np.testing.assert_array_equal(cycles, [10, 20, 30])
+    assert values.shape == (3, 12)
+    cycles, _, values = reader.window("temperature", 20, 40, by="cycle", rank=0)
+    np.testing.assert_array_equal(cycles, [20, 30, 40])
+    np.testing.assert_array_equal(values, snapshots[2:])
+    reader.close()
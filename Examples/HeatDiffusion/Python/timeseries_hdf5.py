@@ -0,0 +1,178 @@
+##############################################################################
+# One appendable HDF5 file for all the output cycles of a run
+#
+# The relay extracts and the ParaView extractors write one file (or one file
+# per domain) per output cycle, which overloads the metadata server of a
+# parallel file system. TimeSeriesWriter appends the fields of every output
+# cycle to chunked, extendable datasets of shape (cycles, points) in a single
+# file, or in one file per group of ranks:
+#
+#   series = TimeSeriesWriter("heat.h5", comm, aggregators=1)
+#   while running:
+#       ...
+#       if publishing:
+#           series.append(cycle, time, {"temperature": owned_rows})
+#   series.close()
+#
+# The ranks of a group send their arrays to the first rank of the group (the
+# aggregator) with one Gatherv per field, and only the aggregators open a
+# file. Every file has the datasets "cycle" and "time", the index of the
+# output cycles, and "domains", the rank, shape and offset of every local
+# array in a row of the field datasets. One chunk holds one cycle, so that
+# TimeSeriesReader reads a time window without touching the other cycles:
+#
+#   reader = TimeSeriesReader("heat.h5")
+#   cycles, times, values = reader.window("temperature", 10.0, 20.0)
+#
+# h5py is required.
+#
+# Run: python3 timeseries_hdf5.py heat.h5  # prints the index
+##############################################################################
+import os
+import argparse
+import numpy as np
+
+
+def aggregator_file(fname, aggregator, aggregators):
+    """The file written by one aggregator"""
+    if aggregators == 1:
+        return fname
+    root, ext = os.path.splitext(fname)
+    return f"{root}.agg_{aggregator:04d}{ext or '.h5'}"
+
+
+class TimeSeriesWriter:
+    """
+    Appends the local arrays of all ranks to extendable HDF5 datasets
+
+    Attributes
+    ----------
+    fname : string
+        the HDF5 file, suffixed with the aggregator number if aggregators > 1
+    comm : mpi4py communicator
+        None in serial mode
+    aggregators : int
+        the number of files, each written by one rank for a contiguous group
+        of ranks (default 1)
+    """
+    def __init__(self, fname, comm=None, aggregators=1):
+        import h5py
+        self.comm = comm
+        rank = comm.Get_rank() if comm is not None else 0
+        size = comm.Get_size() if comm is not None else 1
+        self.aggregators = min(aggregators, size)
+        self.aggregator = rank * self.aggregators // size
+        self.group = comm.Split(self.aggregator, rank) if comm is not None else None
+        self.writer = self.group is None or self.group.Get_rank() == 0
+        self.fname = aggregator_file(fname, self.aggregator, self.aggregators)
+        self.file = h5py.File(self.fname, "w") if self.writer else None
+        self.counts = None
+        self.buffers = {}
+        self.rank = rank
+
+    def _layout(self, shape):
+        """Gather the shapes of the local arrays, once"""
+        shapes = [(self.rank,) + tuple(shape)]
+        if self.group is not None:
+            shapes = self.group.gather(shapes[0], root=0)
+        if not self.writer:
+            self.counts = []
+            return
+        shapes = np.array(shapes, dtype=np.int64)
+        self.counts = shapes[:, 1] * shapes[:, 2]
+        offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+        self.file.create_dataset("domains", data=np.column_stack([shapes, offsets]))
+        self.file["domains"].attrs["columns"] = "rank,rows,columns,offset"
+        for name, dtype in (("cycle", np.int64), ("time", np.float64)):
+            self.file.create_dataset(name, shape=(0,), maxshape=(None,), dtype=dtype,
+                                     chunks=(1024,))
+
+    def append(self, cycle, time, arrays):
+        """Append the local 2D arrays {field name: array} of one output cycle"""
+        if self.counts is None:
+            self._layout(next(iter(arrays.values())).shape)
+        for name, values in arrays.items():
+            values = np.ascontiguousarray(values, dtype=np.float64).ravel()
+            received = None
+            if self.writer:
+                if name not in self.buffers:
+                    self.buffers[name] = np.zeros(int(self.counts.sum()))
+                    self.file.create_dataset(name, shape=(0, self.buffers[name].size),
+                                             maxshape=(None, self.buffers[name].size),
+                                             dtype=np.float64,
+                                             chunks=(1, self.buffers[name].size))
+                received = self.buffers[name]
+            if self.group is not None:
+                self.group.Gatherv(values, [received, self.counts] if self.writer else None,
+                                   root=0)
+            else:
+                received[:] = values
+            if self.writer:
+                dset = self.file[name]
+                dset.resize(dset.shape[0] + 1, axis=0)
+                dset[-1] = received
+        if self.writer:
+            for name, value in (("cycle", cycle), ("time", time)):
+                dset = self.file[name]
+                dset.resize(dset.shape[0] + 1, axis=0)
+                dset[-1] = value
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.group is not None:
+            self.group.Free()
+            self.group = None
+
+
+class TimeSeriesReader:
+    """
+    Reads time windows of a file written by TimeSeriesWriter
+
+    Attributes
+    ----------
+    fname : string
+        the HDF5 file (one aggregator file if there are several)
+    """
+    def __init__(self, fname):
+        import h5py
+        self.file = h5py.File(fname, "r")
+        self.cycles = self.file["cycle"][:]
+        self.times = self.file["time"][:]
+        self.domains = self.file["domains"][:]
+
+    def fields(self):
+        return [name for name in self.file if name not in ("cycle", "time", "domains")]
+
+    def window(self, field, first, last, by="time", rank=None):
+        """The cycles, times and values of a field between first and last
+        (times, or cycles if by="cycle"), both included. The values have the
+        shape (cycles, points), or (cycles, rows, columns) for one rank"""
+        index = self.times if by == "time" else self.cycles
+        start = int(np.searchsorted(index, first, side="left"))
+        stop = int(np.searchsorted(index, last, side="right"))
+        if rank is None:
+            values = self.file[field][start:stop]
+        else:
+            rows, cols, offset = self.domains[self.domains[:, 0] == rank][0, 1:]
+            values = self.file[field][start:stop, offset:offset + rows * cols]
+            values = values.reshape(-1, rows, cols)
+        return self.cycles[start:stop], self.times[start:stop], values
+
+    def close(self):
+        self.file.close()
+
+
+parser = argparse.ArgumentParser(description="print the index of a time series file")
+parser.add_argument("filename", type=str, help="a file written by TimeSeriesWriter")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    reader = TimeSeriesReader(args.filename)
+    print("fields:", ", ".join(reader.fields()))
+    print("domains (rank, rows, columns, offset):")
+    print(reader.domains)
+    for cycle, time in zip(reader.cycles, reader.times):
+        print(cycle, time)
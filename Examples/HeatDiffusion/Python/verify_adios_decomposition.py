@@ -0,0 +1,101 @@
+##############################################################################
+# Check of the ADIOS global array written by heat_diffusion_insitu_parallel.py
+#
+# Reads every step of the global array "temperature", and checks that
+#   - the blocks written by the ranks cover every row of the global array
+#     exactly once (no overlapping writes, no missing rows)
+#   - the global array is bit-for-bit equal to the same heat equation solved
+#     on a single global grid, at the iteration stored in the variable "step"
+#
+# With a BP engine in adios2.xml, run it after the simulation. With SST, run
+# it at the same time, as the consumer of the stream.
+# A lossy operator (--operator zfp, sz or mgard) makes the values differ, by
+# less than --accuracy.
+#
+# run: mpiexec -n 4 python3 heat_diffusion_insitu_parallel.py
+#      python3 verify_adios_decomposition.py --engine BP4 diffusion.bp
+##############################################################################
+import os, sys, math
+import argparse
+import numpy as np
+import adios2
+
+
+def serial_grid(xres):
+    """The initial global grid, with its bottom and top walls"""
+    v = np.zeros([xres + 2, xres + 2])
+    dx = 1.0 / (xres + 1)
+    v[0, :] = [math.sin(math.pi * j * dx) for j in range(xres + 2)]
+    v[-1, :] = v[0, :] * math.exp(-math.pi)
+    return v
+
+
+def serial_step(v):
+    """One iteration of the 4-point stencil, with the same operations as the
+    parallel version"""
+    vnew = 0.25 * (v[2:, 1:-1] +  # north neighbor
+                   v[0:-2, 1:-1] +  # south neighbor
+                   v[1:-1, 2:] +  # east neighbor
+                   v[1:-1, :-2])  # west neighbor
+    v[1:-1, 1:-1] = vnew.copy()
+
+
+def row_coverage(blocks, nrows):
+    """The number of blocks writing every row of the global array"""
+    coverage = np.zeros(nrows, dtype=int)
+    for block in blocks:
+        start = [int(s) for s in block["Start"].split(",")]
+        count = [int(c) for c in block["Count"].split(",")]
+        coverage[start[1]:start[1] + count[1]] += 1
+    return coverage
+
+
+parser = argparse.ArgumentParser(description="check the ADIOS output of the parallel heat diffusion")
+parser.add_argument("filename", nargs="?", default="diffusion.bp", help="the ADIOS stream or file")
+parser.add_argument("--engine", type=str, default=None,
+                    help="the ADIOS engine (BP4, BP5, SST). Default: the readerIO of adios2.xml")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if os.path.exists("adios2.xml"):
+        adios = adios2.ADIOS(configFile="adios2.xml")
+    else:
+        adios = adios2.ADIOS()
+    io = adios.DeclareIO("readerIO")
+    if args.engine:
+        io.SetEngine(args.engine)
+    engine = io.Open(args.filename, adios2.Mode.Read)
+
+    reference = None
+    iteration = 0
+    errors = 0
+    while engine.BeginStep() == adios2.StepStatus.OK:
+        temperature = io.InquireVariable("temperature")
+        shape = temperature.Shape()
+        data = np.zeros(shape)
+        engine.Get(temperature, data, adios2.Mode.Sync)
+        # "step" is a global single value, written with the same value by all ranks
+        steps = io.InquireVariable("step")
+        step = np.zeros(1, dtype=np.int32)
+        engine.Get(steps, step, adios2.Mode.Sync)
+        blocks = engine.BlocksInfo("temperature", engine.CurrentStep())
+        engine.EndStep()
+
+        coverage = row_coverage(blocks, shape[1])
+        if np.any(coverage != 1):
+            errors += 1
+            print("step", step[0], ": rows written more than once:", np.flatnonzero(coverage > 1),
+                  "never written:", np.flatnonzero(coverage == 0))
+        if reference is None:
+            reference = serial_grid(shape[2] - 2)
+        while iteration < step[0]:
+            serial_step(reference)
+            iteration += 1
+        if not np.array_equal(data[0].view(np.uint64), reference.view(np.uint64)):
+            errors += 1
+            diff = np.abs(data[0] - reference)
+            print("step", step[0], ":", np.count_nonzero(diff), "values differ, max", diff.max())
+        else:
+            print("step", step[0], ":", len(blocks), "blocks, global array identical")
+    engine.Close()
+    sys.exit(1 if errors else 0)
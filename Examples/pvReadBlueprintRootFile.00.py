@@ -4,6 +4,34 @@
 #
 # tested with Paraview v5.11.2 Wed 25 Oct 16:58:38 CEST 2023
 #
+# In parallel (pvbatch, or a pvserver with several ranks), every rank reads
+# only its share of the domains: a contiguous range of domains (default), or
+# every size-th domain starting at its rank (round-robin, better balanced
+# when the first and last domains are larger or smaller). Change the variable
+# "distribution" in the script below.
+#
+# All the fields are read from the domain files by default. To look at a few
+# fields only, list them in "selected_fields": they are read with path-based
+# reads of the HDF5 files, so that looking at one field of a large extract
+# costs the I/O of that field only.
+#
+# The arrays read by Conduit are given to VTK without copies: the VTK arrays
+# use the memory of the Conduit nodes, and keep a reference to them.
+#
+# All the root files "mesh.cycle_*.root" of the directory "basename" are
+# found, and their cycle numbers are given to ParaView as time steps, so that
+# a run can be animated. At every time step, only the selected fields of that
+# cycle are read. The VTK grid of every domain is kept from one cycle to the
+# next, and is converted again only when a checksum of its topology and
+# coordinates changes. The cache saves the conversion to VTK only, not the
+# I/O: the explicit coordinates and the connectivity of unstructured meshes
+# are still read at every cycle, since their data is part of the checksum, so
+# that a deforming mesh is never shown with a stale geometry.
+#
+# Unstructured meshes of triangles, quads, tetrahedra or hexahedra are
+# converted without a loop over the cells: the Blueprint connectivity is
+# given to a vtkCellArray, with offsets computed by NumPy.
+#
 # Written by: Jean M, Favre, Swiss National Supercomputing Center
 ##############################################################################
 from paraview.simple import *
@@ -27,13 +55,53 @@ renderView1.OSPRayMaterialLibrary = materialLibrary1
 
 programmableSource1 = ProgrammableSource()
 programmableSource1.OutputDataSetType = 'vtkPartitionedDataSet'
-programmableSource1.Script = """
+# the code common to the information and the data requests
+discovery = """
+import glob
+import re
+basename = "/dev/shm/"
+pattern = basename + "mesh.cycle_*.root"
+
+def root_files():
+  # the cycle numbers and the names of the root files, sorted by cycle
+  files = []
+  for fname in glob.glob(pattern):
+    match = re.search(r"cycle_([0-9]+)\\.root$", fname)
+    if match:
+      files.append((int(match.group(1)), fname))
+  return sorted(files)
+
+executive = self.GetExecutive()
+outInfo = executive.GetOutputInformation(0)
+"""
+programmableSource1.ScriptRequestInformation = discovery + """
+cycles = [cycle for cycle, fname in root_files()]
+outInfo.Remove(executive.TIME_STEPS())
+outInfo.Remove(executive.TIME_RANGE())
+for cycle in cycles:
+  outInfo.Append(executive.TIME_STEPS(), float(cycle))
+if cycles:
+  outInfo.Append(executive.TIME_RANGE(), float(cycles[0]))
+  outInfo.Append(executive.TIME_RANGE(), float(cycles[-1]))
+"""
+programmableSource1.Script = discovery + """
+import zlib
 import conduit
 import conduit.relay.io
 import numpy as np
 from vtk import vtkPoints, vtkImageData, vtkRectilinearGrid, vtkStructuredGrid
+from vtk import vtkUnstructuredGrid, vtkCellArray
+from vtk import VTK_TRIANGLE, VTK_QUAD, VTK_TETRA, VTK_HEXAHEDRON
+from vtk.util.numpy_support import numpy_to_vtkIdTypeArray
+from vtkmodules.vtkParallelCore import vtkMultiProcessController
 from vtk.numpy_interface import dataset_adapter as dsa
-from vtk.numpy_interface import algorithms as algs
+
+def ToVTK(nparr, name, owner):
+  # no copy: the VTK array uses the memory of the Conduit node "owner",
+  # which must stay alive as long as the VTK array
+  array = dsa.numpyTovtkDataArray(nparr, name)
+  array._conduit_owner = owner
+  return array
 
 def AddArrays(grid, mesh, nnodes):
   it = conduit.NodeIterator()
@@ -41,47 +109,70 @@ def AddArrays(grid, mesh, nnodes):
   while(it.has_next()):
     f = it.next()
     node = it.node()
+    if selected_fields is not None and it.name() not in selected_fields:
+      continue
     nparr = node["values"]
-    nparr2 = np.copy(nparr) # forces the read to take place
-    dArray = dsa.numpyTovtkDataArray(nparr2, it.name())
+    dArray = ToVTK(nparr, it.name(), mesh)
     if node["association"] == "vertex":
       assert nparr.shape[0] == nnodes
       grid.GetPointData().AddArray(dArray)
     else:
       grid.GetCellData().AddArray(dArray)
         
+def ExplicitPoints(mesh):
+  # VTK points are interleaved: one pass into a preallocated (n, 3) array
+  xcoords = mesh["mesh/coordsets/coords/values/x"]
+  coords = np.empty((xcoords.shape[0], 3), dtype=xcoords.dtype)
+  coords[:, 0] = xcoords
+  coords[:, 1] = mesh["mesh/coordsets/coords/values/y"]
+  if mesh.has_path("mesh/coordsets/coords/values/z"): # this is a 3D grid
+    coords[:, 2] = mesh["mesh/coordsets/coords/values/z"]
+  else:
+    coords[:, 2] = 0.0
+  points = vtkPoints()
+  points.SetData(dsa.numpyTovtkDataArray(coords, "coords"))
+  return points
+
 def ConduitNode_to_StructuredGrid(mesh):
   assert mesh["mesh/topologies/mesh/type"] == "structured"
   grid = vtkStructuredGrid()
-  xcoords = mesh["mesh/coordsets/coords/values/x"];
-  ycoords = mesh["mesh/coordsets/coords/values/y"];
   dims    = [mesh["mesh/topologies/mesh/elements/dims/i"]+1,
             mesh["mesh/topologies/mesh/elements/dims/j"]+1,
             1]
-  if mesh.has_path("mesh/topologies/mesh/elements/dims/z"): # this is a 3D grid
-    dims[2] = mesh["mesh/topologies/mesh/elements/dims/z"]+1
-    zcoords = mesh["mesh/coordsets/coords/values/z"]
-    coords = algs.make_vector(np.copy(xcoords), np.copy(ycoords), np.copy(zcoords))
-  else:
-    coords = algs.make_vector(np.copy(xcoords), np.copy(ycoords), np.zeros_like(xcoords))
+  if mesh.has_path("mesh/topologies/mesh/elements/dims/k"): # this is a 3D grid
+    dims[2] = mesh["mesh/topologies/mesh/elements/dims/k"]+1
 
   grid.SetDimensions(dims)
-  points = vtkPoints()
-  grid.SetPoints(points)
-  points.SetData(dsa.numpyTovtkDataArray(coords, "coords"))
+  grid.SetPoints(ExplicitPoints(mesh))
+  return grid
 
-  nnodes = np.prod(dims)
-  if mesh.has_path("mesh/fields"):
-    AddArrays(grid, mesh, nnodes)
+# the VTK cell type and the number of points of the Blueprint shapes
+cell_types = {"tri":  (VTK_TRIANGLE, 3),
+              "quad": (VTK_QUAD, 4),
+              "tet":  (VTK_TETRA, 4),
+              "hex":  (VTK_HEXAHEDRON, 8)}
 
-  return grid
+def ConduitNode_to_UnstructuredGrid(mesh):
+  assert mesh["mesh/topologies/mesh/type"] == "unstructured"
+  shape = mesh["mesh/topologies/mesh/elements/shape"]
+  if shape not in cell_types:
+    raise ValueError("unstructured shape " + shape + " not implemented yet")
+  celltype, npts = cell_types[shape]
+  # vtkCellArray stores the connectivity and the offsets as vtkIdType arrays.
+  # The connectivity is used without a copy if it is already 64-bit
+  connectivity = mesh["mesh/topologies/mesh/elements/connectivity"]
+  connectivity = np.ascontiguousarray(connectivity, dtype=np.int64)
+  ncells = connectivity.shape[0] // npts
+  offsets = np.arange(0, (ncells + 1) * npts, npts, dtype=np.int64)
+  cells = vtkCellArray()
+  cells.SetData(numpy_to_vtkIdTypeArray(offsets), numpy_to_vtkIdTypeArray(connectivity))
+  cells._conduit_owner = mesh
 
-def Make_structured_grid(fname):
-  mesh = conduit.Node()
-  conduit.relay.io.load(mesh, fname, "hdf5")
-  grid = ConduitNode_to_StructuredGrid(mesh)
+  grid = vtkUnstructuredGrid()
+  grid.SetPoints(ExplicitPoints(mesh))
+  grid.SetCells(celltype, cells)
   return grid
-  
+
 def ConduitNode_to_RectilinearGrid(mesh):
   assert mesh["mesh/topologies/mesh/type"] == "rectilinear"
   grid = vtkRectilinearGrid()
@@ -95,20 +186,9 @@ def ConduitNode_to_RectilinearGrid(mesh):
     zcoords = np.array([0.0])
 
   grid.SetDimensions(dims)
-  grid.SetXCoordinates(dsa.numpyTovtkDataArray(np.copy(xcoords), "xcoords"))
-  grid.SetYCoordinates(dsa.numpyTovtkDataArray(np.copy(ycoords), "ycoords"))
-  grid.SetZCoordinates(dsa.numpyTovtkDataArray(np.copy(zcoords), "zcoords"))
-  
-  nnodes = np.prod(dims)              
-  if mesh.has_path("mesh/fields"):
-    AddArrays(grid, mesh, nnodes)
-
-  return grid
-  
-def Make_rectilinear_grid(fname):
-  mesh = conduit.Node()
-  conduit.relay.io.load(mesh, fname, "hdf5")
-  grid = ConduitNode_to_RectilinearGrid(mesh)
+  grid.SetXCoordinates(ToVTK(xcoords, "xcoords", mesh))
+  grid.SetYCoordinates(ToVTK(ycoords, "ycoords", mesh))
+  grid.SetZCoordinates(ToVTK(zcoords, "zcoords", mesh))
   return grid
 
 def ConduitNode_to_UniformGrid(mesh):
@@ -132,50 +212,123 @@ def ConduitNode_to_UniformGrid(mesh):
   grid.SetOrigin(origin)
   grid.SetSpacing(spacing)
   grid.SetDimensions(dims)
-
-  nnodes = np.prod(dims)              
-  if mesh.has_path("mesh/fields"):
-    AddArrays(grid, mesh, nnodes)
   return grid
-  
-def Make_uniform_grid(fname):
+
+def load_domain(fname, domain):
+  # the grid of a domain, from the cache if its geometry has not changed,
+  # with the selected fields of this file. The explicit coordinates and the
+  # connectivity are read anyway for the checksum: only their conversion to
+  # VTK is cached
   mesh = conduit.Node()
-  conduit.relay.io.load(mesh, fname, "hdf5")
-  grid = ConduitNode_to_UniformGrid(mesh)
+  handle = conduit.relay.io.IOHandle()
+  handle.open(fname, "hdf5")
+  handle.read(mesh["mesh/topologies/mesh/type"], "mesh/topologies/mesh/type")
+  unstructured = mesh["mesh/topologies/mesh/type"] == "unstructured"
+  if unstructured:
+    # the connectivity is read below, its data goes into the checksum
+    for path in ("coordset", "elements/shape"):
+      handle.read(mesh["mesh/topologies/mesh/" + path], "mesh/topologies/mesh/" + path)
+  else:
+    handle.read(mesh["mesh/topologies"], "mesh/topologies")
+  handle.read(mesh["mesh/coordsets/coords/type"], "mesh/coordsets/coords/type")
+  explicit = mesh["mesh/coordsets/coords/type"] == "explicit"
+  if not explicit:
+    handle.read(mesh["mesh/coordsets"], "mesh/coordsets")
+  signature = zlib.crc32(mesh.to_json().encode())
+  # the large arrays are not converted to JSON: the checksum of their bytes
+  arrays = []
+  if explicit:
+    handle.read(mesh["mesh/coordsets"], "mesh/coordsets")
+    values = mesh["mesh/coordsets/coords/values"]
+    arrays += [values[axis] for axis in values.child_names()]
+  if unstructured:
+    path = "mesh/topologies/mesh/elements/connectivity"
+    handle.read(mesh[path], path)
+    arrays.append(mesh[path])
+  for array in arrays:
+    signature = zlib.crc32(np.ascontiguousarray(array.value()), signature)
+  cached = geometry_cache.get(domain)
+  if cached is None or cached[0] != signature:
+    topotype = mesh["mesh/topologies/mesh/type"]
+    cached = (signature, converters[topotype](mesh))
+    geometry_cache[domain] = cached
+
+  fields = conduit.Node()
+  if handle.has_path("mesh/fields"):
+    for name in handle.list_child_names("mesh/fields"):
+      if selected_fields is None or name in selected_fields:
+        handle.read(fields["mesh/fields/" + name], "mesh/fields/" + name)
+  handle.close()
+
+  # the cached geometry is shared, the fields are those of this cycle
+  grid = cached[1].NewInstance()
+  grid.ShallowCopy(cached[1])
+  if fields.has_path("mesh/fields"):
+    AddArrays(grid, fields, grid.GetNumberOfPoints())
   return grid
-  
+
+def assigned_domains(number_of_domains, rank, size, distribution="contiguous"):
+  # the domains read by this rank
+  if distribution == "round-robin":
+    return list(range(rank, number_of_domains, size))
+  first = rank * number_of_domains // size
+  last = (rank + 1) * number_of_domains // size
+  return list(range(first, last))
+
+# "contiguous" or "round-robin"
+distribution = "contiguous"
+# the names of the fields to read, e.g. ["temperature"], or None to read all fields
+selected_fields = None
+controller = vtkMultiProcessController.GetGlobalController()
+rank = controller.GetLocalProcessId() if controller else 0
+size = controller.GetNumberOfProcesses() if controller else 1
+# the geometry of every domain, {domain: (checksum, grid)}, kept on the
+# source from one time step to the next
+if not hasattr(self, "geometry_cache"):
+  self.geometry_cache = {}
+geometry_cache = self.geometry_cache
+# the converter of the geometry of a domain for each topology type
+converters = {"uniform":     ConduitNode_to_UniformGrid,
+              "rectilinear": ConduitNode_to_RectilinearGrid,
+              "structured":  ConduitNode_to_StructuredGrid,
+              "unstructured": ConduitNode_to_UnstructuredGrid}
+
+# the root file of the requested time step, or of the last cycle before it
+files = root_files()
+if not files:
+  raise RuntimeError("no Blueprint root file matches " + pattern)
+cycles = [cycle for cycle, fname in files]
+index = len(files) - 1
+if outInfo.Has(executive.UPDATE_TIME_STEP()):
+  requested = outInfo.Get(executive.UPDATE_TIME_STEP())
+  index = max(0, int(np.searchsorted(cycles, requested, side="right")) - 1)
+cycle, rootfile = files[index]
+output.GetInformation().Set(output.DATA_TIME_STEP(), float(cycle))
+
 root = conduit.Node()
-basename = "/dev/shm/"
-conduit.relay.io.load(root, basename + "mesh.cycle_001000.root", "hdf5")
+# read the index only. A single domain is stored in the root file itself
+handle = conduit.relay.io.IOHandle()
+handle.open(rootfile, "hdf5")
+for path in ("blueprint_index", "file_pattern"):
+  if handle.has_path(path):
+    handle.read(root[path], path)
+handle.close()
 number_of_domains = root["blueprint_index/mesh/state/number_of_domains"]
 topotype = root["blueprint_index/mesh/topologies/mesh/type"]
-if topotype == "uniform":
-  if number_of_domains == 1:
-    grid = ConduitNode_to_UniformGrid(root)
-    output.SetPartition(0, grid)
-  else:
-    for domain in range(number_of_domains):
-      print("domain ", domain, " in ", basename + format(root["file_pattern"] % domain))
-      grid = Make_uniform_grid(format(basename + root["file_pattern"] % domain))
-      output.SetPartition(domain, grid)
-elif topotype == "rectilinear":
-  if number_of_domains == 1:
-    grid = ConduitNode_to_RectilinearGrid(root)
-    output.SetPartition(0, grid)
-  else:
-    for domain in range(number_of_domains):
-      print("domain ", domain, " in ", basename + format(root["file_pattern"] % domain))
-      grid = Make_rectilinear_grid(format(basename + root["file_pattern"] % domain))
-      output.SetPartition(domain, grid)
-elif topotype == "structured":
+if rank == 0 and root.has_path("blueprint_index/mesh/fields"):
+  print("cycle ", cycle, " fields: ", root["blueprint_index/mesh/fields"].child_names(), " selected: ", selected_fields)
+if topotype in converters:
+  # the partitions of a distributed vtkPartitionedDataSet are numbered locally
   if number_of_domains == 1:
-    grid = ConduitNode_to_StructuredGrid(root)
-    output.SetPartition(0, grid)
+    if rank == 0:
+      output.SetPartition(0, load_domain(rootfile, 0))
   else:
-    for domain in range(number_of_domains):
-      print("domain ", domain, " in ", basename + format(root["file_pattern"] % domain))
-      grid = Make_structured_grid(format(basename + root["file_pattern"] % domain))
-      output.SetPartition(domain, grid)
+    domains = assigned_domains(number_of_domains, rank, size, distribution)
+    output.SetNumberOfPartitions(len(domains))
+    for partition, domain in enumerate(domains):
+      fname = basename + root["file_pattern"] % domain
+      print("rank ", rank, ": domain ", domain, " in ", fname)
+      output.SetPartition(partition, load_domain(fname, domain))
 else:
   print("Mesh type not implemented yet")
 """